@@ -16,3 +16,130 @@ DB_PORT = int(os.getenv("DB_PORT", 5432))
 DB_NAME = os.getenv("DB_NAME", "mydatabase")
 DB_USER = os.getenv("DB_USER", "user")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+# Connection budget of the sync engine; split evenly across workers when running with --workers.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+
+# Read replicas (comma-separated postgresql:// URLs). Read-only RPCs are spread over them and
+# writes go to the primary; each replica gets a pool of the same size as the primary.
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# How long a replica that failed to connect is skipped before it is tried again (seconds)
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", 5))
+# After a write, reads of the same client go to the primary for this long (seconds; 0 disables)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 0))
+
+# Logging: level, output format ("json" or "text") and how many records may wait for the writer thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Fraction of the INFO and DEBUG records kept per logger and its children, e.g.
+# "app.repositories=0.01,app.db.database=0.01"; warnings and errors are always kept.
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(","))
+    if name.strip()
+}
+
+# Streaming configuration
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))
+MAX_STREAM_BATCH_SIZE = int(os.getenv("MAX_STREAM_BATCH_SIZE", 5000))
+
+# Pagination configuration
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# Page size of search RPCs when the request does not set one
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+
+# Asyncio server configuration ("sync" runs the thread-pool server, "async" runs grpc.aio)
+GRPC_SERVER_MODE = os.getenv("GRPC_SERVER_MODE", "sync")
+GRPC_AIO_MAX_CONCURRENT_RPCS = int(os.getenv("GRPC_AIO_MAX_CONCURRENT_RPCS", 10000))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", 20))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", 10))
+ASYNC_DB_POOL_TIMEOUT = int(os.getenv("ASYNC_DB_POOL_TIMEOUT", 30))
+
+# Thread pool of the sync server (threads per process). It should not exceed the connection budget
+# of the process (DB_POOL_SIZE + DB_MAX_OVERFLOW, after the split across workers), or RPCs queue for connections.
+GRPC_MAX_WORKERS = int(os.getenv("GRPC_MAX_WORKERS", 10))
+# Bulkheads: separate thread pools per method class, as pool=threads, so that slow scans cannot
+# take the threads of point lookups. Each RPC holds at most one connection, so a pool's threads
+# are also its share of the connection pool, except for the watch pool: a Watch stream holds a
+# thread for as long as it is open but no connection. Empty runs every RPC on one pool of GRPC_MAX_WORKERS.
+GRPC_POOLS = {
+    name.strip(): int(threads)
+    for name, _, threads in (item.partition("=") for item in os.getenv("GRPC_POOLS", "point=4,scan=3,write=3,watch=16").split(","))
+    if name.strip()
+}
+# Method=pool overrides of the default classes: Get*, BatchGet* and Suggest* run on the point pool,
+# List*, Search*, Stream* and Export* on the scan pool, Watch* on the watch pool and the rest on the
+# write pool. A method
+# whose pool is not in GRPC_POOLS runs on the first one.
+GRPC_POOL_METHODS = {
+    method.strip(): pool.strip()
+    for method, _, pool in (item.partition("=") for item in os.getenv("GRPC_POOL_METHODS", "").split(","))
+    if method.strip()
+}
+# Adaptive mode: every interval, fewer RPCs run at once while the mean checkout wait is above the
+# target, and more (up to GRPC_MAX_WORKERS) while RPCs wait for a thread and checkouts are fast.
+GRPC_ADAPTIVE_WORKERS = os.getenv("GRPC_ADAPTIVE_WORKERS", "false").lower() == "true"
+GRPC_MIN_WORKERS = int(os.getenv("GRPC_MIN_WORKERS", 2))
+GRPC_ADAPTIVE_TARGET_WAIT_MS = float(os.getenv("GRPC_ADAPTIVE_TARGET_WAIT_MS", 10))
+GRPC_ADAPTIVE_INTERVAL_SECONDS = float(os.getenv("GRPC_ADAPTIVE_INTERVAL_SECONDS", 5))
+# Log connection pool and thread pool stats this often (seconds; 0 disables)
+POOL_STATS_LOG_SECONDS = float(os.getenv("POOL_STATS_LOG_SECONDS", 60))
+
+# Deadline propagation: RPCs whose client deadline passed while they waited are rejected with
+# DEADLINE_EXCEEDED before they run, and the time left bounds the statements of their transaction
+# (SET LOCAL statement_timeout).
+DEADLINE_PROPAGATION = os.getenv("DEADLINE_PROPAGATION", "true").lower() == "true"
+# Admission control: RPCs beyond a concurrency limit (running plus waiting for a thread) fail at
+# once with RESOURCE_EXHAUSTED instead of queueing. The limit grows by one per limit's worth of RPCs
+# that finish within the latency target and is multiplied by the backoff when one does not or runs
+# out of time (AIMD).
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", 20))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", 2))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", 200))
+ADMISSION_LATENCY_TARGET_MS = float(os.getenv("ADMISSION_LATENCY_TARGET_MS", 250))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", 0.9))
+
+# Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics; 0 disables it). With
+# --workers, worker N serves METRICS_PORT + N.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))
+
+# Multi-process launcher configuration
+GRPC_WORKERS = int(os.getenv("GRPC_WORKERS", 1))
+GRPC_SHUTDOWN_GRACE_SECONDS = float(os.getenv("GRPC_SHUTDOWN_GRACE_SECONDS", 10))
+
+# Batch RPC configuration (maximum number of items per batch request)
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 5000))
+
+# Entity cache for GetBook / GetMember (entries per entity type; 0 disables the cache)
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", 10000))
+ENTITY_CACHE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_TTL_SECONDS", 30))
+
+# Serialized list-response fragments cached per entity type (entries)
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 50000))
+
+# Identical concurrent read RPCs share one query and one serialized response. With a window, a
+# response is also reused for that long after it completes (seconds; 0 only shares in-flight reads).
+COALESCE_READS = os.getenv("COALESCE_READS", "true").lower() == "true"
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", 0))
+COALESCE_WINDOW_SIZE = int(os.getenv("COALESCE_WINDOW_SIZE", 1000))
+
+# In-memory type-ahead index behind SuggestBooks (loaded at startup)
+TYPEAHEAD_ENABLED = os.getenv("TYPEAHEAD_ENABLED", "true").lower() == "true"
+TYPEAHEAD_LIMIT = int(os.getenv("TYPEAHEAD_LIMIT", 10))
+MAX_TYPEAHEAD_LIMIT = int(os.getenv("MAX_TYPEAHEAD_LIMIT", 50))
+
+# Change streams (WatchBooks / WatchBorrowings). Idle streams get an empty response this often
+# (seconds). A subscriber more than WATCH_QUEUE_SIZE batches behind is dropped, and a resume token
+# with more than WATCH_MAX_CATCH_UP changed entities behind it is refused (reload instead). Change
+# events are kept for CHANGE_RETENTION_HOURS, which is also how long resume tokens stay valid.
+WATCH_HEARTBEAT_SECONDS = float(os.getenv("WATCH_HEARTBEAT_SECONDS", 15))
+WATCH_QUEUE_SIZE = int(os.getenv("WATCH_QUEUE_SIZE", 1000))
+WATCH_MAX_SUBSCRIBERS = int(os.getenv("WATCH_MAX_SUBSCRIBERS", 1000))
+WATCH_MAX_CATCH_UP = int(os.getenv("WATCH_MAX_CATCH_UP", 10000))
+CHANGE_RETENTION_HOURS = float(os.getenv("CHANGE_RETENTION_HOURS", 24))
+
+# Size of the data chunks sent by ExportData (bytes)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 65536))
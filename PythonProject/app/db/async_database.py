@@ -0,0 +1,124 @@
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.config import (
+    DB_HOST,
+    DB_PORT,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    ASYNC_DB_POOL_SIZE,
+    ASYNC_DB_MAX_OVERFLOW,
+    ASYNC_DB_POOL_TIMEOUT,
+    DB_REPLICA_URLS,
+    DB_REPLICA_RETRY_SECONDS,
+)
+from app.db.pool_metrics import InstrumentedAsyncAdaptedQueuePool, engine_pool_stats
+from app.db.deadlines import is_deadline_error
+from app.db.replicas import ReplicaSet, ReplicaUnavailable, SESSION_REPLICA, is_connection_error, replica_urls
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Construct the asyncpg database URL from environment variables
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+async_engine = None
+AsyncSessionFactory = None
+async_replicas = ReplicaSet([], DB_REPLICA_RETRY_SECONDS)
+
+def _create_async_engine(url, pool_size: int, max_overflow: int):
+    # The pool is bounded; RPCs beyond pool_size + max_overflow wait for a connection
+    # on the event loop instead of holding a thread each.
+    return create_async_engine(
+        url,
+        pool_pre_ping=True,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=ASYNC_DB_POOL_TIMEOUT,
+        pool_recycle=3600,
+    )
+
+def init_async_engine(pool_size: int = ASYNC_DB_POOL_SIZE, max_overflow: int = ASYNC_DB_MAX_OVERFLOW):
+    """
+    Create the async engine, the replica engines and the session factory, replacing any existing ones.
+    """
+    global async_engine, AsyncSessionFactory, async_replicas
+    try:
+        for existing in [async_engine, *async_replicas.engines]:
+            if existing is not None:
+                existing.sync_engine.dispose(close=False)
+
+        async_engine = _create_async_engine(ASYNC_DATABASE_URL, pool_size, max_overflow)
+        async_replicas = ReplicaSet(
+            [_create_async_engine(url, pool_size, max_overflow) for url in replica_urls(DB_REPLICA_URLS, "postgresql+asyncpg")],
+            DB_REPLICA_RETRY_SECONDS,
+        )
+
+        # expire_on_commit=False because attribute access after commit must not trigger implicit IO.
+        AsyncSessionFactory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+        logger.info(
+            "Async database engine and session factory created successfully "
+            "(pool_size=%s, max_overflow=%s, replicas=%s).",
+            pool_size, max_overflow, len(async_replicas),
+        )
+
+    except Exception as e:
+        logger.exception("Failed to create async database engine or session factory: %s", e)
+        raise
+
+init_async_engine()
+
+def async_pool_stats():
+    """
+    Checkout and connection stats of the async primary and replica pools of this process.
+    """
+    return engine_pool_stats({"primary": async_engine, **{f"replica{index}": replica for index, replica in enumerate(async_replicas.engines)}})
+
+@asynccontextmanager
+async def get_async_db_session(read_only: bool = False):
+    """
+    Provide a transactional scope around a series of async operations.
+    Read-only sessions are routed like get_db_session's.
+    """
+    replica = async_replicas.choose() if read_only else None
+    if replica is None:
+        logger.info("Creating a new async database session on the primary.")
+    else:
+        logger.info("Creating a new async database session on replica %s.", replica)
+    session = AsyncSessionFactory() if replica is None else AsyncSessionFactory(bind=async_replicas.engines[replica])
+    session.info[SESSION_REPLICA] = replica
+    try:
+        yield session
+        await session.commit()
+        logger.info("Async database session committed successfully.")
+    except Exception as e:
+        await session.rollback()
+        if replica is not None and is_connection_error(e):
+            async_replicas.mark_down(replica)
+            logger.warning(
+                "Replica %s is unavailable; skipping it for %ss: %s",
+                replica, async_replicas.retry_seconds, e,
+            )
+            raise ReplicaUnavailable(f"Replica {replica} is unavailable.") from e
+        if isinstance(e, ReplicaUnavailable):
+            logger.info("Replica %s cannot serve this read: %s", replica, e)
+            raise
+        if is_deadline_error(e):
+            # Expected under overload; a stack trace per timed out RPC would only add to it.
+            logger.warning("Async database session rolled back: the RPC ran out of time.")
+            raise
+        logger.exception("Async database session rolled back due to an exception: %s", e)
+        raise
+    finally:
+        await session.close()
+        logger.info("Async database session closed.")
+
+async def dispose_async_engine():
+    """
+    Close all pooled connections of the async engine and its replicas.
+    """
+    for engine in [async_engine, *async_replicas.engines]:
+        await engine.dispose()
+    logger.info("Async database engine disposed.")
@@ -0,0 +1,97 @@
+from sqlalchemy import text
+from app.db.upgrade import add_missing_columns, create_missing_indexes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Topics of the change_events outbox, one per Watch RPC. Members are not watched; their events
+# only invalidate the entity caches of other processes.
+BOOKS = "books"
+BORROWINGS = "borrowings"
+MEMBERS = "members"
+
+# Every transaction that adds change events notifies this channel once, with its txid as payload.
+# Notifications are only delivered on commit, so a listener wakes exactly when there is something
+# to read.
+CHANNEL = "library_changes"
+
+# A statement-level trigger, so that no write path can add events without notifying, and a
+# transaction notifies once however many events it adds (Postgres folds identical notifications).
+NOTIFY_DDL = (
+    f"""
+    CREATE OR REPLACE FUNCTION notify_change_events() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}', txid_current()::text);
+        RETURN NULL;
+    END
+    $$
+    """,
+    "DROP TRIGGER IF EXISTS change_events_notify ON change_events",
+    """
+    CREATE TRIGGER change_events_notify AFTER INSERT ON change_events
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_events()
+    """,
+)
+
+# Tables whose rows carry a version (see app.db.models.version_column).
+VERSIONED_TABLES = ("books", "members", "borrow_records")
+# The version columns and their sort key indexes, for tables created before them. Existing rows
+# take the txid and time of the upgrade, so the next ListChangesSince returns them all once.
+VERSION_COLUMNS = (
+    ("version", "bigint NOT NULL DEFAULT txid_current()"),
+    ("updated_at", "timestamptz NOT NULL DEFAULT now()"),
+)
+VERSION_INDEXES = tuple(f"ix_{table}_version_id" for table in VERSIONED_TABLES)
+
+# Inserts take the version from the column default; this row trigger moves it on every update,
+# whatever statement makes it.
+VERSION_DDL = (
+    """
+    CREATE OR REPLACE FUNCTION stamp_row_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.version := txid_current();
+        NEW.updated_at := now();
+        RETURN NEW;
+    END
+    $$
+    """,
+    *(
+        ddl
+        for table in VERSIONED_TABLES
+        for ddl in (
+            f"DROP TRIGGER IF EXISTS {table}_version ON {table}",
+            f"CREATE TRIGGER {table}_version BEFORE UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION stamp_row_version()",
+        )
+    ),
+)
+
+# Changes are read by txid, in ranges below the watermark: the oldest transaction still running
+# (the xmin of a fresh snapshot). Every transaction below it has committed or rolled back, so the
+# events of a range can be read once and no later commit adds to it. Event ids would not do: a
+# transaction can take an id and commit after one that took a higher id was already read. Row
+# versions are read the same way by ListChangesSince.
+WATERMARK_SQL = "SELECT txid_snapshot_xmin(txid_current_snapshot())"
+
+
+def install_change_notify(engine) -> None:
+    """
+    Creates or replaces the trigger that notifies CHANNEL on every insert into change_events.
+    """
+    with engine.begin() as connection:
+        for ddl in NOTIFY_DDL:
+            connection.execute(text(ddl))
+    logger.info("Change notification trigger is in place.")
+
+
+def install_row_versions(engine) -> None:
+    """
+    Adds the version columns and indexes to tables that lack them, then creates or replaces the
+    triggers that move the version of updated rows.
+    """
+    with engine.begin() as connection:
+        for table in VERSIONED_TABLES:
+            add_missing_columns(connection, table, VERSION_COLUMNS)
+        create_missing_indexes(connection, VERSION_INDEXES)
+        for ddl in VERSION_DDL:
+            connection.execute(text(ddl))
+    logger.info("Row version triggers are in place.")
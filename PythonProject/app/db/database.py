@@ -1,56 +1,121 @@
+import logging
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
 from app.config import (
     DB_HOST,
     DB_PORT,
     DB_NAME,
     DB_USER,
     DB_PASSWORD,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_REPLICA_URLS,
+    DB_REPLICA_RETRY_SECONDS,
 )
-from app.logging_service import logger
 from app.db.base import Base
+from app.db.changes import install_change_notify, install_row_versions
+from app.db.pool_metrics import InstrumentedQueuePool, engine_pool_stats
+from app.db.deadlines import is_deadline_error
+from app.db.replicas import ReplicaSet, ReplicaUnavailable, SESSION_REPLICA, is_connection_error, replica_urls
+from app.db.search import install_search, install_trigram_search
+from app.db.upgrade import upgrade_tables
+
+logger = logging.getLogger(__name__)
 
 # Construct the database URL from environment variables
 DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-try:
-    # Create the SQLAlchemy engine with connection pooling
-    engine = create_engine(
-        DATABASE_URL,
+engine = None
+SessionFactory = None
+replicas = ReplicaSet([], DB_REPLICA_RETRY_SECONDS)
+
+def _create_engine(url, pool_size: int, max_overflow: int):
+    return create_engine(
+        url,
         pool_pre_ping=True,
-        poolclass=QueuePool,
-        pool_size=10,
-        max_overflow=20,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
         pool_recycle=3600,
     )
 
-    # Create a configured "Session" class
-    SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def init_engine(pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW):
+    """
+    Create the engine, the replica engines and the session factory, replacing any existing ones.
+    Forked worker processes call this so they never share pooled connections with their parent.
+    """
+    global engine, SessionFactory, replicas
+    try:
+        for existing in [engine, *replicas.engines]:
+            if existing is not None:
+                # close=False leaves the inherited sockets alone; they still belong to the parent process.
+                existing.dispose(close=False)
+
+        # Create the SQLAlchemy engine with connection pooling
+        engine = _create_engine(DATABASE_URL, pool_size, max_overflow)
+        replicas = ReplicaSet(
+            [_create_engine(url, pool_size, max_overflow) for url in replica_urls(DB_REPLICA_URLS, "postgresql+psycopg2")],
+            DB_REPLICA_RETRY_SECONDS,
+        )
+
+        # Create a configured "Session" class. Objects stay loaded after the commit so responses can
+        # be built from them without reloading every attribute.
+        SessionFactory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
-    logger.info("Database engine and session factory created successfully.")
+        logger.info(
+            "Database engine and session factory created successfully "
+            "(pool_size=%s, max_overflow=%s, replicas=%s).",
+            pool_size, max_overflow, len(replicas),
+        )
 
-except Exception as e:
-    logger.exception(f"Failed to create database engine or session factory: {e}")
-    raise
+    except Exception as e:
+        logger.exception("Failed to create database engine or session factory: %s", e)
+        raise
+
+init_engine()
+
+def pool_stats():
+    """
+    Checkout and connection stats of the primary and replica pools of this process.
+    """
+    return engine_pool_stats({"primary": engine, **{f"replica{index}": replica for index, replica in enumerate(replicas.engines)}})
 
 from contextlib import contextmanager
 
 @contextmanager
-def get_db_session():
+def get_db_session(read_only: bool = False):
     """
     Provide a transactional scope around a series of operations.
+    This is the only place that commits: repositories flush, so each RPC is one transaction.
+    Read-only sessions use the next healthy replica, or the primary if there is none; if the replica
+    cannot be reached it is marked down and ReplicaUnavailable is raised so the caller can retry.
     """
-    logger.info("Creating a new database session.")
-    session = SessionFactory()
+    replica = replicas.choose() if read_only else None
+    if replica is None:
+        logger.info("Creating a new database session on the primary.")
+    else:
+        logger.info("Creating a new database session on replica %s.", replica)
+    session = SessionFactory() if replica is None else SessionFactory(bind=replicas.engines[replica])
+    session.info[SESSION_REPLICA] = replica
     try:
         yield session
         session.commit()
         logger.info("Database session committed successfully.")
     except Exception as e:
         session.rollback()
-        logger.exception(f"Database session rolled back due to an exception: {e}")
+        if replica is not None and is_connection_error(e):
+            replicas.mark_down(replica)
+            logger.warning("Replica %s is unavailable; skipping it for %ss: %s", replica, replicas.retry_seconds, e)
+            raise ReplicaUnavailable(f"Replica {replica} is unavailable.") from e
+        if isinstance(e, ReplicaUnavailable):
+            logger.info("Replica %s cannot serve this read: %s", replica, e)
+            raise
+        if is_deadline_error(e):
+            # Expected under overload; a stack trace per timed out RPC would only add to it.
+            logger.warning("Database session rolled back: the RPC ran out of time.")
+            raise
+        logger.exception("Database session rolled back due to an exception: %s", e)
         raise
     finally:
         session.close()
@@ -63,7 +128,12 @@ def create_tables():
     logger.info("Creating database tables.")
     try:
         Base.metadata.create_all(bind=engine)
+        upgrade_tables(engine)
+        install_change_notify(engine)
+        install_row_versions(engine)
+        install_search(engine)
+        install_trigram_search(engine)
         logger.info("Database tables created successfully.")
     except Exception as e:
-        logger.exception(f"Failed to create database tables: {e}")
+        logger.exception("Failed to create database tables: %s", e)
         raise
@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from typing import Optional
+import time
+
+# SQLSTATE of a statement cancelled by statement_timeout (or by a cancel request).
+QUERY_CANCELED = "57014"
+
+# time.monotonic() by which the RPC served by the current thread or task must finish, if its
+# client set a deadline.
+rpc_deadline: ContextVar[Optional[float]] = ContextVar("rpc_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the deadline of the RPC passed before its transaction started, or while it waited
+    for an identical read to finish.
+    """
+
+
+def set_rpc_deadline(seconds_remaining: Optional[float]):
+    """
+    Bounds the transactions of the current RPC by its remaining time (None for no deadline).
+    Returns the token to reset the previous value with.
+    """
+    return rpc_deadline.set(None if seconds_remaining is None else time.monotonic() + seconds_remaining)
+
+
+def is_deadline_error(error: Exception) -> bool:
+    """
+    Whether error means the RPC ran out of time: its transaction could not start in time, or a
+    statement was cancelled by the statement_timeout set from its deadline.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return True
+    if isinstance(error, DBAPIError):
+        # psycopg2 reports the SQLSTATE as pgcode, the asyncpg adapter as sqlstate.
+        return QUERY_CANCELED in (getattr(error.orig, "pgcode", None), getattr(error.orig, "sqlstate", None))
+    return False
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    # Every session, sync or behind an AsyncSession, begins its transaction here. SET LOCAL ends
+    # with the transaction, so the pooled connection goes back without a timeout.
+    deadline = rpc_deadline.get()
+    if deadline is None:
+        return
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms <= 0:
+        raise DeadlineExceeded("The deadline of the RPC passed before its transaction started.")
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {remaining_ms}")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Date, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, String, Date, DateTime, Boolean, BigInteger, ForeignKey, Enum, Identity, Index, Computed, FetchedValue, PrimaryKeyConstraint, func, text, true
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime
@@ -6,10 +7,34 @@ from app.db.base import Base
 
 import enum
 
+# Column defaults are evaluated client-side, so flushed objects are complete without a refresh.
+# The server defaults cover rows written outside the ORM.
+def utc_today():
+    return datetime.utcnow().date()
+
+# Row versions are the txid of the transaction that last wrote the row: the server default covers
+# inserts and a trigger (app.db.changes) updates. They are fetched back with RETURNING
+# (eager_defaults), so written objects carry their new version without another SELECT.
+def version_column():
+    return Column(BigInteger, server_default=text("txid_current()"), server_onupdate=FetchedValue(), nullable=False)
+
+def updated_at_column():
+    return Column(DateTime(timezone=True), server_default=func.now(), server_onupdate=FetchedValue(), nullable=False)
+
+# Weighted full-text document of a book (title ranks above author).
+BOOK_SEARCH_DOCUMENT = "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', author), 'B')"
+
 class BorrowingStatus(str, enum.Enum):
     BORROWED = "BORROWED"
     RETURNED = "RETURNED"
 
+class ChangeKind(str, enum.Enum):
+    CREATED = "CREATED"
+    UPDATED = "UPDATED"
+    DELETED = "DELETED"
+    # A borrow or return flipped is_available.
+    AVAILABILITY = "AVAILABILITY"
+
 class Book(Base):
     __tablename__ = "books"
 
@@ -18,29 +43,119 @@ class Book(Base):
     author = Column(String, index=True, nullable=False)
     published_date = Column(Date, nullable=False)
     isbn = Column(String, unique=True, index=True, nullable=False)
-    is_available = Column(Boolean, default=True)
+    is_available = Column(Boolean, default=True, server_default=true())
+    # Stored so ranking reads the document instead of re-parsing title and author for every match.
+    # Not mapped (see __mapper_args__): only search queries use it.
+    search_document = Column(TSVECTOR, Computed(BOOK_SEARCH_DOCUMENT, persisted=True))
+    version = version_column()
+    updated_at = updated_at_column()
 
     borrow_records = relationship("BorrowRecord", back_populates="book")
 
+    __table_args__ = (
+        # Sort key for keyset pagination of book lists.
+        Index("ix_books_title_id", "title", "id"),
+        # Same sort key restricted to available books, so ListAvailableBooks is a plain index range scan.
+        Index("ix_books_available_title_id", "title", "id", postgresql_where=text("is_available")),
+        # Full-text search over title and author.
+        Index("ix_books_search", "search_document", postgresql_using="gin"),
+        # Sort key of ListChangesSince.
+        Index("ix_books_version_id", "version", "id"),
+    )
+    __mapper_args__ = {"exclude_properties": ["search_document"], "eager_defaults": True}
+
 class Member(Base):
     __tablename__ = "members"
 
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
-    join_date = Column(Date, default=datetime.utcnow, nullable=False)
+    join_date = Column(Date, default=utc_today, server_default=func.current_date(), nullable=False)
+    version = version_column()
+    updated_at = updated_at_column()
 
     borrow_records = relationship("BorrowRecord", back_populates="member")
 
+    __table_args__ = (
+        # Sort key for keyset pagination of member lists.
+        Index("ix_members_name_id", "name", "id"),
+        # Case-insensitive prefix search (lower(x) LIKE 'prefix%').
+        Index("ix_members_name_prefix", text("lower(name) text_pattern_ops")),
+        Index("ix_members_email_prefix", text("lower(email) text_pattern_ops")),
+        # Sort key of ListChangesSince.
+        Index("ix_members_version_id", "version", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
 class BorrowRecord(Base):
     __tablename__ = "borrow_records"
 
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     book_id = Column(String, ForeignKey("books.id"), nullable=False)
     member_id = Column(String, ForeignKey("members.id"), nullable=False)
-    borrow_date = Column(Date, default=datetime.utcnow, nullable=False)
+    borrow_date = Column(Date, default=utc_today, server_default=func.current_date(), nullable=False)
     return_date = Column(Date, nullable=True) # Explicitly nullable
     status = Column(Enum(BorrowingStatus), default=BorrowingStatus.BORROWED, nullable=False) # New status column
+    version = version_column()
+    updated_at = updated_at_column()
 
     book = relationship("Book", back_populates="borrow_records")
     member = relationship("Member", back_populates="borrow_records")
+
+    __table_args__ = (
+        # Sort key for keyset pagination of borrowing lists.
+        Index("ix_borrow_records_borrow_date_id", "borrow_date", "id"),
+        # Active borrowings only: a small index however long the history gets. Being unique, it also
+        # guarantees that a book is never borrowed twice at the same time.
+        Index(
+            "ix_borrow_records_active_book_id",
+            "book_id",
+            unique=True,
+            postgresql_where=text("status = 'BORROWED'"),
+        ),
+        # Sort key of ListChangesSince.
+        Index("ix_borrow_records_version_id", "version", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
+
+class ChangeEvent(Base):
+    """
+    Transactional outbox of WatchBooks and WatchBorrowings: the write paths insert one row per
+    changed book or borrow record in the transaction of the change, so a change is in here exactly
+    when it committed. Rows only name the entity; watchers are sent its current state.
+    """
+    __tablename__ = "change_events"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    # Transaction that made the change. Changes are read in ranges of it that no running
+    # transaction can still add to (see app.db.changes).
+    txid = Column(BigInteger, server_default=text("txid_current()"), nullable=False)
+    topic = Column(String, nullable=False)
+    kind = Column(Enum(ChangeKind), nullable=False)
+    entity_id = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_change_events_txid", "txid"),
+        # Rows are appended in time order, so a BRIN index is enough for pruning old ones.
+        Index("ix_change_events_created_at", "created_at", postgresql_using="brin"),
+    )
+
+class Tombstone(Base):
+    """
+    Ids of deleted books and members with the version of the deleting transaction, so that
+    ListChangesSince can report deletions. Rows are kept: a client may sync from any version.
+    """
+    __tablename__ = "tombstones"
+
+    # Table the entity was deleted from (books or members).
+    entity = Column(String, nullable=False)
+    entity_id = Column(String, nullable=False)
+    version = Column(BigInteger, server_default=text("txid_current()"), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("entity", "entity_id"),
+        # Sort key of ListChangesSince, per entity.
+        Index("ix_tombstones_entity_version_id", "entity", "version", "entity_id"),
+    )
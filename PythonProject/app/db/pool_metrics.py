@@ -0,0 +1,100 @@
+from bisect import bisect_left
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import Dict, Sequence
+import threading
+import time
+import weakref
+
+# Upper bounds of the checkout wait histogram buckets (milliseconds); a last bucket takes the rest.
+WAIT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class WaitHistogram:
+    """
+    Thread-safe histogram of durations with fixed buckets, plus their count and sum.
+    """
+
+    def __init__(self, buckets_ms: Sequence[float] = WAIT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._counts = [0] * (len(self.buckets_ms) + 1)
+        self._sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, milliseconds: float) -> None:
+        index = bisect_left(self.buckets_ms, milliseconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum_ms += milliseconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts, total_ms = list(self._counts), self._sum_ms
+        return {"buckets_ms": self.buckets_ms, "counts": counts, "count": sum(counts), "sum_ms": total_ms}
+
+
+class _InstrumentedPool:
+    """
+    Times every checkout, waiting included, and keeps track of the pool's connections to report
+    their age.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = WaitHistogram()
+        self._records = weakref.WeakSet()
+
+    @property
+    def max_overflow(self) -> int:
+        return self._max_overflow
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.checkout_wait.observe((time.perf_counter() - started) * 1000)
+
+    def _create_connection(self):
+        record = super()._create_connection()
+        self._records.add(record)
+        return record
+
+    def connection_ages(self) -> Sequence[float]:
+        # starttime is reset whenever a record reconnects, so this is the age of the connection.
+        now = time.time()
+        return [now - record.starttime for record in list(self._records) if record.dbapi_connection is not None]
+
+    def stats(self) -> Dict:
+        ages = self.connection_ages()
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            # overflow() counts from -pool_size while the pool has not opened all its connections yet.
+            "overflow_in_use": max(0, self.overflow()),
+            "connections": len(ages),
+            "oldest_connection_seconds": max(ages, default=0.0),
+            "mean_connection_age_seconds": sum(ages) / len(ages) if ages else 0.0,
+            "checkout_wait": self.checkout_wait.snapshot(),
+        }
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_pool_stats(engines: Dict) -> Dict[str, Dict]:
+    """
+    Stats of the instrumented pools of engines, a {name: engine} dict of sync or async engines.
+    """
+    stats = {}
+    for name, engine in engines.items():
+        pool = getattr(engine, "sync_engine", engine).pool
+        if isinstance(pool, _InstrumentedPool):
+            stats[name] = pool.stats()
+    return stats
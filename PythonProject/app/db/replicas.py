@@ -0,0 +1,125 @@
+from collections import OrderedDict
+from app.config import READ_YOUR_WRITES_SECONDS
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from typing import List, Optional, Sequence
+import itertools
+import threading
+import time
+
+# Metadata key a client (or the API gateway, on behalf of its users) can send to be recognised
+# across connections for read-your-writes; without it the peer address is used.
+CLIENT_ID_METADATA_KEY = "x-client-id"
+# Key of Session.info holding the index of the replica a session is bound to, or None on the primary.
+SESSION_REPLICA = "replica"
+
+
+class ReplicaUnavailable(Exception):
+    """
+    Raised when a read-only session could not use its replica: it could not be reached and has been
+    marked down, or it has not replayed what the read needs yet. The action runs again on the primary.
+    """
+
+
+def on_replica(session) -> bool:
+    # Sessions not made by get_db_session / get_async_db_session are on the primary.
+    return session.info.get(SESSION_REPLICA) is not None
+
+
+def replica_urls(urls: Sequence[str], drivername: str) -> List:
+    # Replicas are configured as plain postgresql:// URLs; each engine picks its own driver.
+    return [make_url(url).set(drivername=drivername) for url in urls]
+
+
+def is_connection_error(error: Exception) -> bool:
+    """
+    Whether error means the node could not be reached, as opposed to a failing statement.
+    """
+    if isinstance(error, OSError):
+        # asyncpg raises socket errors unwrapped when it cannot connect.
+        return True
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or (isinstance(error, OperationalError) and error.statement is None)
+    return False
+
+
+class ReplicaSet:
+    """
+    Read replica engines of one process, handed out round-robin.
+
+    A replica that fails to connect is skipped for retry_seconds and then tried again by the next
+    read; when every replica is down, reads fall back to the primary.
+    """
+
+    def __init__(self, engines: Sequence, retry_seconds: float):
+        self.engines = list(engines)
+        self.retry_seconds = retry_seconds
+        self._down_until = [0.0] * len(self.engines)
+        self._next = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def choose(self) -> Optional[int]:
+        """
+        Returns the index of the next healthy replica, or None to use the primary.
+        """
+        if not self.engines:
+            return None
+        now = time.monotonic()
+        start = next(self._next)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self._down_until[index] <= now:
+                return index
+        return None
+
+    def mark_down(self, index: int) -> None:
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def healthy(self) -> List[bool]:
+        now = time.monotonic()
+        return [until <= now for until in self._down_until]
+
+
+class PrimaryPins:
+    """
+    Clients that wrote within the last window_seconds; their reads go to the primary so they see
+    their own writes while the replicas catch up. A window of 0 disables pinning.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        # Every pin lasts the same window, so insertion order is expiry order.
+        self._pinned_until = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pin(self, client: str) -> None:
+        if self.window_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pinned_until[client] = now + self.window_seconds
+            self._pinned_until.move_to_end(client)
+            while self._pinned_until and next(iter(self._pinned_until.values())) <= now:
+                self._pinned_until.popitem(last=False)
+
+    def is_pinned(self, client: str) -> bool:
+        if self.window_seconds <= 0:
+            return False
+        with self._lock:
+            return self._pinned_until.get(client, 0.0) > time.monotonic()
+
+
+def client_key(context) -> str:
+    """
+    Identifies the caller of an RPC for read-your-writes: the x-client-id metadata if sent,
+    otherwise its address.
+    """
+    for key, value in context.invocation_metadata() or ():
+        if key == CLIENT_ID_METADATA_KEY:
+            return value
+    return context.peer()
+
+
+primary_pins = PrimaryPins(READ_YOUR_WRITES_SECONDS)
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from app.db.models import BOOK_SEARCH_DOCUMENT
+from app.db.upgrade import add_missing_columns, create_missing_indexes
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The full-text document of books and the search indexes, for tables created before them. Adding
+# the generated column computes it for every existing book.
+BOOK_SEARCH_COLUMNS = (("search_document", f"tsvector GENERATED ALWAYS AS ({BOOK_SEARCH_DOCUMENT}) STORED"),)
+SEARCH_INDEXES = ("ix_books_search", "ix_members_name_prefix", "ix_members_email_prefix")
+
+# Trigram indexes serve similarity (%) matches on member names and emails. They need the pg_trgm
+# extension, which is not part of core Postgres, so they are created here rather than declared
+# on the model.
+TRIGRAM_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_members_name_trgm ON members USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_members_email_trgm ON members USING gin (email gin_trgm_ops)",
+)
+
+# Set by install_trigram_search; member search only matches prefixes without it.
+trigram_search = False
+
+
+def install_search(engine) -> None:
+    """
+    Adds the book search document and the search indexes to tables that lack them.
+    """
+    with engine.begin() as connection:
+        add_missing_columns(connection, "books", BOOK_SEARCH_COLUMNS)
+        create_missing_indexes(connection, SEARCH_INDEXES)
+
+
+def install_trigram_search(engine) -> bool:
+    """
+    Creates the pg_trgm extension and the trigram indexes if possible and records whether
+    typo-tolerant member search is available.
+    """
+    global trigram_search
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for ddl in TRIGRAM_INDEXES:
+                connection.execute(text(ddl))
+        trigram_search = True
+        logger.info("Trigram search indexes are in place.")
+    except DBAPIError as e:
+        trigram_search = False
+        logger.warning("pg_trgm is not available; member search falls back to prefix matching: %s", e)
+    return trigram_search
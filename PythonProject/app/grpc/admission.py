@@ -0,0 +1,315 @@
+from asyncio import CancelledError
+from app.config import (
+    ADMISSION_BACKOFF,
+    ADMISSION_CONTROL,
+    ADMISSION_INITIAL_LIMIT,
+    ADMISSION_LATENCY_TARGET_MS,
+    ADMISSION_MAX_LIMIT,
+    ADMISSION_MIN_LIMIT,
+    DEADLINE_PROPAGATION,
+)
+from app.db.deadlines import set_rpc_deadline
+from app.grpc.bulkheads import WATCH, is_watch_method, run_on
+from app.grpc.executor import current_pool, submitted_at
+from typing import Callable, Dict, Optional
+import grpc
+import threading
+import time
+
+_DEADLINE_EXCEEDED = grpc.StatusCode.DEADLINE_EXCEEDED
+_RESOURCE_EXHAUSTED = grpc.StatusCode.RESOURCE_EXHAUSTED
+_FAILED_PRECONDITION = grpc.StatusCode.FAILED_PRECONDITION
+
+# The thread-pool server reports an RPC without a deadline as having centuries left.
+_NO_DEADLINE_SECONDS = 1e9
+
+OVERLOADED_DETAILS = "The server is overloaded; retry later."
+EXPIRED_DETAILS = "The deadline passed before the RPC started."
+NO_WATCH_POOL_DETAILS = f"Change streams need a '{WATCH}' pool in GRPC_POOLS."
+
+
+def time_remaining(context) -> Optional[float]:
+    """
+    Seconds left until the deadline of the RPC, or None if its client did not set one.
+    """
+    remaining = context.time_remaining()
+    return None if remaining is None or remaining > _NO_DEADLINE_SECONDS else remaining
+
+
+class AimdLimiter:
+    """
+    Concurrency limit adapted by additive increase / multiplicative decrease.
+
+    Every RPC that finishes within latency_target_ms while at least half the limit is in use adds
+    1/limit, so the limit grows by about one per limit's worth of RPCs. An RPC that overruns the
+    target or its deadline multiplies the limit by backoff. Only RPCs admitted after the last
+    decrease can decrease it again, so a burst of slow RPCs cuts it once rather than once each.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target_ms: float,
+        backoff: float,
+        enabled: bool = True,
+    ):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError(
+                "Admission limits must satisfy 1 <= ADMISSION_MIN_LIMIT <= ADMISSION_INITIAL_LIMIT <= "
+                f"ADMISSION_MAX_LIMIT, got {minimum}, {initial} and {maximum}."
+            )
+        if not 0 < backoff < 1:
+            raise ValueError(f"ADMISSION_BACKOFF must be between 0 and 1, got {backoff}.")
+        self.enabled = enabled
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target_ms / 1000
+        self.backoff = backoff
+        self.rejected = 0
+        self.expired = 0
+        self._decreased_at = 0.0
+        self._lock = threading.Lock()
+
+    def admits(self, in_flight: int) -> bool:
+        """
+        Whether one more RPC may start while in_flight are admitted and not finished yet.
+        """
+        if not self.enabled or in_flight < self.limit:
+            return True
+        with self._lock:
+            self.rejected += 1
+        return False
+
+    def on_sample(self, admitted: float, latency: float, timed_out: bool, in_flight: int) -> None:
+        """
+        Adjusts the limit for an RPC admitted at time.perf_counter() admitted that took latency
+        seconds, with in_flight RPCs admitted when it finished.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if timed_out or latency > self.latency_target:
+                self._decrease(admitted)
+            elif in_flight * 2 >= self.limit:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_expired(self, admitted: float) -> None:
+        """
+        Counts an RPC whose deadline passed while it waited to start, which is overload too.
+        """
+        with self._lock:
+            self.expired += 1
+            if self.enabled:
+                self._decrease(admitted)
+
+    def _decrease(self, admitted: float) -> None:
+        if admitted > self._decreased_at:
+            self.limit = max(self.minimum, self.limit * self.backoff)
+            self._decreased_at = time.perf_counter()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"enabled": self.enabled, "limit": int(self.limit), "rejected": self.rejected, "expired": self.expired}
+
+
+def _reject(request, context):
+    context.abort(_RESOURCE_EXHAUSTED, OVERLOADED_DETAILS)
+
+
+def _reject_without_watch_pool(request, context):
+    context.abort(_FAILED_PRECONDITION, NO_WATCH_POOL_DETAILS)
+
+
+def _kind(handler) -> str:
+    for kind in ("unary_unary", "unary_stream", "stream_unary", "stream_stream"):
+        if getattr(handler, kind):
+            return kind
+    raise ValueError("Handler has no behavior.")
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """
+    Admission control and deadline checks of the thread-pool server.
+
+    The server calls intercept_service on its polling thread before it queues the RPC for the
+    executor, so an RPC over the limit is turned away before it waits. Every pool of the
+    BulkheadExecutor has its own limit, which counts the admitted RPCs running on the pool and
+    waiting for it. On the pool's thread, an RPC whose deadline passed while it waited is rejected
+    with DEADLINE_EXCEEDED, the others run with their transactions bounded by the time left, and
+    each unary RPC's time since it was queued feeds the limiter of its pool.
+
+    Watch streams are not limited by latency: they hold a thread of the watch pool for as long as
+    they are open, so one is admitted only while that pool has a thread free, and never on the
+    pools of the other RPCs.
+    """
+
+    def __init__(self, executor, limiters: Optional[Callable[[str], AimdLimiter]] = None, deadlines: bool = DEADLINE_PROPAGATION):
+        self.executor = executor
+        self.limiters = limiters or limiter_for
+        self.deadlines = deadlines
+        self._handlers = {}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method
+        cached = self._handlers.get(method)
+        if cached is None or cached[0] is not handler:
+            kind = _kind(handler)
+            pool = self.executor.pool_for(method)
+            # Rejections still wait for a thread to send their status; they must not count as load.
+            if is_watch_method(method) and pool.name == WATCH:
+                # Open streams hold every thread of the watch pool; the rejection would wait for one.
+                rejection = run_on(handler._replace(**{kind: _reject}), self.executor.pool_outside(WATCH).uncounted)
+            elif is_watch_method(method):
+                rejection = run_on(handler._replace(**{kind: _reject_without_watch_pool}), pool.uncounted)
+            else:
+                rejection = run_on(handler._replace(**{kind: _reject}), pool.uncounted)
+            cached = self._handlers[method] = (handler, pool, self._wrap(kind, handler), rejection)
+        _, pool, admitted, rejection = cached
+        if is_watch_method(method):
+            return admitted if pool.name == WATCH and pool.admitted < pool.limit else rejection
+        return admitted if self.limiters(pool.name).admits(pool.admitted) else rejection
+
+    def _start(self, context, limiter: AimdLimiter) -> float:
+        # Returns when the RPC was queued; aborts it if its deadline has passed since.
+        admitted = submitted_at()
+        if self.deadlines:
+            remaining = time_remaining(context)
+            if remaining is not None and remaining <= 0:
+                limiter.on_expired(admitted)
+                context.abort(_DEADLINE_EXCEEDED, EXPIRED_DETAILS)
+            # Not reset afterwards, like the request id: every RPC on these threads sets its own.
+            set_rpc_deadline(remaining)
+        return admitted
+
+    def _wrap(self, kind, handler):
+        behavior = getattr(handler, kind)
+
+        if kind in ("unary_unary", "stream_unary"):
+
+            def unary_response(request, context):
+                pool = current_pool()
+                limiter = self.limiters(pool.name)
+                admitted = self._start(context, limiter)
+                timed_out = False
+                try:
+                    response = behavior(request, context)
+                    timed_out = context.code() is _DEADLINE_EXCEEDED
+                    return response
+                finally:
+                    limiter.on_sample(admitted, time.perf_counter() - admitted, timed_out, pool.admitted)
+
+            return handler._replace(**{kind: unary_response})
+
+        def stream_response(request, context):
+            # Streams last as long as their client reads, so their latency says nothing about load.
+            self._start(context, self.limiters(current_pool().name))
+            yield from behavior(request, context)
+
+        return handler._replace(**{kind: stream_response})
+
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """
+    grpc.aio counterpart of AdmissionInterceptor. RPCs do not wait for a thread here, so the limit
+    counts the RPCs running on the event loop and an RPC is admitted or rejected as it starts.
+    Watch streams cost nothing on the loop while idle, so they are neither limited nor counted.
+    """
+
+    def __init__(self, limiter: Optional[AimdLimiter] = None, deadlines: bool = DEADLINE_PROPAGATION):
+        self.limiter = limiter or limiter_for("default")
+        self.deadlines = deadlines
+        self.in_flight = 0
+        self._handlers = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        cached = self._handlers.get(handler_call_details.method)
+        if cached is None or cached[0] is not handler:
+            kind = _kind(handler)
+            cached = (handler, self._wrap(kind, handler, is_watch_method(handler_call_details.method)))
+            self._handlers[handler_call_details.method] = cached
+        return cached[1]
+
+    async def _start(self, context, limited: bool = True) -> float:
+        # Returns when the RPC was admitted; aborts it if it is expired or, if limited, over the limit.
+        admitted = time.perf_counter()
+        if self.deadlines:
+            remaining = time_remaining(context)
+            if remaining is not None and remaining <= 0:
+                self.limiter.on_expired(admitted)
+                await context.abort(_DEADLINE_EXCEEDED, EXPIRED_DETAILS)
+            # Every RPC runs in its own task, so this stays with the RPC.
+            set_rpc_deadline(remaining)
+        if limited and not self.limiter.admits(self.in_flight):
+            await context.abort(_RESOURCE_EXHAUSTED, OVERLOADED_DETAILS)
+        return admitted
+
+    def _wrap(self, kind, handler, watch: bool = False):
+        limiter = self.limiter
+        behavior = getattr(handler, kind)
+
+        if kind in ("unary_unary", "stream_unary"):
+
+            async def unary_response(request, context):
+                admitted = await self._start(context)
+                self.in_flight += 1
+                timed_out = False
+                try:
+                    response = await behavior(request, context)
+                    timed_out = context.code() is _DEADLINE_EXCEEDED
+                    return response
+                except CancelledError:
+                    # The client gave up, most likely at its deadline.
+                    timed_out = True
+                    raise
+                finally:
+                    self.in_flight -= 1
+                    limiter.on_sample(admitted, time.perf_counter() - admitted, timed_out, self.in_flight)
+
+            return handler._replace(**{kind: unary_response})
+
+        async def stream_response(request, context):
+            await self._start(context)
+            self.in_flight += 1
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            finally:
+                self.in_flight -= 1
+
+        async def watch_response(request, context):
+            await self._start(context, limited=False)
+            async for response in behavior(request, context):
+                yield response
+
+        return handler._replace(**{kind: watch_response if watch else stream_response})
+
+
+# Limiter of every pool of the sync server by name; the grpc.aio server uses the "default" one.
+admission_limiters: Dict[str, AimdLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(pool: str) -> AimdLimiter:
+    limiter = admission_limiters.get(pool)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = admission_limiters.get(pool)
+            if limiter is None:
+                limiter = admission_limiters[pool] = AimdLimiter(
+                    ADMISSION_INITIAL_LIMIT,
+                    ADMISSION_MIN_LIMIT,
+                    ADMISSION_MAX_LIMIT,
+                    ADMISSION_LATENCY_TARGET_MS,
+                    ADMISSION_BACKOFF,
+                    ADMISSION_CONTROL,
+                )
+    return limiter
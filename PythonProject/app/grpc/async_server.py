@@ -0,0 +1,429 @@
+import grpc
+from app.proto import library_pb2, library_pb2_grpc
+from app.services.async_library_service import AsyncLibraryService
+from app.services.change_feed import AsyncSubscription, change_feed
+from app.repositories.async_library_repository import AsyncLibraryRepository
+from app.db.async_database import async_pool_stats, get_async_db_session
+from app.db.changes import BOOKS, BORROWINGS
+from app.db.replicas import ReplicaUnavailable, client_key, primary_pins
+from app.logging_service import bind_request_id
+from app.grpc.admission import AsyncAdmissionInterceptor, time_remaining
+from app.grpc.coalescing import as_bytes, async_read_flights, flight_key
+from app.grpc.executor import PoolMonitor
+from app.grpc.fragments import book_fragments, member_fragments, PreserializedResponses
+from app.grpc.metrics import AsyncMetricsInterceptor
+from app.grpc.mapping import (
+    to_book_proto,
+    to_member_proto,
+    to_borrow_record_proto,
+    to_borrowing_details_proto,
+    to_batch_create_book_result_proto,
+    to_batch_create_member_result_proto,
+    to_book_lookup_result_proto,
+    to_member_lookup_result_proto,
+    to_book_search_hit_proto,
+    to_book_suggestion_proto,
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    SYNC_ENTITIES,
+    to_list_changes_since_response,
+    to_member_search_hit_proto,
+    to_watch_books_response,
+    to_watch_borrowings_response,
+    set_error_status,
+)
+from app.config import GRPC_AIO_MAX_CONCURRENT_RPCS
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AsyncLibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
+    """
+    grpc.aio counterpart of LibraryServiceServicer. RPCs run as coroutines on the event loop,
+    so concurrency is bounded by the database pool rather than by a thread pool.
+    """
+
+    async def _execute_with_service(self, context, action, read_only=False, request=None):
+        # Routed and coalesced like LibraryServiceServicer._execute_with_service.
+        bind_request_id(context)
+        try:
+            logger.info("Executing async service action")
+            client = client_key(context)
+            pinned = primary_pins.is_pinned(client)
+            on_replica = read_only and not pinned
+            if on_replica and request is not None and async_read_flights.enabled:
+                async def shared_action():
+                    return as_bytes(await self._run_action(action, True))
+
+                result = await async_read_flights.do(flight_key(request), shared_action, time_remaining(context))
+            else:
+                result = await self._run_action(action, on_replica, cached=not pinned)
+            if not read_only:
+                primary_pins.pin(client)
+                async_read_flights.invalidate()
+            logger.info("Async service action executed successfully")
+            return result
+        except Exception as e:
+            set_error_status(context, e)
+        return None
+
+    async def _run_action(self, action, on_replica, cached=True):
+        while True:
+            try:
+                async with get_async_db_session(read_only=on_replica) as db_session:
+                    repo = AsyncLibraryRepository(db_session, cached)
+                    service = AsyncLibraryService(repo)
+                    return await action(service)
+            except ReplicaUnavailable:
+                on_replica = False
+
+    async def _stream_with_service(self, context, action):
+        # The session stays open for the lifetime of the stream so the server-side cursor can be consumed lazily.
+        bind_request_id(context)
+        try:
+            logger.info("Executing async streaming service action")
+            on_replica = not primary_pins.is_pinned(client_key(context))
+            async with get_async_db_session(read_only=on_replica) as db_session:
+                repo = AsyncLibraryRepository(db_session)
+                service = AsyncLibraryService(repo)
+                async for response in action(service):
+                    yield response
+                logger.info("Async streaming service action executed successfully")
+        except Exception as e:
+            set_error_status(context, e)
+
+    async def _watch(self, context, topic, resume_token, build):
+        # See LibraryServiceServicer._watch; the change feed runs on a thread of its own.
+        bind_request_id(context)
+        subscription = None
+        try:
+            logger.info("Watching %s changes", topic)
+            subscription = change_feed.subscribe(topic, resume_token, AsyncSubscription)
+            async for batch in subscription:
+                yield batch.response(topic, build)
+            logger.info("Stopped watching %s changes", topic)
+        except Exception as e:
+            set_error_status(context, e)
+        finally:
+            if subscription is not None:
+                subscription.close()
+
+    async def CreateBook(self, request, context):
+        async def action(service):
+            logger.info("Creating book with title: %s", request.title)
+            book = await service.create_book(request.title, request.author, request.published_date, request.isbn)
+            logger.info("Book created with ID: %s", book.id)
+            return library_pb2.CreateBookResponse(book=to_book_proto(book))
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.CreateBookResponse()
+
+    async def UpdateBook(self, request, context):
+        async def action(service):
+            logger.info("Updating book with ID: %s", request.id)
+            book = await service.update_book(
+                request.id, request.title, request.author, request.published_date, request.isbn, request.expected_version
+            )
+            if not book:
+                context.set_code(grpc.StatusCode.NOT_FOUND)
+                context.set_details(f"Book with id {request.id} not found")
+                return None
+            logger.info("Book with ID: %s updated successfully", request.id)
+            return library_pb2.UpdateBookResponse(book=to_book_proto(book))
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.UpdateBookResponse()
+
+    async def DeleteBook(self, request, context):
+        async def action(service):
+            logger.info("Deleting book with ID: %s", request.id)
+            await service.delete_book(request.id)
+            logger.info("Book with ID: %s deleted successfully", request.id)
+            return library_pb2.google_dot_protobuf_dot_empty__pb2.Empty()
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.google_dot_protobuf_dot_empty__pb2.Empty()
+
+    async def GetBook(self, request, context):
+        async def action(service):
+            logger.info("Getting book with ID: %s", request.id)
+            book = await service.get_book(request.id)
+            logger.info("Book with ID: %s retrieved successfully", request.id)
+            return to_book_proto(book)
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.Book()
+
+    async def BatchGetBooks(self, request, context):
+        async def action(service):
+            logger.info("Batch getting %s books", len(request.ids))
+            results = await service.batch_get_books(list(request.ids))
+            return library_pb2.BatchGetBooksResponse(
+                results=[to_book_lookup_result_proto(book_id, book) for book_id, book in results]
+            )
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.BatchGetBooksResponse()
+
+    async def ListBooks(self, request, context):
+        async def action(service):
+            logger.info("Listing books")
+            books, next_page_token = await service.list_books(request.page_size, request.page_token)
+            logger.info("Listed %s books", len(books))
+            return book_fragments.encode_list_response(books, next_page_token)
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.ListBooksResponse()
+
+    async def SearchBooks(self, request, context):
+        async def action(service):
+            logger.info("Searching books for: %s", request.query)
+            hits, next_page_token = await service.search_books(request.query, request.page_size, request.page_token)
+            logger.info("Found %s matching books", len(hits))
+            return library_pb2.SearchBooksResponse(
+                hits=[to_book_search_hit_proto(hit) for hit in hits], next_page_token=next_page_token
+            )
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.SearchBooksResponse()
+
+    async def SuggestBooks(self, request, context):
+        async def action(service):
+            logger.info("Suggesting books for: %s", request.query)
+            suggestions = await service.suggest_books(request.query, request.limit)
+            logger.info("Suggested %s books", len(suggestions))
+            return library_pb2.SuggestBooksResponse(
+                suggestions=[to_book_suggestion_proto(suggestion) for suggestion in suggestions]
+            )
+
+        response = await self._execute_with_service(context, action, read_only=True)
+        return response or library_pb2.SuggestBooksResponse()
+
+    async def BatchCreateBooks(self, request, context):
+        async def action(service):
+            logger.info("Batch creating %s books", len(request.books))
+            items = [(book.title, book.author, book.published_date, book.isbn) for book in request.books]
+            results = await service.batch_create_books(items)
+            return library_pb2.BatchCreateBooksResponse(
+                results=[to_batch_create_book_result_proto(result) for result in results]
+            )
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.BatchCreateBooksResponse()
+
+    async def StreamBooks(self, request, context):
+        async def action(service):
+            logger.info("Streaming all books")
+            total = 0
+            async for books in service.stream_books(request.batch_size):
+                total += len(books)
+                yield library_pb2.StreamBooksResponse(books=[to_book_proto(book) for book in books])
+            logger.info("Streamed %s books", total)
+
+        async for response in self._stream_with_service(context, action):
+            yield response
+
+    async def ListAvailableBooks(self, request, context):
+        async def action(service):
+            logger.info("Listing available books")
+            books, next_page_token = await service.list_available_books(request.page_size, request.page_token)
+            logger.info("Listed %s available books", len(books))
+            return book_fragments.encode_list_response(books, next_page_token)
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.ListAvailableBooksResponse()
+
+    async def BatchGetMembers(self, request, context):
+        async def action(service):
+            logger.info("Batch getting %s members", len(request.ids))
+            results = await service.batch_get_members(list(request.ids))
+            return library_pb2.BatchGetMembersResponse(
+                results=[to_member_lookup_result_proto(member_id, member) for member_id, member in results]
+            )
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.BatchGetMembersResponse()
+
+    async def ListMembers(self, request, context):
+        async def action(service):
+            logger.info("Listing members")
+            members, next_page_token = await service.list_members(request.page_size, request.page_token)
+            logger.info("Listed %s members", len(members))
+            return member_fragments.encode_list_response(members, next_page_token)
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.ListMembersResponse()
+
+    async def SearchMembers(self, request, context):
+        async def action(service):
+            logger.info("Searching members for: %s", request.query)
+            hits, next_page_token = await service.search_members(request.query, request.page_size, request.page_token)
+            logger.info("Found %s matching members", len(hits))
+            return library_pb2.SearchMembersResponse(
+                hits=[to_member_search_hit_proto(hit) for hit in hits], next_page_token=next_page_token
+            )
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.SearchMembersResponse()
+
+    async def BatchCreateMembers(self, request, context):
+        async def action(service):
+            logger.info("Batch creating %s members", len(request.members))
+            items = [(member.name, member.email) for member in request.members]
+            results = await service.batch_create_members(items)
+            return library_pb2.BatchCreateMembersResponse(
+                results=[to_batch_create_member_result_proto(result) for result in results]
+            )
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.BatchCreateMembersResponse()
+
+    async def StreamMembers(self, request, context):
+        async def action(service):
+            logger.info("Streaming all members")
+            total = 0
+            async for members in service.stream_members(request.batch_size):
+                total += len(members)
+                yield library_pb2.StreamMembersResponse(members=[to_member_proto(member) for member in members])
+            logger.info("Streamed %s members", total)
+
+        async for response in self._stream_with_service(context, action):
+            yield response
+
+    async def CreateMember(self, request, context):
+        async def action(service):
+            logger.info("Creating member with name: %s", request.name)
+            member = await service.create_member(request.name, request.email)
+            logger.info("Member created with ID: %s", member.id)
+            return library_pb2.CreateMemberResponse(member=to_member_proto(member))
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.CreateMemberResponse()
+
+    async def UpdateMember(self, request, context):
+        async def action(service):
+            logger.info("Updating member with ID: %s", request.id)
+            member = await service.update_member(request.id, request.name, request.email, request.expected_version)
+            logger.info("Member with ID: %s updated successfully", request.id)
+            return library_pb2.UpdateMemberResponse(member=to_member_proto(member))
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.UpdateMemberResponse()
+
+    async def DeleteMember(self, request, context):
+        async def action(service):
+            logger.info("Deleting member with ID: %s", request.id)
+            await service.delete_member(request.id)
+            logger.info("Member with ID: %s deleted successfully", request.id)
+            return library_pb2.google_dot_protobuf_dot_empty__pb2.Empty()
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.google_dot_protobuf_dot_empty__pb2.Empty()
+
+    async def GetMember(self, request, context):
+        async def action(service):
+            logger.info("Getting member with ID: %s", request.id)
+            member = await service.get_member(request.id)
+            logger.info("Member with ID: %s retrieved successfully", request.id)
+            return to_member_proto(member)
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.Member()
+
+    async def BorrowBook(self, request, context):
+        async def action(service):
+            logger.info("Borrowing book with ID: %s for member ID: %s", request.book_id, request.member_id)
+            borrow_record = await service.borrow_book(request.book_id, request.member_id)
+            logger.info("Book with ID: %s borrowed successfully by member ID: %s", request.book_id, request.member_id)
+            return library_pb2.BorrowBookResponse(borrow_record=to_borrow_record_proto(borrow_record))
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.BorrowBookResponse()
+
+    async def ReturnBook(self, request, context):
+        async def action(service):
+            logger.info("Returning book with borrow record ID: %s", request.borrow_record_id)
+            borrow_record = await service.return_book(request.borrow_record_id)
+            logger.info("Book with borrow record ID: %s returned successfully", request.borrow_record_id)
+            return library_pb2.ReturnBookResponse(borrow_record=to_borrow_record_proto(borrow_record))
+
+        response = await self._execute_with_service(context, action)
+        return response or library_pb2.ReturnBookResponse()
+
+    async def ListBorrowings(self, request, context):
+        async def action(service):
+            logger.info("Listing borrowing records")
+            borrow_records, next_page_token = await service.list_borrowings(request.page_size, request.page_token)
+            logger.info("Listed %s borrowing records with details", len(borrow_records))
+            return library_pb2.ListBorrowingsResponse(
+                borrowings=[to_borrowing_details_proto(borrow_record) for borrow_record in borrow_records],
+                next_page_token=next_page_token,
+            )
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.ListBorrowingsResponse()
+
+    async def StreamBorrowings(self, request, context):
+        async def action(service):
+            logger.info("Streaming all borrowing records")
+            total = 0
+            async for borrow_records in service.stream_borrowings(request.batch_size):
+                total += len(borrow_records)
+                yield library_pb2.StreamBorrowingsResponse(
+                    borrowings=[to_borrowing_details_proto(borrow_record) for borrow_record in borrow_records]
+                )
+            logger.info("Streamed %s borrowing records with details", total)
+
+        async for response in self._stream_with_service(context, action):
+            yield response
+
+    async def ExportData(self, request, context):
+        async def action(service):
+            dataset = EXPORT_DATASETS.get(request.dataset, "")
+            file_format = EXPORT_FORMATS.get(request.format, "")
+            logger.info("Exporting %s as %s", dataset, file_format)
+            total = 0
+            async for chunk in service.export_data(dataset, file_format):
+                total += len(chunk)
+                yield library_pb2.ExportDataChunk(data=chunk)
+            logger.info("Exported %s bytes of %s", total, dataset)
+
+        async for response in self._stream_with_service(context, action):
+            yield response
+
+    async def WatchBooks(self, request, context):
+        async for response in self._watch(context, BOOKS, request.resume_token, to_watch_books_response):
+            yield response
+
+    async def WatchBorrowings(self, request, context):
+        async for response in self._watch(context, BORROWINGS, request.resume_token, to_watch_borrowings_response):
+            yield response
+
+    async def ListChangesSince(self, request, context):
+        async def action(service):
+            entity = SYNC_ENTITIES.get(request.entity, "")
+            changed, deleted_ids, version, next_page_token = await service.list_changes_since(
+                entity, request.version, request.page_size, request.page_token
+            )
+            logger.info("Listed %s changed and %s deleted %s since version %s", len(changed), len(deleted_ids), entity, request.version)
+            return to_list_changes_since_response(entity, changed, deleted_ids, version, next_page_token)
+
+        response = await self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.ListChangesSinceResponse()
+
+def create_async_server(options=None):
+    logger.info("Creating grpc.aio server")
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=GRPC_AIO_MAX_CONCURRENT_RPCS,
+        interceptors=[AsyncMetricsInterceptor(), AsyncAdmissionInterceptor()],
+        options=options,
+    )
+    # No thread pool to size here: concurrency is bounded by the connection pool.
+    PoolMonitor(async_pool_stats).start()
+
+    library_pb2_grpc.add_LibraryServiceServicer_to_server(
+        AsyncLibraryServiceServicer(), PreserializedResponses(server)
+    )
+    change_feed.start()
+    logger.info("grpc.aio server created successfully")
+    return server
@@ -0,0 +1,132 @@
+from concurrent import futures
+from app.grpc.executor import InstrumentedThreadPoolExecutor
+from typing import Dict, Mapping, Optional
+import grpc
+import grpc.experimental
+
+POINT, SCAN, WRITE, WATCH = "point", "scan", "write", "watch"
+
+# Method name prefixes of the point lookups, the scans and the change streams; every other method
+# is a write.
+_CLASS_PREFIXES = (
+    (POINT, ("Get", "BatchGet", "Suggest")),
+    (SCAN, ("List", "Search", "Stream", "Export")),
+    (WATCH, ("Watch",)),
+)
+
+
+def is_watch_method(method: str) -> bool:
+    """
+    Whether method, given as its full path or its name, is a change stream. Those stay open for as
+    long as their client watches, holding a thread but no connection.
+    """
+    return method.rpartition("/")[2].startswith("Watch")
+
+
+def run_on(handler, pool: futures.ThreadPoolExecutor):
+    """
+    Returns handler with its behavior run on pool. The gRPC server submits a behavior with an
+    experimental_thread_pool to that pool instead of its own executor; bound methods cannot carry
+    the attribute, so the behavior is wrapped.
+    """
+
+    def route(behavior):
+        def routed(request, context):
+            return behavior(request, context)
+
+        routed.experimental_thread_pool = pool
+        return routed
+
+    return grpc.experimental.wrap_server_method_handler(route, handler)
+
+
+def routed_pool(handler) -> Optional[futures.ThreadPoolExecutor]:
+    # The pool run_on gave handler, if any.
+    for behavior in (handler.unary_unary, handler.unary_stream, handler.stream_unary, handler.stream_stream):
+        if behavior is not None:
+            return getattr(behavior, "experimental_thread_pool", None)
+    return None
+
+
+def method_pool(method: str, overrides: Mapping[str, str]) -> str:
+    """
+    Pool of a method, given as its full path (/package.Service/Method) or its name.
+    """
+    name = method.rpartition("/")[2]
+    if name in overrides:
+        return overrides[name]
+    for pool, prefixes in _CLASS_PREFIXES:
+        if name.startswith(prefixes):
+            return pool
+    return WRITE
+
+
+class BulkheadExecutor(futures.Executor):
+    """
+    The thread pools of the sync server, one per method class, so that slow scans cannot take the
+    threads of point lookups, each with its own queue and limit.
+
+    BulkheadInterceptor sends every RPC to the pool of its method through its handler (see run_on);
+    anything submitted to the executor itself runs on the first pool.
+    """
+
+    def __init__(self, threads: Mapping[str, int], method_pools: Mapping[str, str], limits: Optional[Mapping[str, int]] = None):
+        if not threads:
+            raise ValueError("At least one RPC thread pool is needed.")
+        for name, count in threads.items():
+            if count < 1:
+                raise ValueError(f"Thread pool '{name}' needs at least 1 thread, got {count}.")
+        for method, pool in method_pools.items():
+            if pool not in threads:
+                raise ValueError(f"GRPC_POOL_METHODS sends {method} to pool '{pool}', which is not in GRPC_POOLS.")
+        limits = limits or {}
+        self.pools: Dict[str, InstrumentedThreadPoolExecutor] = {
+            name: InstrumentedThreadPoolExecutor(count, limit=limits.get(name), name=name, thread_name_prefix=f"grpc-{name}")
+            for name, count in threads.items()
+        }
+        self.method_pools = dict(method_pools)
+        self._first = next(iter(self.pools.values()))
+        self._routes: Dict[str, InstrumentedThreadPoolExecutor] = {}
+
+    def pool_for(self, method: str) -> InstrumentedThreadPoolExecutor:
+        pool = self._routes.get(method)
+        if pool is None:
+            pool = self._routes[method] = self.pools.get(method_pool(method, self.method_pools), self._first)
+        return pool
+
+    def pool_outside(self, pool_name: str) -> InstrumentedThreadPoolExecutor:
+        """
+        The first pool other than pool_name, for RPCs turned away because every thread of that pool
+        is taken.
+        """
+        return next((pool for name, pool in self.pools.items() if name != pool_name), self._first)
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self._first.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+class BulkheadInterceptor(grpc.ServerInterceptor):
+    """
+    Routes every RPC of the thread-pool server to the pool of its method, unless the interceptors
+    after it already routed it (admission control sends the RPCs it turns away elsewhere).
+    """
+
+    def __init__(self, executor: BulkheadExecutor):
+        self.executor = executor
+        self._handlers = {}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or routed_pool(handler) is not None:
+            return handler
+        cached = self._handlers.get(handler_call_details.method)
+        if cached is None or cached[0] is not handler:
+            cached = self._handlers[handler_call_details.method] = (handler, run_on(handler, self.executor.pool_for(handler_call_details.method)))
+        return cached[1]
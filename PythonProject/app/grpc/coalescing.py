@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from app.config import COALESCE_READS, COALESCE_WINDOW_SECONDS, COALESCE_WINDOW_SIZE
+from app.db.deadlines import DeadlineExceeded
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import threading
+import time
+
+
+def flight_key(request) -> Tuple[str, bytes]:
+    """
+    Key of a read RPC for coalescing: its method, named after the request type as every request
+    type belongs to one method, and its serialized request.
+    """
+    return type(request).DESCRIPTOR.name.removesuffix("Request"), request.SerializeToString(deterministic=True)
+
+
+WAIT_EXPIRED_DETAILS = "The deadline of the RPC passed while it waited for an identical read."
+
+
+def as_bytes(response) -> bytes:
+    return response if isinstance(response, bytes) else response.SerializeToString()
+
+
+class _FlightStats:
+    __slots__ = ("requests", "executions", "shared_in_flight", "shared_window")
+
+    def __init__(self):
+        self.requests = self.executions = self.shared_in_flight = self.shared_window = 0
+
+
+class _Coalescer:
+    """
+    Bookkeeping shared by SingleFlight and AsyncSingleFlight: the window of recent results,
+    invalidation and stats.
+
+    Every invalidation starts a new generation. Requests that arrive afterwards never share a
+    flight or a result from an earlier generation, so once a write has committed and
+    invalidated, no read sees data from before it.
+    """
+
+    def __init__(self, window_seconds: float, window_size: int, enabled: bool = True):
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.window_size = window_size
+        self._flights: Dict[Hashable, object] = {}
+        self._results = OrderedDict()
+        self._generation = 0
+        self._stats: Dict[str, _FlightStats] = {}
+
+    def _count(self, key) -> _FlightStats:
+        stats = self._stats.get(key[0])
+        if stats is None:
+            stats = self._stats[key[0]] = _FlightStats()
+        stats.requests += 1
+        return stats
+
+    def _recent(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return None
+        return result
+
+    def _remember(self, key, result: bytes, generation: int) -> None:
+        if self.window_seconds <= 0 or generation != self._generation:
+            return
+        self._results[key] = (time.monotonic() + self.window_seconds, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.window_size:
+            self._results.popitem(last=False)
+
+    def _invalidate(self) -> None:
+        self._generation += 1
+        # Flights already running finish for the requests that joined them, but nothing new joins.
+        self._flights.clear()
+        self._results.clear()
+
+    def _stats_snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {
+            method: {
+                "requests": stats.requests,
+                "executions": stats.executions,
+                "shared_in_flight": stats.shared_in_flight,
+                "shared_window": stats.shared_window,
+            }
+            for method, stats in list(self._stats.items())
+        }
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_Coalescer):
+    """
+    Runs identical concurrent reads once: the first request for a key runs fn, and requests for
+    the same key that arrive while it runs wait for it and get the same serialized response, or
+    the same exception. With window_seconds > 0, responses are also reused for that long after
+    they complete. Writes call invalidate() after they commit.
+
+    A request waits for the flight it joined for at most timeout seconds, the time left until its
+    own deadline, and raises DeadlineExceeded once that runs out.
+    """
+
+    def __init__(self, window_seconds: float, window_size: int, enabled: bool = True):
+        super().__init__(window_seconds, window_size, enabled)
+        self._lock = threading.Lock()
+
+    def do(self, key: Tuple[str, bytes], fn: Callable[[], bytes], timeout: Optional[float] = None) -> bytes:
+        with self._lock:
+            stats = self._count(key)
+            result = self._recent(key)
+            if result is not None:
+                stats.shared_window += 1
+                return result
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                stats.executions += 1
+                generation = self._generation
+                leader = True
+            else:
+                stats.shared_in_flight += 1
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise DeadlineExceeded(WAIT_EXPIRED_DETAILS)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if flight.error is None:
+                    self._remember(key, flight.result, generation)
+            flight.done.set()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._invalidate()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return self._stats_snapshot()
+
+
+class AsyncSingleFlight(_Coalescer):
+    """
+    grpc.aio counterpart of SingleFlight. Everything runs on the event loop, so no lock is needed.
+    The work runs in its own task: a request that is cancelled or whose timeout runs out stops
+    waiting, but the flight goes on for the others.
+    """
+
+    async def do(
+        self, key: Tuple[str, bytes], fn: Callable[[], Awaitable[bytes]], timeout: Optional[float] = None
+    ) -> bytes:
+        stats = self._count(key)
+        result = self._recent(key)
+        if result is not None:
+            stats.shared_window += 1
+            return result
+        task = self._flights.get(key)
+        if task is None:
+            task = self._flights[key] = asyncio.ensure_future(fn())
+            stats.executions += 1
+            task.add_done_callback(lambda done, generation=self._generation: self._finish(key, done, generation))
+        else:
+            stats.shared_in_flight += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(WAIT_EXPIRED_DETAILS) from None
+
+    def _finish(self, key, task: asyncio.Future, generation: int) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is None:
+            self._remember(key, task.result(), generation)
+
+    def invalidate(self) -> None:
+        self._invalidate()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return self._stats_snapshot()
+
+
+read_flights = SingleFlight(COALESCE_WINDOW_SECONDS, COALESCE_WINDOW_SIZE, COALESCE_READS)
+async_read_flights = AsyncSingleFlight(COALESCE_WINDOW_SECONDS, COALESCE_WINDOW_SIZE, COALESCE_READS)
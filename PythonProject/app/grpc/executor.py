@@ -0,0 +1,243 @@
+from concurrent import futures
+from app.config import (
+    GRPC_ADAPTIVE_INTERVAL_SECONDS,
+    GRPC_ADAPTIVE_TARGET_WAIT_MS,
+    GRPC_MIN_WORKERS,
+    POOL_STATS_LOG_SECONDS,
+)
+from app.db.pool_metrics import WaitHistogram
+from typing import Callable, Dict, Optional, Sequence
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# The executor and submit time of the work item running on each executor thread.
+_work_item = threading.local()
+
+
+def current_pool() -> "InstrumentedThreadPoolExecutor":
+    """
+    The executor whose work item is running on the calling thread.
+    """
+    return _work_item.pool
+
+
+def submitted_at() -> float:
+    """
+    time.perf_counter() at which the work item running on the calling thread was submitted.
+    """
+    return _work_item.submitted
+
+
+class InstrumentedThreadPoolExecutor(futures.ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that reports how many work items wait and run and how long they waited for
+    a thread.
+
+    At most limit items run at once, which can be lower than max_workers: threads can be added to a
+    ThreadPoolExecutor but never removed, so the adaptive mode moves this limit instead.
+    """
+
+    def __init__(self, max_workers: int, limit: Optional[int] = None, name: str = "default", **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self.name = name
+        self.limit = limit or max_workers
+        self._gate = threading.Condition()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        # Work items queued or running, less the ones submitted through uncounted.
+        self.admitted = 0
+        self.queue_wait = WaitHistogram()
+        self.uncounted = UncountedSubmits(self)
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def set_limit(self, limit: int) -> None:
+        with self._gate:
+            self.limit = limit
+            self._gate.notify_all()
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self._submit(fn, args, kwargs, counted=True)
+
+    def _submit(self, fn, args, kwargs, counted: bool):
+        submitted = time.perf_counter()
+        with self._gate:
+            self.queued += 1
+            if counted:
+                self.admitted += 1
+
+        def run():
+            with self._gate:
+                while self.active >= self.limit:
+                    self._gate.wait()
+                self.queued -= 1
+                self.active += 1
+            self.queue_wait.observe((time.perf_counter() - submitted) * 1000)
+            _work_item.pool, _work_item.submitted = self, submitted
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._gate:
+                    self.active -= 1
+                    self.completed += 1
+                    if counted:
+                        self.admitted -= 1
+                    self._gate.notify()
+
+        return super().submit(run)
+
+    def stats(self) -> Dict:
+        with self._gate:
+            counts = {"queued": self.queued, "active": self.active, "completed": self.completed}
+        return {
+            "max_workers": self._max_workers,
+            "limit": self.limit,
+            "threads": len(self._threads),
+            **counts,
+            "queue_wait": self.queue_wait.snapshot(),
+        }
+
+
+class UncountedSubmits(futures.ThreadPoolExecutor):
+    """
+    Runs work items on pool without counting them in its admitted items, for the RPCs admission
+    control turns away. It only forwards submit(), so it never starts threads of its own.
+    """
+
+    def __init__(self, pool: InstrumentedThreadPoolExecutor):
+        super().__init__(max_workers=1)
+        self.pool = pool
+        self.name = pool.name
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self.pool._submit(fn, args, kwargs, counted=False)
+
+
+def check_pool_coherence(threads: int, pool_size: int, max_overflow: int, adaptive: bool = False) -> None:
+    """
+    Validates the thread pools of the sync server, threads in all, against the connection pool of
+    the process:
+    raises ValueError for sizes that cannot work and warns about ones that waste threads or
+    connections. Each RPC holds at most one connection of a pool at a time.
+    """
+    if threads < 1:
+        raise ValueError(f"GRPC_MAX_WORKERS must be at least 1, got {threads}.")
+    if adaptive and not 1 <= GRPC_MIN_WORKERS <= threads:
+        raise ValueError(f"GRPC_MIN_WORKERS must be between 1 and the RPC threads ({threads}), got {GRPC_MIN_WORKERS}.")
+    connections = pool_size + max_overflow
+    if threads > connections and not adaptive:
+        logger.warning(
+            "%s RPC threads share %s database connections (pool_size=%s, max_overflow=%s); under load RPCs wait for a "
+            "connection. Lower GRPC_MAX_WORKERS or GRPC_POOLS, raise the pool or enable GRPC_ADAPTIVE_WORKERS.",
+            threads, connections, pool_size, max_overflow,
+        )
+    elif pool_size > threads:
+        logger.warning(
+            "pool_size=%s is larger than the %s RPC threads that can use it; "
+            "the extra connections are never checked out.",
+            pool_size, threads,
+        )
+
+
+def _mean_wait(previous: Dict, current: Dict) -> float:
+    count = current["count"] - previous["count"]
+    return (current["sum_ms"] - previous["sum_ms"]) / count if count else 0.0
+
+
+def _total_wait(histograms) -> Dict:
+    histograms = list(histograms)
+    return {"count": sum(h["count"] for h in histograms), "sum_ms": sum(h["sum_ms"] for h in histograms)}
+
+
+class PoolMonitor(threading.Thread):
+    """
+    Logs the connection pool stats, and those of the executors if there are any, every
+    POOL_STATS_LOG_SECONDS. With adaptive=True it also adjusts the limit of each executor every
+    GRPC_ADAPTIVE_INTERVAL_SECONDS from the waits observed since the previous adjustment:
+
+    - mean checkout wait above the target: the database is the bottleneck, run fewer RPCs at once;
+    - RPCs waiting longer than the target for a thread of the executor while checkouts stay under
+      half of it: run more, up to max_workers.
+
+    Executors named in fixed keep their limit, for RPCs that do not wait on the database.
+    """
+
+    def __init__(
+        self,
+        pool_stats: Callable[[], Dict],
+        executors: Sequence[InstrumentedThreadPoolExecutor] = (),
+        adaptive: bool = False,
+        fixed: Sequence[str] = (),
+    ):
+        super().__init__(name="pool-monitor", daemon=True)
+        self.pool_stats = pool_stats
+        self.executors = list(executors)
+        self.adaptive = adaptive and bool(self.executors)
+        self.fixed = set(fixed)
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def adapt(self, executor: InstrumentedThreadPoolExecutor, checkout_wait_ms: float, queue_wait_ms: float) -> None:
+        if executor.name in self.fixed:
+            return
+        limit = executor.limit
+        step = max(1, limit // 4)
+        if checkout_wait_ms > GRPC_ADAPTIVE_TARGET_WAIT_MS:
+            new_limit = max(min(GRPC_MIN_WORKERS, executor.max_workers), limit - step)
+        elif queue_wait_ms > GRPC_ADAPTIVE_TARGET_WAIT_MS and checkout_wait_ms < GRPC_ADAPTIVE_TARGET_WAIT_MS / 2:
+            new_limit = min(executor.max_workers, limit + step)
+        else:
+            return
+        if new_limit != limit:
+            logger.info(
+                "Adaptive workers: %s -> %s concurrent RPCs on pool %s (mean checkout wait %.1f ms, mean thread wait %.1f ms)",
+                limit, new_limit, executor.name, checkout_wait_ms, queue_wait_ms,
+            )
+            executor.set_limit(new_limit)
+
+    def run(self) -> None:
+        intervals = [interval for interval in (POOL_STATS_LOG_SECONDS, GRPC_ADAPTIVE_INTERVAL_SECONDS if self.adaptive else 0) if interval > 0]
+        if not intervals:
+            return
+        tick = min(intervals)
+        last_logged = time.monotonic()
+        checkout = _total_wait(stats["checkout_wait"] for stats in self.pool_stats().values())
+        queues = [executor.queue_wait.snapshot() for executor in self.executors]
+        while not self._stopped.wait(tick):
+            try:
+                pools = self.pool_stats()
+                if self.adaptive:
+                    current_checkout = _total_wait(stats["checkout_wait"] for stats in pools.values())
+                    current_queues = [executor.queue_wait.snapshot() for executor in self.executors]
+                    checkout_wait_ms = _mean_wait(checkout, current_checkout)
+                    for executor, queue, current_queue in zip(self.executors, queues, current_queues):
+                        self.adapt(executor, checkout_wait_ms, _mean_wait(queue, current_queue))
+                    checkout, queues = current_checkout, current_queues
+                if POOL_STATS_LOG_SECONDS > 0 and time.monotonic() - last_logged >= POOL_STATS_LOG_SECONDS:
+                    last_logged = time.monotonic()
+                    for name, stats in pools.items():
+                        wait = stats["checkout_wait"]
+                        logger.info(
+                            "Pool %s: %s checked out, %s idle, %s/%s overflow, %s checkouts averaging %.2f ms, oldest "
+                            "connection %.0fs",
+                            name, stats["checked_out"], stats["checked_in"], stats["overflow_in_use"],
+                            stats["max_overflow"], wait["count"], wait["sum_ms"] / max(1, wait["count"]),
+                            stats["oldest_connection_seconds"],
+                        )
+                    for executor in self.executors:
+                        stats = executor.stats()
+                        logger.info(
+                            "Executor %s: %s/%s running, %s queued, %s/%s threads",
+                            executor.name, stats["active"], stats["limit"], stats["queued"], stats["threads"],
+                            stats["max_workers"],
+                        )
+            except Exception as e:
+                logger.exception("Pool monitor failed: %s", e)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from operator import itemgetter
+from app.config import FRAGMENT_CACHE_SIZE
+from app.grpc.mapping import to_book_proto, to_member_proto
+from typing import Callable, Sequence, Tuple
+import grpc
+import threading
+
+# Wire-format tags of the list responses: field 1 is the repeated entity, field 2 the page token,
+# both length-delimited (wire type 2).
+_ENTITIES_TAG = b"\x0a"
+_NEXT_PAGE_TOKEN_TAG = b"\x12"
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _length_delimited(tag: bytes, payload: bytes) -> bytes:
+    return tag + _varint(len(payload)) + payload
+
+
+class FragmentCache:
+    """
+    Bounded LRU cache of entities encoded as field 1 of a list response (tag, length and message
+    bytes), keyed by the id and version of the entity.
+
+    A repeated message field on the wire is just its elements one after another, so a list response
+    is the concatenation of these fragments plus the page token, and only entities whose version
+    changed are encoded again.
+    """
+
+    def __init__(self, to_proto: Callable, key_columns: Sequence[str], max_size: int):
+        self.to_proto = to_proto
+        self.key_columns = tuple(key_columns)
+        self._key_of = itemgetter(*self.key_columns)
+        self.max_size = max_size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, obj) -> Tuple:
+        # Loaded column values sit in the instance __dict__; reading them there skips the ORM
+        # attribute instrumentation, which otherwise costs more than the cache saves.
+        try:
+            return self._key_of(obj.__dict__)
+        except KeyError:
+            return tuple(getattr(obj, column) for column in self.key_columns)
+
+    def _encode(self, obj) -> bytes:
+        return _length_delimited(_ENTITIES_TAG, self.to_proto(obj).SerializeToString())
+
+    def encode_list_response(self, entities: Sequence, next_page_token: str) -> bytes:
+        """
+        Serialized ListBooksResponse / ListAvailableBooksResponse / ListMembersResponse.
+        """
+        keys = [self._key(obj) for obj in entities]
+        # One lock round trip per response rather than per row.
+        with self._lock:
+            parts = [self._fragments.get(key) for key in keys]
+            for key, fragment in zip(keys, parts):
+                if fragment is not None:
+                    self._fragments.move_to_end(key)
+        missing = [index for index, fragment in enumerate(parts) if fragment is None]
+        for index in missing:
+            parts[index] = self._encode(entities[index])
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            for index in missing:
+                self._fragments[keys[index]] = parts[index]
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+        if next_page_token:
+            parts.append(_length_delimited(_NEXT_PAGE_TOKEN_TAG, next_page_token.encode("utf-8")))
+        return b"".join(parts)
+
+
+# Every write moves the version of a row, so it stands for all the values in the message.
+BOOK_KEY_COLUMNS = ("id", "version")
+MEMBER_KEY_COLUMNS = ("id", "version")
+
+book_fragments = FragmentCache(to_book_proto, BOOK_KEY_COLUMNS, FRAGMENT_CACHE_SIZE)
+member_fragments = FragmentCache(to_member_proto, MEMBER_KEY_COLUMNS, FRAGMENT_CACHE_SIZE)
+
+
+def _accepting_bytes(serializer: Callable) -> Callable:
+    def serialize(response):
+        if isinstance(response, bytes):
+            return response
+        return serializer(response)
+    return serialize
+
+
+class PreserializedResponses:
+    """
+    Server wrapper for the generated add_*Servicer_to_server functions that lets every handler
+    return its response either as a message or as bytes that are already serialized.
+    """
+
+    def __init__(self, server):
+        self._server = server
+
+    def add_generic_rpc_handlers(self, generic_handlers):
+        # The generated code registers the same handlers again below, where they can be rewritten.
+        pass
+
+    def add_registered_method_handlers(self, service_name, method_handlers):
+        method_handlers = {
+            method: handler._replace(response_serializer=_accepting_bytes(handler.response_serializer))
+            for method, handler in method_handlers.items()
+        }
+        self._server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service_name, method_handlers),))
+        self._server.add_registered_method_handlers(service_name, method_handlers)
@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import signal
+import time
+from app.config import GRPC_SHUTDOWN_GRACE_SECONDS, METRICS_HOST
+from app.logging_service import stop_logging
+
+logger = logging.getLogger(__name__)
+
+# Workers that exit sooner than this after starting are restarted with a delay to avoid a crash loop.
+MIN_WORKER_UPTIME_SECONDS = 5
+RESTART_DELAY_SECONDS = 1
+
+# Every worker binds the same address; the kernel load-balances incoming connections between them.
+REUSEPORT_OPTIONS = [("grpc.so_reuseport", 1)]
+
+
+def split_connection_budget(pool_size: int, max_overflow: int, workers: int):
+    """
+    Splits a total connection budget evenly across worker processes, keeping at least one
+    pooled connection per worker.
+    """
+    return max(1, pool_size // workers), max_overflow // workers
+
+
+def _run_sync_worker(address: str):
+    from app.grpc.server import create_server
+
+    server = create_server(options=REUSEPORT_OPTIONS)
+    server.add_insecure_port(address)
+
+    def handle_sigterm(signum, frame):
+        logger.info("Worker received SIGTERM, draining in-flight RPCs")
+        server.stop(GRPC_SHUTDOWN_GRACE_SECONDS)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    server.start()
+    logger.info("Worker serving on %s", address)
+    server.wait_for_termination()
+
+
+async def _serve_async_worker(address: str):
+    from app.grpc.async_server import create_async_server
+    from app.db.async_database import dispose_async_engine
+
+    server = create_async_server(options=REUSEPORT_OPTIONS)
+    server.add_insecure_port(address)
+
+    def handle_sigterm():
+        logger.info("Worker received SIGTERM, draining in-flight RPCs")
+        asyncio.ensure_future(server.stop(GRPC_SHUTDOWN_GRACE_SECONDS))
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, handle_sigterm)
+    await server.start()
+    logger.info("Worker serving on %s", address)
+    try:
+        await server.wait_for_termination()
+    finally:
+        await dispose_async_engine()
+
+
+def _worker_main(address: str, mode: str, pool_size: int, max_overflow: int, metrics_port: int = 0):
+    # The parent coordinates shutdown; Ctrl+C reaches the whole process group, so workers ignore it
+    # and wait for the SIGTERM sent by the parent.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    if metrics_port:
+        # Metrics are per process, so every worker serves its own endpoint.
+        from app.grpc.metrics import render_server_metrics, start_metrics_server
+
+        start_metrics_server(METRICS_HOST, metrics_port, functools.partial(render_server_metrics, mode))
+
+    try:
+        if mode == "async":
+            from app.db.async_database import init_async_engine
+
+            init_async_engine(pool_size, max_overflow)
+            asyncio.run(_serve_async_worker(address))
+        else:
+            from app.db.database import init_engine
+
+            init_engine(pool_size, max_overflow)
+            _run_sync_worker(address)
+    finally:
+        # multiprocessing ends workers with os._exit, which skips the atexit flush.
+        stop_logging()
+
+
+class PreforkLauncher:
+    """
+    Starts N worker processes that serve the same port with SO_REUSEPORT, restarts workers
+    that die and drains all of them gracefully on SIGTERM/SIGINT.
+    The gRPC server and the database engine are created inside each worker after fork.
+    With a metrics_port, the worker in slot N serves its metrics on metrics_port + N.
+    """
+
+    def __init__(self, address: str, workers: int, mode: str, pool_size: int, max_overflow: int, metrics_port: int = 0):
+        self.address = address
+        self.metrics_port = metrics_port
+        self.workers = workers
+        self.mode = mode
+        self.pool_size, self.max_overflow = split_connection_budget(pool_size, max_overflow, workers)
+        self._context = multiprocessing.get_context("fork")
+        self._processes = [None] * workers
+        self._started_at = [0.0] * workers
+        self._stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        logger.info(
+            "Starting %s %s workers on %s with pool_size=%s and max_overflow=%s each",
+            self.workers, self.mode, self.address, self.pool_size, self.max_overflow,
+        )
+        for slot in range(self.workers):
+            self._start_worker(slot)
+
+        while not self._stopping:
+            time.sleep(1)
+            for slot, process in enumerate(self._processes):
+                if self._stopping or process.is_alive():
+                    continue
+                logger.warning("Worker %s exited with code %s, restarting", process.pid, process.exitcode)
+                if time.monotonic() - self._started_at[slot] < MIN_WORKER_UPTIME_SECONDS:
+                    time.sleep(RESTART_DELAY_SECONDS)
+                self._start_worker(slot)
+
+        self._shutdown()
+
+    def _start_worker(self, slot: int):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.address, self.mode, self.pool_size, self.max_overflow, self.metrics_port + slot if self.metrics_port else 0),
+            name=f"grpc-worker-{slot}",
+        )
+        process.start()
+        self._processes[slot] = process
+        self._started_at[slot] = time.monotonic()
+        logger.info("Started worker %s in slot %s", process.pid, slot)
+
+    def _request_stop(self, signum, frame):
+        if not self._stopping:
+            logger.info("Launcher received signal %s, stopping workers", signum)
+        self._stopping = True
+
+    def _shutdown(self):
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + GRPC_SHUTDOWN_GRACE_SECONDS + 5
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker %s did not drain in time, killing it", process.pid)
+                process.kill()
+                process.join()
+        logger.info("All workers stopped.")
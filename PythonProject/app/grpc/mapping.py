@@ -0,0 +1,172 @@
+import grpc
+from app.proto import library_pb2
+from app.db.deadlines import is_deadline_error
+from app.db.models import ChangeKind
+from app.db.replicas import ReplicaUnavailable
+from google.protobuf import timestamp_pb2
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def to_book_proto(book):
+    return library_pb2.Book(id=book.id, title=book.title, author=book.author, published_date=book.published_date.strftime("%Y-%m-%d"), isbn=book.isbn, is_available=book.is_available, version=book.version)
+
+
+def to_member_proto(member):
+    return library_pb2.Member(id=member.id, name=member.name, email=member.email, join_date=member.join_date.strftime("%Y-%m-%d"), version=member.version)
+
+
+def to_borrow_record_proto(borrow_record):
+    proto_return_date = None
+    if borrow_record.return_date:
+        proto_return_date = timestamp_pb2.Timestamp()
+        proto_return_date.FromDatetime(datetime.combine(borrow_record.return_date, datetime.min.time())) # Convert date to datetime for FromDatetime
+
+    return library_pb2.BorrowRecord(
+        id=borrow_record.id,
+        book_id=borrow_record.book_id,
+        member_id=borrow_record.member_id,
+        borrow_date=borrow_record.borrow_date.strftime("%Y-%m-%d"),
+        return_date=proto_return_date,
+        status=library_pb2.BorrowingStatus.Value(borrow_record.status.name), # Convert ORM Enum to Protobuf Enum
+        version=borrow_record.version,
+    )
+
+
+def to_borrowing_details_proto(borrow_record):
+    return library_pb2.BorrowingDetails(
+        borrow_record=to_borrow_record_proto(borrow_record),
+        book=to_book_proto(borrow_record.book),
+        member=to_member_proto(borrow_record.member)
+    )
+
+
+def to_batch_item_error_proto(error):
+    if isinstance(error, grpc.RpcError):
+        code, details = rpc_error_status(error)
+    else:
+        code, details = grpc.StatusCode.INVALID_ARGUMENT, str(error)
+    return library_pb2.BatchItemError(code=code.name, message=details)
+
+
+def to_batch_create_book_result_proto(result):
+    if isinstance(result, Exception):
+        return library_pb2.BatchCreateBookResult(error=to_batch_item_error_proto(result))
+    return library_pb2.BatchCreateBookResult(book=to_book_proto(result))
+
+
+def to_batch_create_member_result_proto(result):
+    if isinstance(result, Exception):
+        return library_pb2.BatchCreateMemberResult(error=to_batch_item_error_proto(result))
+    return library_pb2.BatchCreateMemberResult(member=to_member_proto(result))
+
+
+def to_book_lookup_result_proto(book_id, book):
+    if book is None:
+        return library_pb2.BookLookupResult(id=book_id, found=False)
+    return library_pb2.BookLookupResult(id=book_id, found=True, book=to_book_proto(book))
+
+
+def to_member_lookup_result_proto(member_id, member):
+    if member is None:
+        return library_pb2.MemberLookupResult(id=member_id, found=False)
+    return library_pb2.MemberLookupResult(id=member_id, found=True, member=to_member_proto(member))
+
+
+def to_book_search_hit_proto(hit):
+    book, score = hit
+    return library_pb2.BookSearchHit(book=to_book_proto(book), score=score)
+
+
+CHANGE_TYPES = {
+    ChangeKind.CREATED: library_pb2.CHANGE_CREATED,
+    ChangeKind.UPDATED: library_pb2.CHANGE_UPDATED,
+    ChangeKind.DELETED: library_pb2.CHANGE_DELETED,
+    ChangeKind.AVAILABILITY: library_pb2.CHANGE_AVAILABILITY,
+}
+
+
+def to_book_change_proto(change):
+    book = to_book_proto(change.entity) if change.entity is not None else None
+    return library_pb2.BookChange(type=CHANGE_TYPES[change.kind], id=change.entity_id, book=book)
+
+
+def to_borrowing_change_proto(change):
+    borrow_record = to_borrow_record_proto(change.entity) if change.entity is not None else None
+    return library_pb2.BorrowingChange(type=CHANGE_TYPES[change.kind], id=change.entity_id, borrow_record=borrow_record)
+
+
+def to_watch_books_response(changes, resume_token):
+    return library_pb2.WatchBooksResponse(changes=[to_book_change_proto(change) for change in changes], resume_token=resume_token)
+
+
+def to_watch_borrowings_response(changes, resume_token):
+    return library_pb2.WatchBorrowingsResponse(changes=[to_borrowing_change_proto(change) for change in changes], resume_token=resume_token)
+
+
+EXPORT_DATASETS = {
+    library_pb2.EXPORT_BOOKS: "books",
+    library_pb2.EXPORT_MEMBERS: "members",
+    library_pb2.EXPORT_BORROWINGS: "borrowings",
+}
+EXPORT_FORMATS = {library_pb2.EXPORT_CSV: "csv", library_pb2.EXPORT_NDJSON: "ndjson"}
+
+SYNC_ENTITIES = {
+    library_pb2.SYNC_BOOKS: "books",
+    library_pb2.SYNC_MEMBERS: "members",
+    library_pb2.SYNC_BORROWINGS: "borrowings",
+}
+
+
+def to_list_changes_since_response(entity, changed, deleted_ids, version, next_page_token):
+    response = library_pb2.ListChangesSinceResponse(deleted_ids=deleted_ids, version=version, next_page_token=next_page_token)
+    if entity == "books":
+        response.books.extend(to_book_proto(book) for book in changed)
+    elif entity == "members":
+        response.members.extend(to_member_proto(member) for member in changed)
+    else:
+        response.borrow_records.extend(to_borrow_record_proto(borrow_record) for borrow_record in changed)
+    return response
+
+
+def to_book_suggestion_proto(suggestion):
+    book_id, title, author = suggestion
+    return library_pb2.BookSuggestion(id=book_id, title=title, author=author)
+
+
+def to_member_search_hit_proto(hit):
+    member, score = hit
+    return library_pb2.MemberSearchHit(member=to_member_proto(member), score=score)
+
+
+def rpc_error_status(error):
+    # Services raise grpc.RpcError(code, details); errors raised by gRPC itself expose code() and details().
+    if hasattr(error, "code"):
+        return error.code(), error.details()
+    return error.args[0], error.args[1]
+
+
+def set_error_status(context, error):
+    """
+    Maps an exception raised by the service layer onto the status of the current RPC.
+    """
+    if isinstance(error, ValueError):
+        context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+        context.set_details(str(error))
+    elif isinstance(error, grpc.RpcError):
+        code, details = rpc_error_status(error)
+        context.set_code(code)
+        context.set_details(details)
+    elif isinstance(error, ReplicaUnavailable):
+        # Only streams get here: they cannot be restarted once responses went out.
+        context.set_code(grpc.StatusCode.UNAVAILABLE)
+        context.set_details(str(error))
+    elif is_deadline_error(error):
+        context.set_code(grpc.StatusCode.DEADLINE_EXCEEDED)
+        context.set_details("The deadline passed before the database finished.")
+    else:
+        logger.exception("An unexpected error occurred: %s", error)
+        context.set_code(grpc.StatusCode.INTERNAL)
+        context.set_details("An unexpected error occurred")
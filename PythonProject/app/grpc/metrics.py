@@ -0,0 +1,477 @@
+from asyncio import CancelledError
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from app.logging_service import dropped_records
+import functools
+import grpc
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets (seconds); a last bucket takes the rest.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_OK = grpc.StatusCode.OK
+_UNKNOWN = grpc.StatusCode.UNKNOWN
+_CANCELLED = grpc.StatusCode.CANCELLED
+
+
+class _MethodCounters:
+    __slots__ = ("started", "latency_counts", "latency_sum", "codes", "received", "received_bytes", "sent", "sent_bytes")
+
+    def __init__(self):
+        self.started = 0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.codes: Dict[grpc.StatusCode, int] = {}
+        self.received = self.received_bytes = self.sent = self.sent_bytes = 0
+
+    def merge(self, other: "_MethodCounters") -> None:
+        self.started += other.started
+        self.latency_counts = [a + b for a, b in zip(self.latency_counts, other.latency_counts)]
+        self.latency_sum += other.latency_sum
+        for code, count in list(other.codes.items()):
+            self.codes[code] = self.codes.get(code, 0) + count
+        self.received += other.received
+        self.received_bytes += other.received_bytes
+        self.sent += other.sent
+        self.sent_bytes += other.sent_bytes
+
+
+class RpcMetrics:
+    """
+    Per-method RPC counters, latency histograms and message sizes.
+
+    Every thread records into its own shard, so recording never takes a lock or contends with other
+    threads; a scrape adds the shards up. Only the owning thread writes a shard, and a scrape reads
+    it without stopping it, so one scrape may see an RPC as started but not yet handled: that is
+    exactly what the in-flight gauge reports.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, str], _MethodCounters]] = []
+        self._lock = threading.Lock()
+
+    def counters(self, key: Tuple[str, str]) -> _MethodCounters:
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        counters = shard.get(key)
+        if counters is None:
+            counters = shard[key] = _MethodCounters()
+        return counters
+
+    def handled(self, key: Tuple[str, str], code: grpc.StatusCode, seconds: float) -> None:
+        counters = self.counters(key)
+        counters.latency_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        counters.latency_sum += seconds
+        counters.codes[code] = counters.codes.get(code, 0) + 1
+
+    def snapshot(self) -> Dict[Tuple[str, str], _MethodCounters]:
+        with self._lock:
+            shards = list(self._shards)
+        totals: Dict[Tuple[str, str], _MethodCounters] = {}
+        for shard in shards:
+            for key, counters in list(shard.items()):
+                totals.setdefault(key, _MethodCounters()).merge(counters)
+        return totals
+
+
+rpc_metrics = RpcMetrics()
+
+
+def _method_key(full_method: str) -> Tuple[str, str]:
+    # "/library.LibraryService/GetBook" -> ("library.LibraryService", "GetBook")
+    service, _, method = full_method.lstrip("/").rpartition("/")
+    return service, method
+
+
+def _final_code(context, failed: bool) -> grpc.StatusCode:
+    code = context.code()
+    if code is None:
+        return _UNKNOWN if failed else _OK
+    return code
+
+
+def _counting_serializers(handler, counters_of: Callable[[], _MethodCounters]):
+    # Sizes are taken where gRPC (de)serializes the messages, so they are the sizes on the wire.
+    deserializer = handler.request_deserializer
+    serializer = handler.response_serializer
+
+    def deserialize(data):
+        counters = counters_of()
+        counters.received += 1
+        counters.received_bytes += len(data)
+        return deserializer(data) if deserializer else data
+
+    def serialize(message):
+        data = serializer(message) if serializer else message
+        counters = counters_of()
+        counters.sent += 1
+        counters.sent_bytes += len(data)
+        return data
+
+    return deserialize, serialize
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """
+    Records every RPC of a thread-pool server into rpc_metrics. The wrapped handler of each method
+    is built once and reused for as long as the server hands out the same handler.
+    """
+
+    def __init__(self, metrics: RpcMetrics = rpc_metrics):
+        self.metrics = metrics
+        self._handlers = {}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        cached = self._handlers.get(handler_call_details.method)
+        if cached is None or cached[0] is not handler:
+            cached = (handler, self._wrap(_method_key(handler_call_details.method), handler))
+            self._handlers[handler_call_details.method] = cached
+        return cached[1]
+
+    def _wrap(self, key, handler):
+        metrics = self.metrics
+        deserialize, serialize = _counting_serializers(handler, lambda: metrics.counters(key))
+        changes = {"request_deserializer": deserialize, "response_serializer": serialize}
+
+        if handler.unary_unary or handler.stream_unary:
+            kind = "unary_unary" if handler.unary_unary else "stream_unary"
+            behavior = getattr(handler, kind)
+
+            # wraps() keeps the pool an inner interceptor routed the RPC to (see bulkheads.run_on).
+            @functools.wraps(behavior)
+            def unary_response(request, context):
+                metrics.counters(key).started += 1
+                started = time.perf_counter()
+                failed = True
+                try:
+                    response = behavior(request, context)
+                    failed = False
+                    return response
+                finally:
+                    metrics.handled(key, _final_code(context, failed), time.perf_counter() - started)
+
+            changes[kind] = unary_response
+        else:
+            kind = "unary_stream" if handler.unary_stream else "stream_stream"
+            behavior = getattr(handler, kind)
+
+            @functools.wraps(behavior)
+            def stream_response(request, context):
+                metrics.counters(key).started += 1
+                started = time.perf_counter()
+                code = None
+                try:
+                    yield from behavior(request, context)
+                except GeneratorExit:
+                    code = _CANCELLED
+                    raise
+                except BaseException:
+                    code = _final_code(context, True)
+                    raise
+                finally:
+                    metrics.handled(key, code or _final_code(context, False), time.perf_counter() - started)
+
+            changes[kind] = stream_response
+        return handler._replace(**changes)
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """
+    grpc.aio counterpart of MetricsInterceptor. All RPCs run on the event loop thread, so they
+    share one shard.
+    """
+
+    def __init__(self, metrics: RpcMetrics = rpc_metrics):
+        self.metrics = metrics
+        self._handlers = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        cached = self._handlers.get(handler_call_details.method)
+        if cached is None or cached[0] is not handler:
+            cached = (handler, self._wrap(_method_key(handler_call_details.method), handler))
+            self._handlers[handler_call_details.method] = cached
+        return cached[1]
+
+    def _wrap(self, key, handler):
+        metrics = self.metrics
+        deserialize, serialize = _counting_serializers(handler, lambda: metrics.counters(key))
+        changes = {"request_deserializer": deserialize, "response_serializer": serialize}
+
+        if handler.unary_unary or handler.stream_unary:
+            kind = "unary_unary" if handler.unary_unary else "stream_unary"
+            behavior = getattr(handler, kind)
+
+            async def unary_response(request, context):
+                metrics.counters(key).started += 1
+                started = time.perf_counter()
+                failed = True
+                try:
+                    response = await behavior(request, context)
+                    failed = False
+                    return response
+                finally:
+                    metrics.handled(key, _final_code(context, failed), time.perf_counter() - started)
+
+            changes[kind] = unary_response
+        else:
+            kind = "unary_stream" if handler.unary_stream else "stream_stream"
+            behavior = getattr(handler, kind)
+
+            async def stream_response(request, context):
+                metrics.counters(key).started += 1
+                started = time.perf_counter()
+                code = None
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                except (GeneratorExit, CancelledError):
+                    code = _CANCELLED
+                    raise
+                except BaseException:
+                    code = _final_code(context, True)
+                    raise
+                finally:
+                    metrics.handled(key, code or _final_code(context, False), time.perf_counter() - started)
+
+            changes[kind] = stream_response
+        return handler._replace(**changes)
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def _histogram(lines: List[str], name: str, labels: Dict, bounds, counts, total: float, scale: float = 1.0) -> None:
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=f'{bound * scale:g}')} {cumulative}")
+    cumulative += counts[-1]
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels)} {total * scale}")
+    lines.append(f"{name}_count{_labels(**labels)} {cumulative}")
+
+
+def render_metrics(
+    metrics: RpcMetrics = rpc_metrics,
+    pool_stats: Optional[Dict] = None,
+    executor_stats: Optional[Dict] = None,
+    coalescing_stats: Optional[Dict] = None,
+    admission_stats: Optional[Dict] = None,
+    watch_stats: Optional[Dict] = None,
+) -> str:
+    """
+    Renders the RPC metrics, and the connection pool, thread pool, read coalescing, admission
+    control and change stream stats if given, in the Prometheus text exposition format.
+    """
+    lines = []
+    snapshot = sorted(metrics.snapshot().items())
+    families = [
+        ("grpc_server_started_total", "counter", "RPCs started."),
+        ("grpc_server_handled_total", "counter", "RPCs completed, by status code."),
+        ("grpc_server_in_flight", "gauge", "RPCs started and not completed yet."),
+        ("grpc_server_handling_seconds", "histogram", "Time from the start of an RPC to its last response."),
+        ("grpc_server_msg_received_total", "counter", "Request messages received."),
+        ("grpc_server_msg_sent_total", "counter", "Response messages sent."),
+        ("grpc_server_received_bytes_total", "counter", "Serialized size of the request messages received."),
+        ("grpc_server_sent_bytes_total", "counter", "Serialized size of the response messages sent."),
+    ]
+    for name, kind, help_text in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (service, method), counters in snapshot:
+            labels = {"grpc_service": service, "grpc_method": method}
+            if name == "grpc_server_started_total":
+                lines.append(f"{name}{_labels(**labels)} {counters.started}")
+            elif name == "grpc_server_handled_total":
+                for code, count in sorted(counters.codes.items(), key=lambda item: item[0].name):
+                    lines.append(f"{name}{_labels(**labels, grpc_code=code.name)} {count}")
+            elif name == "grpc_server_in_flight":
+                lines.append(f"{name}{_labels(**labels)} {counters.started - sum(counters.codes.values())}")
+            elif name == "grpc_server_handling_seconds":
+                _histogram(lines, name, labels, LATENCY_BUCKETS, counters.latency_counts, counters.latency_sum)
+            else:
+                value = {
+                    "grpc_server_msg_received_total": counters.received,
+                    "grpc_server_msg_sent_total": counters.sent,
+                    "grpc_server_received_bytes_total": counters.received_bytes,
+                    "grpc_server_sent_bytes_total": counters.sent_bytes,
+                }[name]
+                lines.append(f"{name}{_labels(**labels)} {value}")
+
+    if pool_stats:
+        gauges = [
+            ("db_pool_size", "pool_size", "Connections the pool keeps open."),
+            ("db_pool_max_overflow", "max_overflow", "Connections the pool may open beyond its size."),
+            ("db_pool_checked_out", "checked_out", "Connections in use."),
+            ("db_pool_checked_in", "checked_in", "Idle connections in the pool."),
+            ("db_pool_overflow_in_use", "overflow_in_use", "Connections open beyond the pool size."),
+            ("db_pool_connections", "connections", "Open connections."),
+            ("db_pool_oldest_connection_seconds", "oldest_connection_seconds", "Age of the oldest open connection."),
+            ("db_pool_mean_connection_age_seconds", "mean_connection_age_seconds", "Mean age of the open connections."),
+        ]
+        for name, field, help_text in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for pool, stats in sorted(pool_stats.items()):
+                lines.append(f"{name}{_labels(pool=pool)} {stats[field]}")
+        lines.append("# HELP db_pool_checkout_wait_seconds Time to get a connection from the pool.")
+        lines.append("# TYPE db_pool_checkout_wait_seconds histogram")
+        for pool, stats in sorted(pool_stats.items()):
+            wait = stats["checkout_wait"]
+            _histogram(lines, "db_pool_checkout_wait_seconds", {"pool": pool}, wait["buckets_ms"], wait["counts"], wait["sum_ms"], 0.001)
+
+    if executor_stats:
+        gauges = [
+            ("grpc_executor_max_workers", "max_workers", "gauge", "Threads the RPC thread pool may start."),
+            ("grpc_executor_limit", "limit", "gauge", "RPCs the thread pool runs at once."),
+            ("grpc_executor_threads", "threads", "gauge", "Threads started by the thread pool."),
+            ("grpc_executor_active", "active", "gauge", "RPCs running on the thread pool."),
+            ("grpc_executor_queued", "queued", "gauge", "RPCs waiting for a thread of the pool."),
+            ("grpc_executor_completed_total", "completed", "counter", "RPCs the thread pool finished."),
+        ]
+        for name, field, kind, help_text in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for pool, stats in executor_stats.items():
+                lines.append(f"{name}{_labels(pool=pool)} {stats[field]}")
+        lines.append("# HELP grpc_executor_queue_wait_seconds Time RPCs waited for a thread of the pool.")
+        lines.append("# TYPE grpc_executor_queue_wait_seconds histogram")
+        for pool, stats in executor_stats.items():
+            wait = stats["queue_wait"]
+            _histogram(lines, "grpc_executor_queue_wait_seconds", {"pool": pool}, wait["buckets_ms"], wait["counts"], wait["sum_ms"], 0.001)
+
+    if coalescing_stats:
+        families = [
+            ("grpc_server_coalescing_requests_total", "counter", "Read RPCs that went through read coalescing."),
+            ("grpc_server_coalescing_executions_total", "counter", "Coalesced reads that ran their query."),
+            ("grpc_server_coalesced_total", "counter", "Reads answered with another request's response, by source."),
+            ("grpc_server_coalescing_ratio", "gauge", "Fraction of the coalesced reads answered without a query of their own."),
+        ]
+        for name, kind, help_text in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for method, stats in sorted(coalescing_stats.items()):
+                if name == "grpc_server_coalescing_requests_total":
+                    lines.append(f"{name}{_labels(grpc_method=method)} {stats['requests']}")
+                elif name == "grpc_server_coalescing_executions_total":
+                    lines.append(f"{name}{_labels(grpc_method=method)} {stats['executions']}")
+                elif name == "grpc_server_coalesced_total":
+                    lines.append(f"{name}{_labels(grpc_method=method, source='in_flight')} {stats['shared_in_flight']}")
+                    lines.append(f"{name}{_labels(grpc_method=method, source='window')} {stats['shared_window']}")
+                else:
+                    shared = stats["shared_in_flight"] + stats["shared_window"]
+                    lines.append(f"{name}{_labels(grpc_method=method)} {shared / stats['requests'] if stats['requests'] else 0}")
+
+    if admission_stats:
+        families = [
+            ("grpc_server_admission_limit", "limit", "gauge", "RPCs admitted at once (0 with admission control off)."),
+            ("grpc_server_admission_rejected_total", "rejected", "counter", "RPCs rejected with RESOURCE_EXHAUSTED at the limit."),
+            ("grpc_server_deadline_expired_total", "expired", "counter", "RPCs whose deadline passed before they started."),
+        ]
+        for name, field, kind, help_text in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for pool, stats in sorted(admission_stats.items()):
+                value = stats[field] if stats["enabled"] or field != "limit" else 0
+                lines.append(f"{name}{_labels(pool=pool)} {value}")
+
+    if watch_stats:
+        families = [
+            ("grpc_server_watch_subscribers", "subscribers", "gauge", "Open WatchBooks and WatchBorrowings streams."),
+            ("grpc_server_watch_changes_total", "changes", "counter", "Changed entities published to the change streams."),
+            ("grpc_server_watch_dropped_total", "dropped", "counter", "Change streams ended with ABORTED for falling behind."),
+        ]
+        for name, field, kind, help_text in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {watch_stats[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def render_server_metrics(mode: str) -> str:
+    """
+    Metrics of this process: its RPCs and the pools of the server mode it runs.
+    """
+    # Imported here: the servers import this module for their interceptor.
+    from app.grpc.admission import admission_limiters
+    from app.services.change_feed import change_feed
+
+    admission_stats = {pool: limiter.stats() for pool, limiter in list(admission_limiters.items())}
+    watch_stats = change_feed.stats() if change_feed.running else None
+    if mode == "async":
+        from app.db.async_database import async_pool_stats
+        from app.grpc.coalescing import async_read_flights
+
+        body = render_metrics(
+            pool_stats=async_pool_stats(),
+            coalescing_stats=async_read_flights.stats(),
+            admission_stats=admission_stats,
+            watch_stats=watch_stats,
+        )
+    else:
+        from app.db.database import pool_stats
+        from app.grpc import server
+        from app.grpc.coalescing import read_flights
+
+        body = render_metrics(
+            pool_stats=pool_stats(),
+            executor_stats=server.rpc_executor.stats() if server.rpc_executor else None,
+            coalescing_stats=read_flights.stats(),
+            admission_stats=admission_stats,
+            watch_stats=watch_stats,
+        )
+    return body + (
+        "# HELP log_records_dropped_total Log records dropped because the log writer fell behind.\n"
+        "# TYPE log_records_dropped_total counter\n"
+        f"log_records_dropped_total {dropped_records()}\n"
+    )
+
+
+def start_metrics_server(host: str, port: int, render: Callable[[], str]) -> ThreadingHTTPServer:
+    """
+    Serves render() in the Prometheus text format on http://host:port/metrics from a daemon thread.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            try:
+                body = render().encode("utf-8")
+            except Exception as e:
+                logger.exception("Failed to render metrics: %s", e)
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would drown the application log.
+            pass
+
+    http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return http_server
@@ -1,41 +1,117 @@
-from concurrent import futures
 import grpc
 from app.proto import library_pb2, library_pb2_grpc
-from app.logging_service import logger
 from app.services.library_service import LibraryService
+from app.services.change_feed import change_feed
 from app.repositories.library_repository import LibraryRepository
+from app.db import database
 from app.db.database import get_db_session
-from google.protobuf import timestamp_pb2
-from datetime import datetime
+from app.db.changes import BOOKS, BORROWINGS
+from app.db.replicas import ReplicaUnavailable, client_key, primary_pins
+from app.logging_service import bind_request_id
+from app.grpc.admission import AdmissionInterceptor, time_remaining
+from app.grpc.coalescing import as_bytes, flight_key, read_flights
+from app.grpc.bulkheads import WATCH, BulkheadExecutor, BulkheadInterceptor
+from app.grpc.executor import PoolMonitor, check_pool_coherence
+from app.grpc.fragments import book_fragments, member_fragments, PreserializedResponses
+from app.grpc.metrics import MetricsInterceptor
+from app.grpc.mapping import (
+    to_book_proto,
+    to_member_proto,
+    to_borrow_record_proto,
+    to_borrowing_details_proto,
+    to_batch_create_book_result_proto,
+    to_batch_create_member_result_proto,
+    to_book_lookup_result_proto,
+    to_member_lookup_result_proto,
+    to_book_search_hit_proto,
+    to_book_suggestion_proto,
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    SYNC_ENTITIES,
+    to_list_changes_since_response,
+    to_member_search_hit_proto,
+    to_watch_books_response,
+    to_watch_borrowings_response,
+    set_error_status,
+)
+from app.config import GRPC_MAX_WORKERS, GRPC_ADAPTIVE_WORKERS, GRPC_POOLS, GRPC_POOL_METHODS
+import logging
+
+logger = logging.getLogger(__name__)
 
 class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
-    def _execute_with_service(self, context, action):
+    def _execute_with_service(self, context, action, read_only=False, request=None):
+        # Read-only actions may run on a replica, and run again on the primary if it cannot be reached.
+        # Writes run on the primary and pin the client there for reads, if read-your-writes is on.
+        # Read-only actions given their request share one run and one serialized response with
+        # identical concurrent requests, unless the client is pinned to the primary. Pinned clients
+        # also skip the entity caches.
+        bind_request_id(context)
         try:
             logger.info("Executing service action")
-            with get_db_session() as db_session:
+            client = client_key(context)
+            pinned = primary_pins.is_pinned(client)
+            on_replica = read_only and not pinned
+            if on_replica and request is not None and read_flights.enabled:
+                result = read_flights.do(
+                    flight_key(request), lambda: as_bytes(self._run_action(action, True)), time_remaining(context)
+                )
+            else:
+                result = self._run_action(action, on_replica, cached=not pinned)
+            if not read_only:
+                primary_pins.pin(client)
+                read_flights.invalidate()
+            logger.info("Service action executed successfully")
+            return result
+        except Exception as e:
+            set_error_status(context, e)
+        return None
+
+    def _run_action(self, action, on_replica, cached=True):
+        while True:
+            try:
+                with get_db_session(read_only=on_replica) as db_session:
+                    repo = LibraryRepository(db_session, cached)
+                    service = LibraryService(repo)
+                    return action(service)
+            except ReplicaUnavailable:
+                on_replica = False
+
+    def _stream_with_service(self, context, action):
+        # The session stays open for the lifetime of the stream so the server-side cursor can be consumed lazily.
+        # Streams only read, so they run on a replica unless the client is pinned to the primary.
+        bind_request_id(context)
+        try:
+            logger.info("Executing streaming service action")
+            on_replica = not primary_pins.is_pinned(client_key(context))
+            with get_db_session(read_only=on_replica) as db_session:
                 repo = LibraryRepository(db_session)
                 service = LibraryService(repo)
-                result = action(service)
-                logger.info("Service action executed successfully")
-                return result
-        except ValueError as e:
-            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
-            context.set_details(str(e))
-        except grpc.RpcError as e:
-            context.set_code(e.code())
-            context.set_details(e.details())
+                yield from action(service)
+                logger.info("Streaming service action executed successfully")
         except Exception as e:
-            logger.exception(f"An unexpected error occurred: {e}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details("An unexpected error occurred")
-        return None
+            set_error_status(context, e)
+
+    def _watch(self, context, topic, resume_token, build):
+        # Watch streams hold no session: the change feed reads the changes for every subscriber
+        # and this thread only sends the responses it built, once per batch for all of them.
+        bind_request_id(context)
+        try:
+            logger.info("Watching %s changes", topic)
+            subscription = change_feed.subscribe(topic, resume_token)
+            context.add_callback(subscription.close)
+            for batch in subscription:
+                yield batch.response(topic, build)
+            logger.info("Stopped watching %s changes", topic)
+        except Exception as e:
+            set_error_status(context, e)
 
     def CreateBook(self, request, context):
         def action(service):
-            logger.info(f"Creating book with title: {request.title}")
+            logger.info("Creating book with title: %s", request.title)
             published_date = request.published_date
             book = service.create_book(request.title, request.author, published_date, request.isbn)
-            logger.info(f"Book created with ID: {book.id}")
+            logger.info("Book created with ID: %s", book.id)
             return library_pb2.CreateBookResponse(book=self._to_book_proto(book))
         
         response = self._execute_with_service(context, action)
@@ -43,14 +119,14 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def UpdateBook(self, request, context):
         def action(service):
-            logger.info(f"Updating book with ID: {request.id}")
+            logger.info("Updating book with ID: %s", request.id)
             published_date = request.published_date
-            book = service.update_book(request.id, request.title, request.author, published_date, request.isbn)
+            book = service.update_book(request.id, request.title, request.author, published_date, request.isbn, request.expected_version)
             if not book:
                 context.set_code(grpc.StatusCode.NOT_FOUND)
                 context.set_details(f"Book with id {request.id} not found")
                 return None
-            logger.info(f"Book with ID: {request.id} updated successfully")
+            logger.info("Book with ID: %s updated successfully", request.id)
             return library_pb2.UpdateBookResponse(book=self._to_book_proto(book))
         
         response = self._execute_with_service(context, action)
@@ -58,13 +134,13 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def DeleteBook(self, request, context):
         def action(service):
-            logger.info(f"Deleting book with ID: {request.id}")
+            logger.info("Deleting book with ID: %s", request.id)
             success = service.delete_book(request.id)
             if not success:
                 context.set_code(grpc.StatusCode.NOT_FOUND)
                 context.set_details(f"Book with id {request.id} not found")
                 return None
-            logger.info(f"Book with ID: {request.id} deleted successfully")
+            logger.info("Book with ID: %s deleted successfully", request.id)
             return library_pb2.google_dot_protobuf_dot_empty__pb2.Empty()
         
         response = self._execute_with_service(context, action)
@@ -72,49 +148,153 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def GetBook(self, request, context):
         def action(service):
-            logger.info(f"Getting book with ID: {request.id}")
+            logger.info("Getting book with ID: %s", request.id)
             book = service.get_book(request.id)
-            logger.info(f"Book with ID: {request.id} retrieved successfully")
+            logger.info("Book with ID: %s retrieved successfully", request.id)
             return self._to_book_proto(book)
         
-        response = self._execute_with_service(context, action)
+        response = self._execute_with_service(context, action, read_only=True, request=request)
         return response or library_pb2.Book()
     
+    def BatchGetBooks(self, request, context):
+        def action(service):
+            logger.info("Batch getting %s books", len(request.ids))
+            results = service.batch_get_books(list(request.ids))
+            return library_pb2.BatchGetBooksResponse(
+                results=[to_book_lookup_result_proto(book_id, book) for book_id, book in results]
+            )
+
+        response = self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.BatchGetBooksResponse()
+
     def ListBooks(self, request, context):
         def action(service):
-            logger.info("Listing all books")
-            books = service.list_books()
-            logger.info(f"Listed {len(books)} books")
-            return library_pb2.ListBooksResponse(books=[self._to_book_proto(book) for book in books])
+            logger.info("Listing books")
+            books, next_page_token = service.list_books(request.page_size, request.page_token)
+            logger.info("Listed %s books", len(books))
+            return book_fragments.encode_list_response(books, next_page_token)
         
-        response = self._execute_with_service(context, action)
+        response = self._execute_with_service(context, action, read_only=True, request=request)
         return response or library_pb2.ListBooksResponse()
 
+    def SearchBooks(self, request, context):
+        def action(service):
+            logger.info("Searching books for: %s", request.query)
+            hits, next_page_token = service.search_books(request.query, request.page_size, request.page_token)
+            logger.info("Found %s matching books", len(hits))
+            return library_pb2.SearchBooksResponse(
+                hits=[to_book_search_hit_proto(hit) for hit in hits], next_page_token=next_page_token
+            )
+
+        response = self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.SearchBooksResponse()
+
+    def SuggestBooks(self, request, context):
+        def action(service):
+            logger.info("Suggesting books for: %s", request.query)
+            suggestions = service.suggest_books(request.query, request.limit)
+            logger.info("Suggested %s books", len(suggestions))
+            return library_pb2.SuggestBooksResponse(
+                suggestions=[to_book_suggestion_proto(suggestion) for suggestion in suggestions]
+            )
+
+        response = self._execute_with_service(context, action, read_only=True)
+        return response or library_pb2.SuggestBooksResponse()
+
+    def BatchCreateBooks(self, request, context):
+        def action(service):
+            logger.info("Batch creating %s books", len(request.books))
+            items = [(book.title, book.author, book.published_date, book.isbn) for book in request.books]
+            results = service.batch_create_books(items)
+            return library_pb2.BatchCreateBooksResponse(
+                results=[to_batch_create_book_result_proto(result) for result in results]
+            )
+
+        response = self._execute_with_service(context, action)
+        return response or library_pb2.BatchCreateBooksResponse()
+
+    def StreamBooks(self, request, context):
+        def action(service):
+            logger.info("Streaming all books")
+            total = 0
+            for books in service.stream_books(request.batch_size):
+                total += len(books)
+                yield library_pb2.StreamBooksResponse(books=[self._to_book_proto(book) for book in books])
+            logger.info("Streamed %s books", total)
+
+        return self._stream_with_service(context, action)
+
     def ListAvailableBooks(self, request, context):
         def action(service):
-            logger.info("Listing all available books")
-            books = service.list_available_books()
-            logger.info(f"Listed {len(books)} available books")
-            return library_pb2.ListAvailableBooksResponse(books=[self._to_book_proto(book) for book in books])
+            logger.info("Listing available books")
+            books, next_page_token = service.list_available_books(request.page_size, request.page_token)
+            logger.info("Listed %s available books", len(books))
+            return book_fragments.encode_list_response(books, next_page_token)
         
-        response = self._execute_with_service(context, action)
+        response = self._execute_with_service(context, action, read_only=True, request=request)
         return response or library_pb2.ListAvailableBooksResponse()
 
+    def BatchGetMembers(self, request, context):
+        def action(service):
+            logger.info("Batch getting %s members", len(request.ids))
+            results = service.batch_get_members(list(request.ids))
+            return library_pb2.BatchGetMembersResponse(
+                results=[to_member_lookup_result_proto(member_id, member) for member_id, member in results]
+            )
+
+        response = self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.BatchGetMembersResponse()
+
     def ListMembers(self, request, context):
         def action(service):
-            logger.info("Listing all members")
-            members = service.list_members()
-            logger.info(f"Listed {len(members)} members")
-            return library_pb2.ListMembersResponse(members=[self._to_member_proto(member) for member in members])
+            logger.info("Listing members")
+            members, next_page_token = service.list_members(request.page_size, request.page_token)
+            logger.info("Listed %s members", len(members))
+            return member_fragments.encode_list_response(members, next_page_token)
         
-        response = self._execute_with_service(context, action)
+        response = self._execute_with_service(context, action, read_only=True, request=request)
         return response or library_pb2.ListMembersResponse()
 
+    def SearchMembers(self, request, context):
+        def action(service):
+            logger.info("Searching members for: %s", request.query)
+            hits, next_page_token = service.search_members(request.query, request.page_size, request.page_token)
+            logger.info("Found %s matching members", len(hits))
+            return library_pb2.SearchMembersResponse(
+                hits=[to_member_search_hit_proto(hit) for hit in hits], next_page_token=next_page_token
+            )
+
+        response = self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.SearchMembersResponse()
+
+    def BatchCreateMembers(self, request, context):
+        def action(service):
+            logger.info("Batch creating %s members", len(request.members))
+            items = [(member.name, member.email) for member in request.members]
+            results = service.batch_create_members(items)
+            return library_pb2.BatchCreateMembersResponse(
+                results=[to_batch_create_member_result_proto(result) for result in results]
+            )
+
+        response = self._execute_with_service(context, action)
+        return response or library_pb2.BatchCreateMembersResponse()
+
+    def StreamMembers(self, request, context):
+        def action(service):
+            logger.info("Streaming all members")
+            total = 0
+            for members in service.stream_members(request.batch_size):
+                total += len(members)
+                yield library_pb2.StreamMembersResponse(members=[self._to_member_proto(member) for member in members])
+            logger.info("Streamed %s members", total)
+
+        return self._stream_with_service(context, action)
+
     def CreateMember(self, request, context):
         def action(service):
-            logger.info(f"Creating member with name: {request.name}")
+            logger.info("Creating member with name: %s", request.name)
             member = service.create_member(request.name, request.email)
-            logger.info(f"Member created with ID: {member.id}")
+            logger.info("Member created with ID: %s", member.id)
             return library_pb2.CreateMemberResponse(member=self._to_member_proto(member))
         
         response = self._execute_with_service(context, action)
@@ -122,13 +302,13 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def UpdateMember(self, request, context):
         def action(service):
-            logger.info(f"Updating member with ID: {request.id}")
-            member = service.update_member(request.id, request.name, request.email)
+            logger.info("Updating member with ID: %s", request.id)
+            member = service.update_member(request.id, request.name, request.email, request.expected_version)
             if not member:
                 context.set_code(grpc.StatusCode.NOT_FOUND)
                 context.set_details(f"Member with id {request.id} not found")
                 return None
-            logger.info(f"Member with ID: {request.id} updated successfully")
+            logger.info("Member with ID: %s updated successfully", request.id)
             return library_pb2.UpdateMemberResponse(member=self._to_member_proto(member))
         
         response = self._execute_with_service(context, action)
@@ -136,13 +316,13 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def DeleteMember(self, request, context):
         def action(service):
-            logger.info(f"Deleting member with ID: {request.id}")
+            logger.info("Deleting member with ID: %s", request.id)
             success = service.delete_member(request.id)
             if not success:
                 context.set_code(grpc.StatusCode.NOT_FOUND)
                 context.set_details(f"Member with id {request.id} not found")
                 return None
-            logger.info(f"Member with ID: {request.id} deleted successfully")
+            logger.info("Member with ID: %s deleted successfully", request.id)
             return library_pb2.google_dot_protobuf_dot_empty__pb2.Empty()
         
         response = self._execute_with_service(context, action)
@@ -150,19 +330,19 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def GetMember(self, request, context):
         def action(service):
-            logger.info(f"Getting member with ID: {request.id}")
+            logger.info("Getting member with ID: %s", request.id)
             member = service.get_member(request.id)
-            logger.info(f"Member with ID: {request.id} retrieved successfully")
+            logger.info("Member with ID: %s retrieved successfully", request.id)
             return self._to_member_proto(member)
         
-        response = self._execute_with_service(context, action)
+        response = self._execute_with_service(context, action, read_only=True, request=request)
         return response or library_pb2.Member()
 
     def BorrowBook(self, request, context):
         def action(service):
-            logger.info(f"Borrowing book with ID: {request.book_id} for member ID: {request.member_id}")
+            logger.info("Borrowing book with ID: %s for member ID: %s", request.book_id, request.member_id)
             borrow_record = service.borrow_book(request.book_id, request.member_id)
-            logger.info(f"Book with ID: {request.book_id} borrowed successfully by member ID: {request.member_id}")
+            logger.info("Book with ID: %s borrowed successfully by member ID: %s", request.book_id, request.member_id)
             return library_pb2.BorrowBookResponse(borrow_record=self._to_borrow_record_proto(borrow_record))
 
         response = self._execute_with_service(context, action)
@@ -170,9 +350,9 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def ReturnBook(self, request, context):
         def action(service):
-            logger.info(f"Returning book with borrow record ID: {request.borrow_record_id}")
+            logger.info("Returning book with borrow record ID: %s", request.borrow_record_id)
             borrow_record = service.return_book(request.borrow_record_id)
-            logger.info(f"Book with borrow record ID: {request.borrow_record_id} returned successfully")
+            logger.info("Book with borrow record ID: %s returned successfully", request.borrow_record_id)
             return library_pb2.ReturnBookResponse(borrow_record=self._to_borrow_record_proto(borrow_record))
 
         response = self._execute_with_service(context, action)
@@ -180,8 +360,8 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
 
     def ListBorrowings(self, request, context):
         def action(service):
-            logger.info("Listing all borrowing records")
-            borrow_records_with_details = service.list_borrowings()
+            logger.info("Listing borrowing records")
+            borrow_records_with_details, next_page_token = service.list_borrowings(request.page_size, request.page_token)
             borrowing_details_list = []
             for br_with_details in borrow_records_with_details:
                 borrowing_details_list.append(library_pb2.BorrowingDetails(
@@ -189,40 +369,96 @@ class LibraryServiceServicer(library_pb2_grpc.LibraryServiceServicer):
                     book=self._to_book_proto(br_with_details.book),
                     member=self._to_member_proto(br_with_details.member)
                 ))
-            logger.info(f"Listed {len(borrowing_details_list)} borrowing records with details")
-            return library_pb2.ListBorrowingsResponse(borrowings=borrowing_details_list)
+            logger.info("Listed %s borrowing records with details", len(borrowing_details_list))
+            return library_pb2.ListBorrowingsResponse(borrowings=borrowing_details_list, next_page_token=next_page_token)
 
-        response = self._execute_with_service(context, action)
+        response = self._execute_with_service(context, action, read_only=True, request=request)
         return response or library_pb2.ListBorrowingsResponse()
 
-    def _to_book_proto(self, book):
-        return library_pb2.Book(id=book.id, title=book.title, author=book.author, published_date=book.published_date.strftime("%Y-%m-%d"), isbn=book.isbn, is_available=book.is_available)
+    def StreamBorrowings(self, request, context):
+        def action(service):
+            logger.info("Streaming all borrowing records")
+            total = 0
+            for borrow_records in service.stream_borrowings(request.batch_size):
+                total += len(borrow_records)
+                yield library_pb2.StreamBorrowingsResponse(
+                    borrowings=[to_borrowing_details_proto(br_with_details) for br_with_details in borrow_records]
+                )
+            logger.info("Streamed %s borrowing records with details", total)
+
+        return self._stream_with_service(context, action)
+
+    def ExportData(self, request, context):
+        def action(service):
+            dataset = EXPORT_DATASETS.get(request.dataset, "")
+            file_format = EXPORT_FORMATS.get(request.format, "")
+            logger.info("Exporting %s as %s", dataset, file_format)
+            total = 0
+            for chunk in service.export_data(dataset, file_format):
+                total += len(chunk)
+                yield library_pb2.ExportDataChunk(data=chunk)
+            logger.info("Exported %s bytes of %s", total, dataset)
 
-    def _to_member_proto(self, member):
-        return library_pb2.Member(id=member.id, name=member.name, email=member.email, join_date=member.join_date.strftime("%Y-%m-%d"))
+        return self._stream_with_service(context, action)
+
+    def WatchBooks(self, request, context):
+        return self._watch(context, BOOKS, request.resume_token, to_watch_books_response)
+
+    def WatchBorrowings(self, request, context):
+        return self._watch(context, BORROWINGS, request.resume_token, to_watch_borrowings_response)
+
+    def ListChangesSince(self, request, context):
+        def action(service):
+            entity = SYNC_ENTITIES.get(request.entity, "")
+            changed, deleted_ids, version, next_page_token = service.list_changes_since(
+                entity, request.version, request.page_size, request.page_token
+            )
+            logger.info("Listed %s changed and %s deleted %s since version %s", len(changed), len(deleted_ids), entity, request.version)
+            return to_list_changes_since_response(entity, changed, deleted_ids, version, next_page_token)
 
-    def _to_borrow_record_proto(self, borrow_record):
-        proto_return_date = None
-        if borrow_record.return_date:
-            proto_return_date = timestamp_pb2.Timestamp()
-            proto_return_date.FromDatetime(datetime.combine(borrow_record.return_date, datetime.min.time())) # Convert date to datetime for FromDatetime
+        response = self._execute_with_service(context, action, read_only=True, request=request)
+        return response or library_pb2.ListChangesSinceResponse()
 
-        return library_pb2.BorrowRecord(
-            id=borrow_record.id,
-            book_id=borrow_record.book_id,
-            member_id=borrow_record.member_id,
-            borrow_date=borrow_record.borrow_date.strftime("%Y-%m-%d"),
-            return_date=proto_return_date,
-            status=library_pb2.BorrowingStatus.Value(borrow_record.status.name) # Convert ORM Enum to Protobuf Enum
-        )
+    _to_book_proto = staticmethod(to_book_proto)
+    _to_member_proto = staticmethod(to_member_proto)
+    _to_borrow_record_proto = staticmethod(to_borrow_record_proto)
 
-def create_server():
+# Thread pools of the server created by create_server, for their stats.
+rpc_executor = None
+
+def create_server(options=None):
+    global rpc_executor
     logger.info("Creating gRPC server")
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    
+    pool = database.engine.pool
+    threads = GRPC_POOLS or {"default": GRPC_MAX_WORKERS}
+    # Watch streams hold no connection, so their threads do not count against the connection pool.
+    check_pool_coherence(
+        sum(count for name, count in threads.items() if name != WATCH), pool.size(), pool.max_overflow, GRPC_ADAPTIVE_WORKERS
+    )
+    # Adaptive mode starts each pool with as many RPCs at once as the process has connections.
+    limits = (
+        {name: count if name == WATCH else min(count, pool.size() + pool.max_overflow) for name, count in threads.items()}
+        if GRPC_ADAPTIVE_WORKERS
+        else None
+    )
+    rpc_executor = BulkheadExecutor(threads, GRPC_POOL_METHODS, limits)
+    # Bulkheads first, so the handler they route is the one the server runs; metrics before admission
+    # control, so RPCs turned away are counted with their status too.
+    server = grpc.server(
+        rpc_executor,
+        interceptors=[BulkheadInterceptor(rpc_executor), MetricsInterceptor(), AdmissionInterceptor(rpc_executor)],
+        options=options,
+    )
+    PoolMonitor(database.pool_stats, rpc_executor.pools.values(), adaptive=GRPC_ADAPTIVE_WORKERS, fixed=(WATCH,)).start()
+    logger.info(
+        "RPC thread pools: %s",
+        ", ".join(f"{name}={count}" for name, count in threads.items()),
+    )
+
     library_pb2_grpc.add_LibraryServiceServicer_to_server(
-        LibraryServiceServicer(), server
+        LibraryServiceServicer(), PreserializedResponses(server)
     )
+    change_feed.start()
     logger.info("gRPC server created successfully")
     return server
 
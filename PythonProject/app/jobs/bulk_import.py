@@ -0,0 +1,154 @@
+"""
+Loads books or members from a CSV or NDJSON file with COPY, e.g. to onboard a branch catalogue:
+
+    python -m app.jobs.bulk_import books catalogue.csv
+    python -m app.jobs.bulk_import members members.ndjson --rejects members.rejected.ndjson
+
+CSV files need a header row. Books need title, author, published_date (YYYY-MM-DD) and isbn;
+members need name and email. Rows are validated like CreateBook/CreateMember and committed in
+batches of --batch-size rows, so memory stays bounded whatever the file size, and an interrupted
+import can be rerun: rows that already made it in are skipped as duplicates.
+
+Rejected rows go to the rejects file (default: the input path plus .rejected.ndjson), one JSON
+object per row with its line number, the reason and the record. The command exits with 1 if any
+row was rejected.
+"""
+from app.db.database import get_db_session
+from app.logging_service import setup_logging
+from app.repositories.library_repository import LibraryRepository, IMPORT_COLUMNS, IMPORT_KEYS
+from app.services.library_service import book_row, member_row
+from datetime import date
+from typing import IO, Iterator, Tuple
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50000
+
+ROW_BUILDERS = {"books": book_row, "members": member_row}
+
+
+def read_csv(stream: IO[str]) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_ndjson(stream: IO[str]) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, line.rstrip("\n")
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def to_row(table: str, record) -> dict:
+    """
+    Validates a record like the create RPCs do and returns the column values to import.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object.")
+    fields = [name for name, _ in IMPORT_COLUMNS[table]]
+    values = ["" if record.get(name) is None else str(record.get(name)) for name in fields]
+    return ROW_BUILDERS[table](*values)
+
+
+class BulkImport:
+    """
+    Streams validated rows into CSV batches for LibraryRepository.copy_import and writes the
+    rejected ones to the rejects file.
+    """
+
+    def __init__(self, table: str, rejects: IO[str], batch_size: int):
+        self.table = table
+        self.rejects = rejects
+        self.batch_size = batch_size
+        self.fields = [name for name, _ in IMPORT_COLUMNS[table]]
+        self.total = self.imported = self.rejected = 0
+        self._reset()
+
+    def _reset(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, quoting=csv.QUOTE_ALL)
+        self.records = {}
+
+    def reject(self, line: int, error: str, record) -> None:
+        self.rejected += 1
+        self.rejects.write(json.dumps({"line": line, "error": error, "record": record}) + "\n")
+
+    def add(self, line: int, record) -> None:
+        self.total += 1
+        try:
+            row = to_row(self.table, record)
+        except ValueError as e:
+            self.reject(line, str(e), record)
+            return
+        values = [value.isoformat() if isinstance(value, date) else value for value in (row[name] for name in self.fields)]
+        self.writer.writerow([line, str(uuid.uuid4()), *values])
+        # Kept only for the rows of the current batch, to report the ones skipped as duplicates.
+        self.records[line] = record
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.records:
+            return
+        self.buffer.seek(0)
+        with get_db_session() as db_session:
+            skipped = LibraryRepository(db_session).copy_import(self.table, self.buffer)
+        key = IMPORT_KEYS[self.table]
+        entity = self.table[:-1].capitalize()
+        for line, value in skipped:
+            self.reject(line, f"{entity} with {key} {value} already exists.", self.records[line])
+        self.imported += len(self.records) - len(skipped)
+        logger.info("Imported %s of %s %s so far.", self.imported, self.total, self.table)
+        self._reset()
+
+
+def bulk_import(table: str, stream: IO[str], file_format: str, rejects: IO[str], batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Imports the records of stream into table. Returns the number of records read, imported and rejected.
+    """
+    job = BulkImport(table, rejects, batch_size)
+    for line, record in READERS[file_format](stream):
+        job.add(line, record)
+    job.flush()
+    return job.total, job.imported, job.rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import books or members with COPY")
+    parser.add_argument("table", choices=sorted(IMPORT_COLUMNS), help="what the file contains")
+    parser.add_argument("path", help="CSV or NDJSON file, or - for standard input")
+    parser.add_argument("--format", choices=sorted(READERS), help="file format (default: from the file extension)")
+    parser.add_argument("--rejects", help="where to write rejected rows (default: PATH.rejected.ndjson)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per COPY and transaction")
+    args = parser.parse_args()
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive")
+
+    file_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    rejects_path = args.rejects or ("rejected.ndjson" if args.path == "-" else f"{args.path}.rejected.ndjson")
+
+    setup_logging()
+    stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    with stream, open(rejects_path, "w", encoding="utf-8") as rejects:
+        total, imported, rejected = bulk_import(args.table, stream, file_format, rejects, args.batch_size)
+    logger.info("Imported %s of %s %s; %s rejected (see %s).", imported, total, args.table, rejected, rejects_path)
+    if rejected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Writes books, members or borrowings (with their book and member columns) to a file with COPY,
+for reporting and analytics:
+
+    python -m app.jobs.export borrowings borrowings.csv
+    python -m app.jobs.export borrowings borrowings.ndjson
+    python -m app.jobs.export borrowings borrowings.parquet
+
+The format follows the file extension unless --format is given; use - as the path to write CSV or
+NDJSON to standard output. CSV and NDJSON are written as Postgres produces them. Parquet needs
+pyarrow (pip install pyarrow) and is converted one block of rows at a time, so memory stays
+bounded whatever the size of the table.
+"""
+from app.db.database import get_db_session
+from app.logging_service import setup_logging
+from app.repositories.library_repository import LibraryRepository, EXPORT_COLUMNS
+from app.services.export import stream_copy
+from typing import Iterator
+import argparse
+import io
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson", "parquet")
+
+# Bytes of CSV per Parquet row group.
+PARQUET_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+class ChunkReader(io.RawIOBase):
+    # Read-only file over an iterator of byte chunks, for readers that want a file.
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = iter(chunks)
+        self.pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(target), len(self.pending))
+        target[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def write_parquet(dataset: str, csv_chunks: Iterator[bytes], path: str) -> int:
+    """
+    Converts the CSV export of dataset to a Parquet file with the column types of
+    EXPORT_COLUMNS. Returns the number of rows written.
+    """
+    try:
+        import pyarrow
+        from pyarrow import csv, parquet
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+
+    types = {"string": pyarrow.string(), "date": pyarrow.date32(), "bool": pyarrow.bool_()}
+    schema = pyarrow.schema([(name, types[kind]) for name, _, kind in EXPORT_COLUMNS[dataset]])
+    reader = csv.open_csv(
+        io.BufferedReader(ChunkReader(csv_chunks), buffer_size=1024 * 1024),
+        read_options=csv.ReadOptions(block_size=PARQUET_BLOCK_SIZE),
+        # COPY writes NULL as an empty field and an empty string as "", and booleans as t/f.
+        convert_options=csv.ConvertOptions(
+            column_types=schema,
+            null_values=[""],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"],
+            false_values=["f"],
+        ),
+    )
+    rows = 0
+    with parquet.ParquetWriter(path, schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def export(dataset: str, file_format: str, path: str) -> None:
+    with get_db_session() as db_session:
+        repository = LibraryRepository(db_session)
+        if file_format == "parquet":
+            chunks = stream_copy(lambda output: repository.copy_export(dataset, "csv", output))
+            rows = write_parquet(dataset, chunks, path)
+            logger.info("Wrote %s rows to %s.", rows, path)
+        elif path == "-":
+            repository.copy_export(dataset, file_format, sys.stdout.buffer)
+        else:
+            with open(path, "wb") as output:
+                repository.copy_export(dataset, file_format, output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export books, members or borrowings with COPY")
+    parser.add_argument("dataset", choices=sorted(EXPORT_COLUMNS))
+    parser.add_argument("path", help="output file, or - for standard output")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the file extension)")
+    args = parser.parse_args()
+
+    extension = args.path.rsplit(".", 1)[-1].lower()
+    file_format = args.format or ("ndjson" if extension in ("ndjson", "jsonl") else extension if extension in FORMATS else "csv")
+    if file_format == "parquet" and args.path == "-":
+        parser.error("Parquet cannot be written to standard output")
+
+    if args.path != "-":
+        # Logs go to standard output, where they would end up in the export.
+        setup_logging()
+    started = time.perf_counter()
+    export(args.dataset, file_format, args.path)
+    logger.info(
+        "Exported %s as %s to %s in %.1fs.",
+        args.dataset, file_format, args.path, time.perf_counter() - started,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Checks that Book.is_available agrees with the active borrow records, and optionally repairs it.
+
+ListAvailableBooks trusts the flag, so run this after restoring data or editing rows by hand,
+or periodically from cron:
+
+    python -m app.jobs.reconcile_availability            # report only, exits 1 on mismatches
+    python -m app.jobs.reconcile_availability --repair   # fix the flags
+"""
+from app.db.database import get_db_session
+from app.logging_service import setup_logging
+from app.repositories.library_repository import LibraryRepository
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_availability(repair: bool = False):
+    """
+    Returns the number of books wrongly marked available and wrongly marked unavailable.
+    With repair, the flags are corrected in the same transaction.
+    """
+    with get_db_session() as db_session:
+        return LibraryRepository(db_session).reconcile_availability(repair)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile book availability with borrow records")
+    parser.add_argument("--repair", action="store_true", help="correct mismatched is_available flags")
+    args = parser.parse_args()
+
+    setup_logging()
+    wrongly_available, wrongly_unavailable = reconcile_availability(args.repair)
+    action = "Repaired" if args.repair else "Found"
+    logger.info("%s %s books marked available while borrowed and %s books marked unavailable while not borrowed.",
+                action, wrongly_available, wrongly_unavailable,)
+    if not args.repair and (wrongly_available or wrongly_unavailable):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
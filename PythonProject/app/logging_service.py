@@ -1,18 +1,251 @@
+from app.config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
 
-def setup_logging():
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(filename)s - %(funcName)s - %(message)s"
+
+# Metadata key a caller (e.g. the API gateway) can send to have its own id in the server's log lines.
+REQUEST_ID_METADATA_KEY = "x-request-id"
+
+# Id of the RPC being served by the current thread or task, added to every log record.
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def bind_request_id(context) -> str:
+    """
+    Sets the request id for the log lines of the current RPC: the caller's x-request-id metadata
+    if sent, otherwise a new id.
+
+    It is not reset afterwards: grpc.aio runs every RPC in its own task, and the sync server's
+    threads only run RPCs, each of which binds its own id first.
+    """
+    rid = None
+    for key, value in context.invocation_metadata() or ():
+        if key == REQUEST_ID_METADATA_KEY:
+            rid = value
+            break
+    rid = rid or os.urandom(8).hex()
+    request_id.set(rid)
+    return rid
+
+
+class SampleRates:
+    """
+    Fraction of the INFO and DEBUG records kept per logger, from a {logger name: fraction} dict
+    whose entries also cover the children of each logger.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        for name, rate in rates.items():
+            if not 0 <= rate <= 1:
+                raise ValueError(f"Sample rate of logger '{name}' must be between 0 and 1, got {rate}.")
+        self.rates = dict(rates)
+        self._resolved: Dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+
+_sample_rates: Optional[SampleRates] = None
+
+
+class SamplingLogger(logging.Logger):
+    """
+    Logger that skips the sampled-out INFO and DEBUG calls before a record is created, which is
+    where most of the cost of a log call goes.
+    """
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level <= logging.INFO and _sample_rates is not None:
+            rate = _sample_rates.rate(self.name)
+            if rate < 1 and random.random() >= rate:
+                return False
+        return super().isEnabledFor(level)
+
+
+class RecordContextFilter(logging.Filter):
     """
-    Configures structured logging for the application.
+    Adds the request id, and the sample rate of sampled loggers, to every record. It runs on the
+    thread that logs, where the request id is set.
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(filename)s - %(funcName)s - %(message)s",
-        stream=sys.stdout,
-    )
-    # You can add more handlers here, for example, to log to a file
-    # file_handler = logging.FileHandler("app.log")
-    # file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
-    # logging.getLogger().addHandler(file_handler)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get() or "-"
+        if _sample_rates is not None and record.levelno <= logging.INFO:
+            rate = _sample_rates.rate(record.name)
+            if rate < 1:
+                # Lets readers scale counts of sampled lines back up.
+                record.sample_rate = rate
+        return True
+
+
+def _use_sample_rates(rates: Dict[str, float]) -> None:
+    global _sample_rates
+    _sample_rates = SampleRates(rates) if rates else None
+    if _sample_rates is None:
+        return
+    # Module loggers already exist by now; later ones are created as SamplingLogger directly.
+    logging.setLoggerClass(SamplingLogger)
+    for existing in list(logging.Logger.manager.loggerDict.values()):
+        if type(existing) is logging.Logger and _sample_rates.rate(existing.name) < 1:
+            existing.__class__ = SamplingLogger
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread. Only the message arguments are merged on the logging
+    thread, because they may change or be unsafe to touch from another thread once the call
+    returns; timestamps, JSON and the write happen on the writer thread. When the queue is full
+    the record is dropped and counted rather than blocking the RPC.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with the time, level, logger, request id, source and message.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "file": record.filename,
+            "function": record.funcName,
+        }
+        rid = getattr(record, "request_id", "-")
+        if rid != "-":
+            entry["request_id"] = rid
+        if hasattr(record, "sample_rate"):
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_handler: Optional[BackgroundQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_output: Optional[logging.Handler] = None
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    log_format: str = LOG_FORMAT,
+    sample_rates: Dict[str, float] = LOG_SAMPLE_RATES,
+    stream=sys.stdout,
+    background: bool = True,
+):
+    """
+    Configures logging for the application: records of level and above go to stream as JSON or
+    text, written by a background thread unless background is False.
+    """
+    global _handler, _listener, _output
+    if log_format not in ("json", "text"):
+        raise ValueError(f"LOG_FORMAT must be 'json' or 'text', got '{log_format}'.")
+    stop_logging()
+
+    _use_sample_rates(sample_rates)
+    # Neither format includes them, and looking them up is a good part of creating a record.
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+    _output = logging.StreamHandler(stream)
+    _output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    context_filter = RecordContextFilter()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+    if background:
+        _handler = BackgroundQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _handler.addFilter(context_filter)
+        _listener = QueueListener(_handler.queue, _output)
+        _listener.start()
+        root.addHandler(_handler)
+    else:
+        _output.addFilter(context_filter)
+        root.addHandler(_output)
+
+
+def stop_logging():
+    """
+    Writes out the queued records and stops the writer thread; later records are written
+    directly by the logging thread.
+    """
+    global _handler, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    for context_filter in _handler.filters:
+        _output.addFilter(context_filter)
+    root.addHandler(_output)
+    _handler = _listener = None
+
+
+def dropped_records() -> int:
+    """
+    Records dropped because the writer thread fell behind by more than LOG_QUEUE_SIZE records.
+    """
+    return _handler.dropped if _handler else 0
+
+
+def _restart_after_fork():
+    # The writer thread does not survive fork, and the queue's lock may have been held by it.
+    global _listener
+    if _listener is None:
+        return
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler.dropped = 0
+    _listener = QueueListener(_handler.queue, _output)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(stop_logging)
 
 logger = logging.getLogger(__name__)
@@ -26,71 +26,155 @@ from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rlibrary.proto\x12\x07library\x1a\x1fgoogle/protobuf/timestamp.proto\x1a\x1bgoogle/protobuf/empty.proto\"m\n\x04\x42ook\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x16\n\x0epublished_date\x18\x04 \x01(\t\x12\x0c\n\x04isbn\x18\x05 \x01(\t\x12\x14\n\x0cis_available\x18\x06 \x01(\x08\"D\n\x06Member\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\x11\n\tjoin_date\x18\x04 \x01(\t\"\xae\x01\n\x0c\x42orrowRecord\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0f\n\x07\x62ook_id\x18\x02 \x01(\t\x12\x11\n\tmember_id\x18\x03 \x01(\t\x12\x13\n\x0b\x62orrow_date\x18\x04 \x01(\t\x12/\n\x0breturn_date\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12(\n\x06status\x18\x06 \x01(\x0e\x32\x18.library.BorrowingStatus\"~\n\x10\x42orrowingDetails\x12,\n\rborrow_record\x18\x01 \x01(\x0b\x32\x15.library.BorrowRecord\x12\x1b\n\x04\x62ook\x18\x02 \x01(\x0b\x32\r.library.Book\x12\x1f\n\x06member\x18\x03 \x01(\x0b\x32\x0f.library.Member\"\x1f\n\x11\x44\x65leteBookRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\x1c\n\x0eGetBookRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\x12\n\x10ListBooksRequest\"1\n\x11ListBooksResponse\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\"\x1b\n\x19ListAvailableBooksRequest\":\n\x1aListAvailableBooksResponse\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\">\n\x13UpdateMemberRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\"7\n\x14UpdateMemberResponse\x12\x1f\n\x06member\x18\x01 \x01(\x0b\x32\x0f.library.Member\"!\n\x13\x44\x65leteMemberRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\x1e\n\x10GetMemberRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\x14\n\x12ListMembersRequest\"7\n\x13ListMembersResponse\x12 \n\x07members\x18\x01 \x03(\x0b\x32\x0f.library.Member\"X\n\x11\x43reateBookRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x16\n\x0epublished_date\x18\x03 \x01(\t\x12\x0c\n\x04isbn\x18\x04 \x01(\t\"1\n\x12\x43reateBookResponse\x12\x1b\n\x04\x62ook\x18\x01 \x01(\x0b\x32\r.library.Book\"d\n\x11UpdateBookRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x16\n\x0epublished_date\x18\x04 \x01(\t\x12\x0c\n\x04isbn\x18\x05 \x01(\t\"1\n\x12UpdateBookResponse\x12\x1b\n\x04\x62ook\x18\x01 \x01(\x0b\x32\r.library.Book\"2\n\x13\x43reateMemberRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05\x65mail\x18\x02 \x01(\t\"7\n\x14\x43reateMemberResponse\x12\x1f\n\x06member\x18\x01 \x01(\x0b\x32\x0f.library.Member\"7\n\x11\x42orrowBookRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\x11\n\tmember_id\x18\x02 \x01(\t\"B\n\x12\x42orrowBookResponse\x12,\n\rborrow_record\x18\x01 \x01(\x0b\x32\x15.library.BorrowRecord\"-\n\x11ReturnBookRequest\x12\x18\n\x10\x62orrow_record_id\x18\x01 \x01(\t\"B\n\x12ReturnBookResponse\x12,\n\rborrow_record\x18\x01 \x01(\x0b\x32\x15.library.BorrowRecord\"\x17\n\x15ListBorrowingsRequest\"G\n\x16ListBorrowingsResponse\x12-\n\nborrowings\x18\x01 \x03(\x0b\x32\x19.library.BorrowingDetails*:\n\x0f\x42orrowingStatus\x12\x0b\n\x07UNKNOWN\x10\x00\x12\x0c\n\x08\x42ORROWED\x10\x01\x12\x0c\n\x08RETURNED\x10\x02\x32\x96\x08\n\x0eLibraryService\x12G\n\nCreateBook\x12\x1a.library.CreateBookRequest\x1a\x1b.library.CreateBookResponse\"\x00\x12G\n\nUpdateBook\x12\x1a.library.UpdateBookRequest\x1a\x1b.library.UpdateBookResponse\"\x00\x12\x42\n\nDeleteBook\x12\x1a.library.DeleteBookRequest\x1a\x16.google.protobuf.Empty\"\x00\x12\x33\n\x07GetBook\x12\x17.library.GetBookRequest\x1a\r.library.Book\"\x00\x12\x44\n\tListBooks\x12\x19.library.ListBooksRequest\x1a\x1a.library.ListBooksResponse\"\x00\x12_\n\x12ListAvailableBooks\x12\".library.ListAvailableBooksRequest\x1a#.library.ListAvailableBooksResponse\"\x00\x12M\n\x0c\x43reateMember\x12\x1c.library.CreateMemberRequest\x1a\x1d.library.CreateMemberResponse\"\x00\x12M\n\x0cUpdateMember\x12\x1c.library.UpdateMemberRequest\x1a\x1d.library.UpdateMemberResponse\"\x00\x12\x46\n\x0c\x44\x65leteMember\x12\x1c.library.DeleteMemberRequest\x1a\x16.google.protobuf.Empty\"\x00\x12\x39\n\tGetMember\x12\x19.library.GetMemberRequest\x1a\x0f.library.Member\"\x00\x12J\n\x0bListMembers\x12\x1b.library.ListMembersRequest\x1a\x1c.library.ListMembersResponse\"\x00\x12G\n\nBorrowBook\x12\x1a.library.BorrowBookRequest\x1a\x1b.library.BorrowBookResponse\"\x00\x12G\n\nReturnBook\x12\x1a.library.ReturnBookRequest\x1a\x1b.library.ReturnBookResponse\"\x00\x12S\n\x0eListBorrowings\x12\x1e.library.ListBorrowingsRequest\x1a\x1f.library.ListBorrowingsResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rlibrary.proto\x12\x07library\x1a\x1fgoogle/protobuf/timestamp.proto\x1a\x1bgoogle/protobuf/empty.proto\"~\n\x04\x42ook\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x16\n\x0epublished_date\x18\x04 \x01(\t\x12\x0c\n\x04isbn\x18\x05 \x01(\t\x12\x14\n\x0cis_available\x18\x06 \x01(\x08\x12\x0f\n\x07version\x18\x07 \x01(\x03\"U\n\x06Member\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\x11\n\tjoin_date\x18\x04 \x01(\t\x12\x0f\n\x07version\x18\x05 \x01(\x03\"\xbf\x01\n\x0c\x42orrowRecord\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0f\n\x07\x62ook_id\x18\x02 \x01(\t\x12\x11\n\tmember_id\x18\x03 \x01(\t\x12\x13\n\x0b\x62orrow_date\x18\x04 \x01(\t\x12/\n\x0breturn_date\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12(\n\x06status\x18\x06 \x01(\x0e\x32\x18.library.BorrowingStatus\x12\x0f\n\x07version\x18\x07 \x01(\x03\"~\n\x10\x42orrowingDetails\x12,\n\rborrow_record\x18\x01 \x01(\x0b\x32\x15.library.BorrowRecord\x12\x1b\n\x04\x62ook\x18\x02 \x01(\x0b\x32\r.library.Book\x12\x1f\n\x06member\x18\x03 \x01(\x0b\x32\x0f.library.Member\"\x1f\n\x11\x44\x65leteBookRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\x1c\n\x0eGetBookRequest\x12\n\n\x02id\x18\x01 \x01(\t\"#\n\x14\x42\x61tchGetBooksRequest\x12\x0b\n\x03ids\x18\x01 \x03(\t\"J\n\x10\x42ookLookupResult\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05\x66ound\x18\x02 \x01(\x08\x12\x1b\n\x04\x62ook\x18\x03 \x01(\x0b\x32\r.library.Book\"C\n\x15\x42\x61tchGetBooksResponse\x12*\n\x07results\x18\x01 \x03(\x0b\x32\x19.library.BookLookupResult\"9\n\x10ListBooksRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\"J\n\x11ListBooksResponse\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"B\n\x19ListAvailableBooksRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\"S\n\x1aListAvailableBooksResponse\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"J\n\x12SearchBooksRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\";\n\rBookSearchHit\x12\x1b\n\x04\x62ook\x18\x01 \x01(\x0b\x32\r.library.Book\x12\r\n\x05score\x18\x02 \x01(\x02\"T\n\x13SearchBooksResponse\x12$\n\x04hits\x18\x01 \x03(\x0b\x32\x16.library.BookSearchHit\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"3\n\x13SuggestBooksRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\x05\";\n\x0e\x42ookSuggestion\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\"D\n\x14SuggestBooksResponse\x12,\n\x0bsuggestions\x18\x01 \x03(\x0b\x32\x17.library.BookSuggestion\"(\n\x12StreamBooksRequest\x12\x12\n\nbatch_size\x18\x01 \x01(\x05\"3\n\x13StreamBooksResponse\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\"X\n\x13UpdateMemberRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\x18\n\x10\x65xpected_version\x18\x04 \x01(\x03\"7\n\x14UpdateMemberResponse\x12\x1f\n\x06member\x18\x01 \x01(\x0b\x32\x0f.library.Member\"!\n\x13\x44\x65leteMemberRequest\x12\n\n\x02id\x18\x01 \x01(\t\"\x1e\n\x10GetMemberRequest\x12\n\n\x02id\x18\x01 \x01(\t\"%\n\x16\x42\x61tchGetMembersRequest\x12\x0b\n\x03ids\x18\x01 \x03(\t\"P\n\x12MemberLookupResult\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05\x66ound\x18\x02 \x01(\x08\x12\x1f\n\x06member\x18\x03 \x01(\x0b\x32\x0f.library.Member\"G\n\x17\x42\x61tchGetMembersResponse\x12,\n\x07results\x18\x01 \x03(\x0b\x32\x1b.library.MemberLookupResult\";\n\x12ListMembersRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\"P\n\x13ListMembersResponse\x12 \n\x07members\x18\x01 \x03(\x0b\x32\x0f.library.Member\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"L\n\x14SearchMembersRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\x12\x12\n\npage_token\x18\x03 \x01(\t\"A\n\x0fMemberSearchHit\x12\x1f\n\x06member\x18\x01 \x01(\x0b\x32\x0f.library.Member\x12\r\n\x05score\x18\x02 \x01(\x02\"X\n\x15SearchMembersResponse\x12&\n\x04hits\x18\x01 \x03(\x0b\x32\x18.library.MemberSearchHit\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"*\n\x14StreamMembersRequest\x12\x12\n\nbatch_size\x18\x01 \x01(\x05\"9\n\x15StreamMembersResponse\x12 \n\x07members\x18\x01 \x03(\x0b\x32\x0f.library.Member\"X\n\x11\x43reateBookRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x02 \x01(\t\x12\x16\n\x0epublished_date\x18\x03 \x01(\t\x12\x0c\n\x04isbn\x18\x04 \x01(\t\"1\n\x12\x43reateBookResponse\x12\x1b\n\x04\x62ook\x18\x01 \x01(\x0b\x32\r.library.Book\"/\n\x0e\x42\x61tchItemError\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"D\n\x17\x42\x61tchCreateBooksRequest\x12)\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\x1a.library.CreateBookRequest\"j\n\x15\x42\x61tchCreateBookResult\x12\x1d\n\x04\x62ook\x18\x01 \x01(\x0b\x32\r.library.BookH\x00\x12(\n\x05\x65rror\x18\x02 \x01(\x0b\x32\x17.library.BatchItemErrorH\x00\x42\x08\n\x06result\"K\n\x18\x42\x61tchCreateBooksResponse\x12/\n\x07results\x18\x01 \x03(\x0b\x32\x1e.library.BatchCreateBookResult\"~\n\x11UpdateBookRequest\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x16\n\x0epublished_date\x18\x04 \x01(\t\x12\x0c\n\x04isbn\x18\x05 \x01(\t\x12\x18\n\x10\x65xpected_version\x18\x06 \x01(\x03\"1\n\x12UpdateBookResponse\x12\x1b\n\x04\x62ook\x18\x01 \x01(\x0b\x32\r.library.Book\"2\n\x13\x43reateMemberRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05\x65mail\x18\x02 \x01(\t\"7\n\x14\x43reateMemberResponse\x12\x1f\n\x06member\x18\x01 \x01(\x0b\x32\x0f.library.Member\"J\n\x19\x42\x61tchCreateMembersRequest\x12-\n\x07members\x18\x01 \x03(\x0b\x32\x1c.library.CreateMemberRequest\"p\n\x17\x42\x61tchCreateMemberResult\x12!\n\x06member\x18\x01 \x01(\x0b\x32\x0f.library.MemberH\x00\x12(\n\x05\x65rror\x18\x02 \x01(\x0b\x32\x17.library.BatchItemErrorH\x00\x42\x08\n\x06result\"O\n\x1a\x42\x61tchCreateMembersResponse\x12\x31\n\x07results\x18\x01 \x03(\x0b\x32 .library.BatchCreateMemberResult\"7\n\x11\x42orrowBookRequest\x12\x0f\n\x07\x62ook_id\x18\x01 \x01(\t\x12\x11\n\tmember_id\x18\x02 \x01(\t\"B\n\x12\x42orrowBookResponse\x12,\n\rborrow_record\x18\x01 \x01(\x0b\x32\x15.library.BorrowRecord\"-\n\x11ReturnBookRequest\x12\x18\n\x10\x62orrow_record_id\x18\x01 \x01(\t\"B\n\x12ReturnBookResponse\x12,\n\rborrow_record\x18\x01 \x01(\x0b\x32\x15.library.BorrowRecord\">\n\x15ListBorrowingsRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\"`\n\x16ListBorrowingsResponse\x12-\n\nborrowings\x18\x01 \x03(\x0b\x32\x19.library.BorrowingDetails\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\"-\n\x17StreamBorrowingsRequest\x12\x12\n\nbatch_size\x18\x01 \x01(\x05\"I\n\x18StreamBorrowingsResponse\x12-\n\nborrowings\x18\x01 \x03(\x0b\x32\x19.library.BorrowingDetails\"c\n\x11\x45xportDataRequest\x12\'\n\x07\x64\x61taset\x18\x01 \x01(\x0e\x32\x16.library.ExportDataset\x12%\n\x06\x66ormat\x18\x02 \x01(\x0e\x32\x15.library.ExportFormat\"\x1f\n\x0f\x45xportDataChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\")\n\x11WatchBooksRequest\x12\x14\n\x0cresume_token\x18\x01 \x01(\t\"X\n\nBookChange\x12!\n\x04type\x18\x01 \x01(\x0e\x32\x13.library.ChangeType\x12\n\n\x02id\x18\x02 \x01(\t\x12\x1b\n\x04\x62ook\x18\x03 \x01(\x0b\x32\r.library.Book\"P\n\x12WatchBooksResponse\x12$\n\x07\x63hanges\x18\x01 \x03(\x0b\x32\x13.library.BookChange\x12\x14\n\x0cresume_token\x18\x02 \x01(\t\".\n\x16WatchBorrowingsRequest\x12\x14\n\x0cresume_token\x18\x01 \x01(\t\"n\n\x0f\x42orrowingChange\x12!\n\x04type\x18\x01 \x01(\x0e\x32\x13.library.ChangeType\x12\n\n\x02id\x18\x02 \x01(\t\x12,\n\rborrow_record\x18\x03 \x01(\x0b\x32\x15.library.BorrowRecord\"Z\n\x17WatchBorrowingsResponse\x12)\n\x07\x63hanges\x18\x01 \x03(\x0b\x32\x18.library.BorrowingChange\x12\x14\n\x0cresume_token\x18\x02 \x01(\t\"v\n\x17ListChangesSinceRequest\x12#\n\x06\x65ntity\x18\x01 \x01(\x0e\x32\x13.library.SyncEntity\x12\x0f\n\x07version\x18\x02 \x01(\x03\x12\x11\n\tpage_size\x18\x03 \x01(\x05\x12\x12\n\npage_token\x18\x04 \x01(\t\"\xc8\x01\n\x18ListChangesSinceResponse\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\x12 \n\x07members\x18\x02 \x03(\x0b\x32\x0f.library.Member\x12-\n\x0e\x62orrow_records\x18\x03 \x03(\x0b\x32\x15.library.BorrowRecord\x12\x13\n\x0b\x64\x65leted_ids\x18\x04 \x03(\t\x12\x0f\n\x07version\x18\x05 \x01(\x03\x12\x17\n\x0fnext_page_token\x18\x06 \x01(\t*:\n\x0f\x42orrowingStatus\x12\x0b\n\x07UNKNOWN\x10\x00\x12\x0c\n\x08\x42ORROWED\x10\x01\x12\x0c\n\x08RETURNED\x10\x02*l\n\rExportDataset\x12\x1e\n\x1a\x45XPORT_DATASET_UNSPECIFIED\x10\x00\x12\x10\n\x0c\x45XPORT_BOOKS\x10\x01\x12\x12\n\x0e\x45XPORT_MEMBERS\x10\x02\x12\x15\n\x11\x45XPORT_BORROWINGS\x10\x03*1\n\x0c\x45xportFormat\x12\x0e\n\nEXPORT_CSV\x10\x00\x12\x11\n\rEXPORT_NDJSON\x10\x01*~\n\nChangeType\x12\x1b\n\x17\x43HANGE_TYPE_UNSPECIFIED\x10\x00\x12\x12\n\x0e\x43HANGE_CREATED\x10\x01\x12\x12\n\x0e\x43HANGE_UPDATED\x10\x02\x12\x12\n\x0e\x43HANGE_DELETED\x10\x03\x12\x17\n\x13\x43HANGE_AVAILABILITY\x10\x04*`\n\nSyncEntity\x12\x1b\n\x17SYNC_ENTITY_UNSPECIFIED\x10\x00\x12\x0e\n\nSYNC_BOOKS\x10\x01\x12\x10\n\x0cSYNC_MEMBERS\x10\x02\x12\x13\n\x0fSYNC_BORROWINGS\x10\x03\x32\xb0\x11\n\x0eLibraryService\x12G\n\nCreateBook\x12\x1a.library.CreateBookRequest\x1a\x1b.library.CreateBookResponse\"\x00\x12G\n\nUpdateBook\x12\x1a.library.UpdateBookRequest\x1a\x1b.library.UpdateBookResponse\"\x00\x12\x42\n\nDeleteBook\x12\x1a.library.DeleteBookRequest\x1a\x16.google.protobuf.Empty\"\x00\x12\x33\n\x07GetBook\x12\x17.library.GetBookRequest\x1a\r.library.Book\"\x00\x12P\n\rBatchGetBooks\x12\x1d.library.BatchGetBooksRequest\x1a\x1e.library.BatchGetBooksResponse\"\x00\x12\x44\n\tListBooks\x12\x19.library.ListBooksRequest\x1a\x1a.library.ListBooksResponse\"\x00\x12_\n\x12ListAvailableBooks\x12\".library.ListAvailableBooksRequest\x1a#.library.ListAvailableBooksResponse\"\x00\x12J\n\x0bSearchBooks\x12\x1b.library.SearchBooksRequest\x1a\x1c.library.SearchBooksResponse\"\x00\x12M\n\x0cSuggestBooks\x12\x1c.library.SuggestBooksRequest\x1a\x1d.library.SuggestBooksResponse\"\x00\x12Y\n\x10\x42\x61tchCreateBooks\x12 .library.BatchCreateBooksRequest\x1a!.library.BatchCreateBooksResponse\"\x00\x12L\n\x0bStreamBooks\x12\x1b.library.StreamBooksRequest\x1a\x1c.library.StreamBooksResponse\"\x00\x30\x01\x12M\n\x0c\x43reateMember\x12\x1c.library.CreateMemberRequest\x1a\x1d.library.CreateMemberResponse\"\x00\x12M\n\x0cUpdateMember\x12\x1c.library.UpdateMemberRequest\x1a\x1d.library.UpdateMemberResponse\"\x00\x12\x46\n\x0c\x44\x65leteMember\x12\x1c.library.DeleteMemberRequest\x1a\x16.google.protobuf.Empty\"\x00\x12\x39\n\tGetMember\x12\x19.library.GetMemberRequest\x1a\x0f.library.Member\"\x00\x12V\n\x0f\x42\x61tchGetMembers\x12\x1f.library.BatchGetMembersRequest\x1a .library.BatchGetMembersResponse\"\x00\x12J\n\x0bListMembers\x12\x1b.library.ListMembersRequest\x1a\x1c.library.ListMembersResponse\"\x00\x12P\n\rSearchMembers\x12\x1d.library.SearchMembersRequest\x1a\x1e.library.SearchMembersResponse\"\x00\x12_\n\x12\x42\x61tchCreateMembers\x12\".library.BatchCreateMembersRequest\x1a#.library.BatchCreateMembersResponse\"\x00\x12R\n\rStreamMembers\x12\x1d.library.StreamMembersRequest\x1a\x1e.library.StreamMembersResponse\"\x00\x30\x01\x12G\n\nBorrowBook\x12\x1a.library.BorrowBookRequest\x1a\x1b.library.BorrowBookResponse\"\x00\x12G\n\nReturnBook\x12\x1a.library.ReturnBookRequest\x1a\x1b.library.ReturnBookResponse\"\x00\x12S\n\x0eListBorrowings\x12\x1e.library.ListBorrowingsRequest\x1a\x1f.library.ListBorrowingsResponse\"\x00\x12[\n\x10StreamBorrowings\x12 .library.StreamBorrowingsRequest\x1a!.library.StreamBorrowingsResponse\"\x00\x30\x01\x12\x46\n\nExportData\x12\x1a.library.ExportDataRequest\x1a\x18.library.ExportDataChunk\"\x00\x30\x01\x12I\n\nWatchBooks\x12\x1a.library.WatchBooksRequest\x1a\x1b.library.WatchBooksResponse\"\x00\x30\x01\x12X\n\x0fWatchBorrowings\x12\x1f.library.WatchBorrowingsRequest\x1a .library.WatchBorrowingsResponse\"\x00\x30\x01\x12Y\n\x10ListChangesSince\x12 .library.ListChangesSinceRequest\x1a!.library.ListChangesSinceResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'library_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_BORROWINGSTATUS']._serialized_start=1805
-  _globals['_BORROWINGSTATUS']._serialized_end=1863
+  _globals['_BORROWINGSTATUS']._serialized_start=5001
+  _globals['_BORROWINGSTATUS']._serialized_end=5059
+  _globals['_EXPORTDATASET']._serialized_start=5061
+  _globals['_EXPORTDATASET']._serialized_end=5169
+  _globals['_EXPORTFORMAT']._serialized_start=5171
+  _globals['_EXPORTFORMAT']._serialized_end=5220
+  _globals['_CHANGETYPE']._serialized_start=5222
+  _globals['_CHANGETYPE']._serialized_end=5348
+  _globals['_SYNCENTITY']._serialized_start=5350
+  _globals['_SYNCENTITY']._serialized_end=5446
   _globals['_BOOK']._serialized_start=88
-  _globals['_BOOK']._serialized_end=197
-  _globals['_MEMBER']._serialized_start=199
-  _globals['_MEMBER']._serialized_end=267
-  _globals['_BORROWRECORD']._serialized_start=270
-  _globals['_BORROWRECORD']._serialized_end=444
-  _globals['_BORROWINGDETAILS']._serialized_start=446
-  _globals['_BORROWINGDETAILS']._serialized_end=572
-  _globals['_DELETEBOOKREQUEST']._serialized_start=574
-  _globals['_DELETEBOOKREQUEST']._serialized_end=605
-  _globals['_GETBOOKREQUEST']._serialized_start=607
-  _globals['_GETBOOKREQUEST']._serialized_end=635
-  _globals['_LISTBOOKSREQUEST']._serialized_start=637
-  _globals['_LISTBOOKSREQUEST']._serialized_end=655
-  _globals['_LISTBOOKSRESPONSE']._serialized_start=657
-  _globals['_LISTBOOKSRESPONSE']._serialized_end=706
-  _globals['_LISTAVAILABLEBOOKSREQUEST']._serialized_start=708
-  _globals['_LISTAVAILABLEBOOKSREQUEST']._serialized_end=735
-  _globals['_LISTAVAILABLEBOOKSRESPONSE']._serialized_start=737
-  _globals['_LISTAVAILABLEBOOKSRESPONSE']._serialized_end=795
-  _globals['_UPDATEMEMBERREQUEST']._serialized_start=797
-  _globals['_UPDATEMEMBERREQUEST']._serialized_end=859
-  _globals['_UPDATEMEMBERRESPONSE']._serialized_start=861
-  _globals['_UPDATEMEMBERRESPONSE']._serialized_end=916
-  _globals['_DELETEMEMBERREQUEST']._serialized_start=918
-  _globals['_DELETEMEMBERREQUEST']._serialized_end=951
-  _globals['_GETMEMBERREQUEST']._serialized_start=953
-  _globals['_GETMEMBERREQUEST']._serialized_end=983
-  _globals['_LISTMEMBERSREQUEST']._serialized_start=985
-  _globals['_LISTMEMBERSREQUEST']._serialized_end=1005
-  _globals['_LISTMEMBERSRESPONSE']._serialized_start=1007
-  _globals['_LISTMEMBERSRESPONSE']._serialized_end=1062
-  _globals['_CREATEBOOKREQUEST']._serialized_start=1064
-  _globals['_CREATEBOOKREQUEST']._serialized_end=1152
-  _globals['_CREATEBOOKRESPONSE']._serialized_start=1154
-  _globals['_CREATEBOOKRESPONSE']._serialized_end=1203
-  _globals['_UPDATEBOOKREQUEST']._serialized_start=1205
-  _globals['_UPDATEBOOKREQUEST']._serialized_end=1305
-  _globals['_UPDATEBOOKRESPONSE']._serialized_start=1307
-  _globals['_UPDATEBOOKRESPONSE']._serialized_end=1356
-  _globals['_CREATEMEMBERREQUEST']._serialized_start=1358
-  _globals['_CREATEMEMBERREQUEST']._serialized_end=1408
-  _globals['_CREATEMEMBERRESPONSE']._serialized_start=1410
-  _globals['_CREATEMEMBERRESPONSE']._serialized_end=1465
-  _globals['_BORROWBOOKREQUEST']._serialized_start=1467
-  _globals['_BORROWBOOKREQUEST']._serialized_end=1522
-  _globals['_BORROWBOOKRESPONSE']._serialized_start=1524
-  _globals['_BORROWBOOKRESPONSE']._serialized_end=1590
-  _globals['_RETURNBOOKREQUEST']._serialized_start=1592
-  _globals['_RETURNBOOKREQUEST']._serialized_end=1637
-  _globals['_RETURNBOOKRESPONSE']._serialized_start=1639
-  _globals['_RETURNBOOKRESPONSE']._serialized_end=1705
-  _globals['_LISTBORROWINGSREQUEST']._serialized_start=1707
-  _globals['_LISTBORROWINGSREQUEST']._serialized_end=1730
-  _globals['_LISTBORROWINGSRESPONSE']._serialized_start=1732
-  _globals['_LISTBORROWINGSRESPONSE']._serialized_end=1803
-  _globals['_LIBRARYSERVICE']._serialized_start=1866
-  _globals['_LIBRARYSERVICE']._serialized_end=2912
+  _globals['_BOOK']._serialized_end=214
+  _globals['_MEMBER']._serialized_start=216
+  _globals['_MEMBER']._serialized_end=301
+  _globals['_BORROWRECORD']._serialized_start=304
+  _globals['_BORROWRECORD']._serialized_end=495
+  _globals['_BORROWINGDETAILS']._serialized_start=497
+  _globals['_BORROWINGDETAILS']._serialized_end=623
+  _globals['_DELETEBOOKREQUEST']._serialized_start=625
+  _globals['_DELETEBOOKREQUEST']._serialized_end=656
+  _globals['_GETBOOKREQUEST']._serialized_start=658
+  _globals['_GETBOOKREQUEST']._serialized_end=686
+  _globals['_BATCHGETBOOKSREQUEST']._serialized_start=688
+  _globals['_BATCHGETBOOKSREQUEST']._serialized_end=723
+  _globals['_BOOKLOOKUPRESULT']._serialized_start=725
+  _globals['_BOOKLOOKUPRESULT']._serialized_end=799
+  _globals['_BATCHGETBOOKSRESPONSE']._serialized_start=801
+  _globals['_BATCHGETBOOKSRESPONSE']._serialized_end=868
+  _globals['_LISTBOOKSREQUEST']._serialized_start=870
+  _globals['_LISTBOOKSREQUEST']._serialized_end=927
+  _globals['_LISTBOOKSRESPONSE']._serialized_start=929
+  _globals['_LISTBOOKSRESPONSE']._serialized_end=1003
+  _globals['_LISTAVAILABLEBOOKSREQUEST']._serialized_start=1005
+  _globals['_LISTAVAILABLEBOOKSREQUEST']._serialized_end=1071
+  _globals['_LISTAVAILABLEBOOKSRESPONSE']._serialized_start=1073
+  _globals['_LISTAVAILABLEBOOKSRESPONSE']._serialized_end=1156
+  _globals['_SEARCHBOOKSREQUEST']._serialized_start=1158
+  _globals['_SEARCHBOOKSREQUEST']._serialized_end=1232
+  _globals['_BOOKSEARCHHIT']._serialized_start=1234
+  _globals['_BOOKSEARCHHIT']._serialized_end=1293
+  _globals['_SEARCHBOOKSRESPONSE']._serialized_start=1295
+  _globals['_SEARCHBOOKSRESPONSE']._serialized_end=1379
+  _globals['_SUGGESTBOOKSREQUEST']._serialized_start=1381
+  _globals['_SUGGESTBOOKSREQUEST']._serialized_end=1432
+  _globals['_BOOKSUGGESTION']._serialized_start=1434
+  _globals['_BOOKSUGGESTION']._serialized_end=1493
+  _globals['_SUGGESTBOOKSRESPONSE']._serialized_start=1495
+  _globals['_SUGGESTBOOKSRESPONSE']._serialized_end=1563
+  _globals['_STREAMBOOKSREQUEST']._serialized_start=1565
+  _globals['_STREAMBOOKSREQUEST']._serialized_end=1605
+  _globals['_STREAMBOOKSRESPONSE']._serialized_start=1607
+  _globals['_STREAMBOOKSRESPONSE']._serialized_end=1658
+  _globals['_UPDATEMEMBERREQUEST']._serialized_start=1660
+  _globals['_UPDATEMEMBERREQUEST']._serialized_end=1748
+  _globals['_UPDATEMEMBERRESPONSE']._serialized_start=1750
+  _globals['_UPDATEMEMBERRESPONSE']._serialized_end=1805
+  _globals['_DELETEMEMBERREQUEST']._serialized_start=1807
+  _globals['_DELETEMEMBERREQUEST']._serialized_end=1840
+  _globals['_GETMEMBERREQUEST']._serialized_start=1842
+  _globals['_GETMEMBERREQUEST']._serialized_end=1872
+  _globals['_BATCHGETMEMBERSREQUEST']._serialized_start=1874
+  _globals['_BATCHGETMEMBERSREQUEST']._serialized_end=1911
+  _globals['_MEMBERLOOKUPRESULT']._serialized_start=1913
+  _globals['_MEMBERLOOKUPRESULT']._serialized_end=1993
+  _globals['_BATCHGETMEMBERSRESPONSE']._serialized_start=1995
+  _globals['_BATCHGETMEMBERSRESPONSE']._serialized_end=2066
+  _globals['_LISTMEMBERSREQUEST']._serialized_start=2068
+  _globals['_LISTMEMBERSREQUEST']._serialized_end=2127
+  _globals['_LISTMEMBERSRESPONSE']._serialized_start=2129
+  _globals['_LISTMEMBERSRESPONSE']._serialized_end=2209
+  _globals['_SEARCHMEMBERSREQUEST']._serialized_start=2211
+  _globals['_SEARCHMEMBERSREQUEST']._serialized_end=2287
+  _globals['_MEMBERSEARCHHIT']._serialized_start=2289
+  _globals['_MEMBERSEARCHHIT']._serialized_end=2354
+  _globals['_SEARCHMEMBERSRESPONSE']._serialized_start=2356
+  _globals['_SEARCHMEMBERSRESPONSE']._serialized_end=2444
+  _globals['_STREAMMEMBERSREQUEST']._serialized_start=2446
+  _globals['_STREAMMEMBERSREQUEST']._serialized_end=2488
+  _globals['_STREAMMEMBERSRESPONSE']._serialized_start=2490
+  _globals['_STREAMMEMBERSRESPONSE']._serialized_end=2547
+  _globals['_CREATEBOOKREQUEST']._serialized_start=2549
+  _globals['_CREATEBOOKREQUEST']._serialized_end=2637
+  _globals['_CREATEBOOKRESPONSE']._serialized_start=2639
+  _globals['_CREATEBOOKRESPONSE']._serialized_end=2688
+  _globals['_BATCHITEMERROR']._serialized_start=2690
+  _globals['_BATCHITEMERROR']._serialized_end=2737
+  _globals['_BATCHCREATEBOOKSREQUEST']._serialized_start=2739
+  _globals['_BATCHCREATEBOOKSREQUEST']._serialized_end=2807
+  _globals['_BATCHCREATEBOOKRESULT']._serialized_start=2809
+  _globals['_BATCHCREATEBOOKRESULT']._serialized_end=2915
+  _globals['_BATCHCREATEBOOKSRESPONSE']._serialized_start=2917
+  _globals['_BATCHCREATEBOOKSRESPONSE']._serialized_end=2992
+  _globals['_UPDATEBOOKREQUEST']._serialized_start=2994
+  _globals['_UPDATEBOOKREQUEST']._serialized_end=3120
+  _globals['_UPDATEBOOKRESPONSE']._serialized_start=3122
+  _globals['_UPDATEBOOKRESPONSE']._serialized_end=3171
+  _globals['_CREATEMEMBERREQUEST']._serialized_start=3173
+  _globals['_CREATEMEMBERREQUEST']._serialized_end=3223
+  _globals['_CREATEMEMBERRESPONSE']._serialized_start=3225
+  _globals['_CREATEMEMBERRESPONSE']._serialized_end=3280
+  _globals['_BATCHCREATEMEMBERSREQUEST']._serialized_start=3282
+  _globals['_BATCHCREATEMEMBERSREQUEST']._serialized_end=3356
+  _globals['_BATCHCREATEMEMBERRESULT']._serialized_start=3358
+  _globals['_BATCHCREATEMEMBERRESULT']._serialized_end=3470
+  _globals['_BATCHCREATEMEMBERSRESPONSE']._serialized_start=3472
+  _globals['_BATCHCREATEMEMBERSRESPONSE']._serialized_end=3551
+  _globals['_BORROWBOOKREQUEST']._serialized_start=3553
+  _globals['_BORROWBOOKREQUEST']._serialized_end=3608
+  _globals['_BORROWBOOKRESPONSE']._serialized_start=3610
+  _globals['_BORROWBOOKRESPONSE']._serialized_end=3676
+  _globals['_RETURNBOOKREQUEST']._serialized_start=3678
+  _globals['_RETURNBOOKREQUEST']._serialized_end=3723
+  _globals['_RETURNBOOKRESPONSE']._serialized_start=3725
+  _globals['_RETURNBOOKRESPONSE']._serialized_end=3791
+  _globals['_LISTBORROWINGSREQUEST']._serialized_start=3793
+  _globals['_LISTBORROWINGSREQUEST']._serialized_end=3855
+  _globals['_LISTBORROWINGSRESPONSE']._serialized_start=3857
+  _globals['_LISTBORROWINGSRESPONSE']._serialized_end=3953
+  _globals['_STREAMBORROWINGSREQUEST']._serialized_start=3955
+  _globals['_STREAMBORROWINGSREQUEST']._serialized_end=4000
+  _globals['_STREAMBORROWINGSRESPONSE']._serialized_start=4002
+  _globals['_STREAMBORROWINGSRESPONSE']._serialized_end=4075
+  _globals['_EXPORTDATAREQUEST']._serialized_start=4077
+  _globals['_EXPORTDATAREQUEST']._serialized_end=4176
+  _globals['_EXPORTDATACHUNK']._serialized_start=4178
+  _globals['_EXPORTDATACHUNK']._serialized_end=4209
+  _globals['_WATCHBOOKSREQUEST']._serialized_start=4211
+  _globals['_WATCHBOOKSREQUEST']._serialized_end=4252
+  _globals['_BOOKCHANGE']._serialized_start=4254
+  _globals['_BOOKCHANGE']._serialized_end=4342
+  _globals['_WATCHBOOKSRESPONSE']._serialized_start=4344
+  _globals['_WATCHBOOKSRESPONSE']._serialized_end=4424
+  _globals['_WATCHBORROWINGSREQUEST']._serialized_start=4426
+  _globals['_WATCHBORROWINGSREQUEST']._serialized_end=4472
+  _globals['_BORROWINGCHANGE']._serialized_start=4474
+  _globals['_BORROWINGCHANGE']._serialized_end=4584
+  _globals['_WATCHBORROWINGSRESPONSE']._serialized_start=4586
+  _globals['_WATCHBORROWINGSRESPONSE']._serialized_end=4676
+  _globals['_LISTCHANGESSINCEREQUEST']._serialized_start=4678
+  _globals['_LISTCHANGESSINCEREQUEST']._serialized_end=4796
+  _globals['_LISTCHANGESSINCERESPONSE']._serialized_start=4799
+  _globals['_LISTCHANGESSINCERESPONSE']._serialized_end=4999
+  _globals['_LIBRARYSERVICE']._serialized_start=5449
+  _globals['_LIBRARYSERVICE']._serialized_end=7673
 # @@protoc_insertion_point(module_scope)
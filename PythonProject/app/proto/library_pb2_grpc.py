@@ -56,6 +56,11 @@ class LibraryServiceStub(object):
                 request_serializer=library__pb2.GetBookRequest.SerializeToString,
                 response_deserializer=library__pb2.Book.FromString,
                 _registered_method=True)
+        self.BatchGetBooks = channel.unary_unary(
+                '/library.LibraryService/BatchGetBooks',
+                request_serializer=library__pb2.BatchGetBooksRequest.SerializeToString,
+                response_deserializer=library__pb2.BatchGetBooksResponse.FromString,
+                _registered_method=True)
         self.ListBooks = channel.unary_unary(
                 '/library.LibraryService/ListBooks',
                 request_serializer=library__pb2.ListBooksRequest.SerializeToString,
@@ -66,6 +71,26 @@ class LibraryServiceStub(object):
                 request_serializer=library__pb2.ListAvailableBooksRequest.SerializeToString,
                 response_deserializer=library__pb2.ListAvailableBooksResponse.FromString,
                 _registered_method=True)
+        self.SearchBooks = channel.unary_unary(
+                '/library.LibraryService/SearchBooks',
+                request_serializer=library__pb2.SearchBooksRequest.SerializeToString,
+                response_deserializer=library__pb2.SearchBooksResponse.FromString,
+                _registered_method=True)
+        self.SuggestBooks = channel.unary_unary(
+                '/library.LibraryService/SuggestBooks',
+                request_serializer=library__pb2.SuggestBooksRequest.SerializeToString,
+                response_deserializer=library__pb2.SuggestBooksResponse.FromString,
+                _registered_method=True)
+        self.BatchCreateBooks = channel.unary_unary(
+                '/library.LibraryService/BatchCreateBooks',
+                request_serializer=library__pb2.BatchCreateBooksRequest.SerializeToString,
+                response_deserializer=library__pb2.BatchCreateBooksResponse.FromString,
+                _registered_method=True)
+        self.StreamBooks = channel.unary_stream(
+                '/library.LibraryService/StreamBooks',
+                request_serializer=library__pb2.StreamBooksRequest.SerializeToString,
+                response_deserializer=library__pb2.StreamBooksResponse.FromString,
+                _registered_method=True)
         self.CreateMember = channel.unary_unary(
                 '/library.LibraryService/CreateMember',
                 request_serializer=library__pb2.CreateMemberRequest.SerializeToString,
@@ -86,11 +111,31 @@ class LibraryServiceStub(object):
                 request_serializer=library__pb2.GetMemberRequest.SerializeToString,
                 response_deserializer=library__pb2.Member.FromString,
                 _registered_method=True)
+        self.BatchGetMembers = channel.unary_unary(
+                '/library.LibraryService/BatchGetMembers',
+                request_serializer=library__pb2.BatchGetMembersRequest.SerializeToString,
+                response_deserializer=library__pb2.BatchGetMembersResponse.FromString,
+                _registered_method=True)
         self.ListMembers = channel.unary_unary(
                 '/library.LibraryService/ListMembers',
                 request_serializer=library__pb2.ListMembersRequest.SerializeToString,
                 response_deserializer=library__pb2.ListMembersResponse.FromString,
                 _registered_method=True)
+        self.SearchMembers = channel.unary_unary(
+                '/library.LibraryService/SearchMembers',
+                request_serializer=library__pb2.SearchMembersRequest.SerializeToString,
+                response_deserializer=library__pb2.SearchMembersResponse.FromString,
+                _registered_method=True)
+        self.BatchCreateMembers = channel.unary_unary(
+                '/library.LibraryService/BatchCreateMembers',
+                request_serializer=library__pb2.BatchCreateMembersRequest.SerializeToString,
+                response_deserializer=library__pb2.BatchCreateMembersResponse.FromString,
+                _registered_method=True)
+        self.StreamMembers = channel.unary_stream(
+                '/library.LibraryService/StreamMembers',
+                request_serializer=library__pb2.StreamMembersRequest.SerializeToString,
+                response_deserializer=library__pb2.StreamMembersResponse.FromString,
+                _registered_method=True)
         self.BorrowBook = channel.unary_unary(
                 '/library.LibraryService/BorrowBook',
                 request_serializer=library__pb2.BorrowBookRequest.SerializeToString,
@@ -106,6 +151,31 @@ class LibraryServiceStub(object):
                 request_serializer=library__pb2.ListBorrowingsRequest.SerializeToString,
                 response_deserializer=library__pb2.ListBorrowingsResponse.FromString,
                 _registered_method=True)
+        self.StreamBorrowings = channel.unary_stream(
+                '/library.LibraryService/StreamBorrowings',
+                request_serializer=library__pb2.StreamBorrowingsRequest.SerializeToString,
+                response_deserializer=library__pb2.StreamBorrowingsResponse.FromString,
+                _registered_method=True)
+        self.ExportData = channel.unary_stream(
+                '/library.LibraryService/ExportData',
+                request_serializer=library__pb2.ExportDataRequest.SerializeToString,
+                response_deserializer=library__pb2.ExportDataChunk.FromString,
+                _registered_method=True)
+        self.WatchBooks = channel.unary_stream(
+                '/library.LibraryService/WatchBooks',
+                request_serializer=library__pb2.WatchBooksRequest.SerializeToString,
+                response_deserializer=library__pb2.WatchBooksResponse.FromString,
+                _registered_method=True)
+        self.WatchBorrowings = channel.unary_stream(
+                '/library.LibraryService/WatchBorrowings',
+                request_serializer=library__pb2.WatchBorrowingsRequest.SerializeToString,
+                response_deserializer=library__pb2.WatchBorrowingsResponse.FromString,
+                _registered_method=True)
+        self.ListChangesSince = channel.unary_unary(
+                '/library.LibraryService/ListChangesSince',
+                request_serializer=library__pb2.ListChangesSinceRequest.SerializeToString,
+                response_deserializer=library__pb2.ListChangesSinceResponse.FromString,
+                _registered_method=True)
 
 
 class LibraryServiceServicer(object):
@@ -137,6 +207,13 @@ class LibraryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchGetBooks(self, request, context):
+        """Looks up many books with one query. Results are in request order; missing ids have found = false.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ListBooks(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -149,6 +226,35 @@ class LibraryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SearchBooks(self, request, context):
+        """Full-text search over title and author, best matches first.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SuggestBooks(self, request, context):
+        """Type-ahead suggestions for a partially typed title, author or ISBN, served from memory.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchCreateBooks(self, request, context):
+        """Creates many books in one transaction. Invalid or duplicate items are reported per item
+        without aborting the rest of the batch.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamBooks(self, request, context):
+        """Streams all books in fixed-size chunks instead of one large response.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def CreateMember(self, request, context):
         """Members
         """
@@ -174,12 +280,41 @@ class LibraryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchGetMembers(self, request, context):
+        """Looks up many members with one query. Results are in request order; missing ids have found = false.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ListMembers(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SearchMembers(self, request, context):
+        """Prefix and typo-tolerant search over name and email, best matches first.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchCreateMembers(self, request, context):
+        """Creates many members in one transaction. Invalid or duplicate items are reported per item
+        without aborting the rest of the batch.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamMembers(self, request, context):
+        """Streams all members in fixed-size chunks instead of one large response.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def BorrowBook(self, request, context):
         """Borrowing
         """
@@ -200,6 +335,48 @@ class LibraryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamBorrowings(self, request, context):
+        """Streams all borrowings with details in fixed-size chunks instead of one large response.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ExportData(self, request, context):
+        """Export
+        Streams a whole dataset as CSV or NDJSON bytes, straight from Postgres COPY.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchBooks(self, request, context):
+        """Changes
+        Streams changes to books as they commit, starting with a response that only carries a
+        resume_token. Pass the last resume_token received to a new call to continue after a
+        disconnect without reloading.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchBorrowings(self, request, context):
+        """Streams changes to borrow records (borrows and returns) like WatchBooks.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListChangesSince(self, request, context):
+        """Sync
+        Lists the books, members or borrow records written since a version, and the ids of those
+        deleted since, for clients that keep a local copy. Start with version 0, page through the
+        response with page_token and keep the version of the last page for the next sync.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_LibraryServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -223,6 +400,11 @@ def add_LibraryServiceServicer_to_server(servicer, server):
                     request_deserializer=library__pb2.GetBookRequest.FromString,
                     response_serializer=library__pb2.Book.SerializeToString,
             ),
+            'BatchGetBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetBooks,
+                    request_deserializer=library__pb2.BatchGetBooksRequest.FromString,
+                    response_serializer=library__pb2.BatchGetBooksResponse.SerializeToString,
+            ),
             'ListBooks': grpc.unary_unary_rpc_method_handler(
                     servicer.ListBooks,
                     request_deserializer=library__pb2.ListBooksRequest.FromString,
@@ -233,6 +415,26 @@ def add_LibraryServiceServicer_to_server(servicer, server):
                     request_deserializer=library__pb2.ListAvailableBooksRequest.FromString,
                     response_serializer=library__pb2.ListAvailableBooksResponse.SerializeToString,
             ),
+            'SearchBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchBooks,
+                    request_deserializer=library__pb2.SearchBooksRequest.FromString,
+                    response_serializer=library__pb2.SearchBooksResponse.SerializeToString,
+            ),
+            'SuggestBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.SuggestBooks,
+                    request_deserializer=library__pb2.SuggestBooksRequest.FromString,
+                    response_serializer=library__pb2.SuggestBooksResponse.SerializeToString,
+            ),
+            'BatchCreateBooks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchCreateBooks,
+                    request_deserializer=library__pb2.BatchCreateBooksRequest.FromString,
+                    response_serializer=library__pb2.BatchCreateBooksResponse.SerializeToString,
+            ),
+            'StreamBooks': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamBooks,
+                    request_deserializer=library__pb2.StreamBooksRequest.FromString,
+                    response_serializer=library__pb2.StreamBooksResponse.SerializeToString,
+            ),
             'CreateMember': grpc.unary_unary_rpc_method_handler(
                     servicer.CreateMember,
                     request_deserializer=library__pb2.CreateMemberRequest.FromString,
@@ -253,11 +455,31 @@ def add_LibraryServiceServicer_to_server(servicer, server):
                     request_deserializer=library__pb2.GetMemberRequest.FromString,
                     response_serializer=library__pb2.Member.SerializeToString,
             ),
+            'BatchGetMembers': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetMembers,
+                    request_deserializer=library__pb2.BatchGetMembersRequest.FromString,
+                    response_serializer=library__pb2.BatchGetMembersResponse.SerializeToString,
+            ),
             'ListMembers': grpc.unary_unary_rpc_method_handler(
                     servicer.ListMembers,
                     request_deserializer=library__pb2.ListMembersRequest.FromString,
                     response_serializer=library__pb2.ListMembersResponse.SerializeToString,
             ),
+            'SearchMembers': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchMembers,
+                    request_deserializer=library__pb2.SearchMembersRequest.FromString,
+                    response_serializer=library__pb2.SearchMembersResponse.SerializeToString,
+            ),
+            'BatchCreateMembers': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchCreateMembers,
+                    request_deserializer=library__pb2.BatchCreateMembersRequest.FromString,
+                    response_serializer=library__pb2.BatchCreateMembersResponse.SerializeToString,
+            ),
+            'StreamMembers': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamMembers,
+                    request_deserializer=library__pb2.StreamMembersRequest.FromString,
+                    response_serializer=library__pb2.StreamMembersResponse.SerializeToString,
+            ),
             'BorrowBook': grpc.unary_unary_rpc_method_handler(
                     servicer.BorrowBook,
                     request_deserializer=library__pb2.BorrowBookRequest.FromString,
@@ -273,6 +495,31 @@ def add_LibraryServiceServicer_to_server(servicer, server):
                     request_deserializer=library__pb2.ListBorrowingsRequest.FromString,
                     response_serializer=library__pb2.ListBorrowingsResponse.SerializeToString,
             ),
+            'StreamBorrowings': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamBorrowings,
+                    request_deserializer=library__pb2.StreamBorrowingsRequest.FromString,
+                    response_serializer=library__pb2.StreamBorrowingsResponse.SerializeToString,
+            ),
+            'ExportData': grpc.unary_stream_rpc_method_handler(
+                    servicer.ExportData,
+                    request_deserializer=library__pb2.ExportDataRequest.FromString,
+                    response_serializer=library__pb2.ExportDataChunk.SerializeToString,
+            ),
+            'WatchBooks': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchBooks,
+                    request_deserializer=library__pb2.WatchBooksRequest.FromString,
+                    response_serializer=library__pb2.WatchBooksResponse.SerializeToString,
+            ),
+            'WatchBorrowings': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchBorrowings,
+                    request_deserializer=library__pb2.WatchBorrowingsRequest.FromString,
+                    response_serializer=library__pb2.WatchBorrowingsResponse.SerializeToString,
+            ),
+            'ListChangesSince': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListChangesSince,
+                    request_deserializer=library__pb2.ListChangesSinceRequest.FromString,
+                    response_serializer=library__pb2.ListChangesSinceResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'library.LibraryService', rpc_method_handlers)
@@ -393,6 +640,33 @@ class LibraryService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def BatchGetBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/BatchGetBooks',
+            library__pb2.BatchGetBooksRequest.SerializeToString,
+            library__pb2.BatchGetBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ListBooks(request,
             target,
@@ -447,6 +721,114 @@ class LibraryService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def SearchBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/SearchBooks',
+            library__pb2.SearchBooksRequest.SerializeToString,
+            library__pb2.SearchBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SuggestBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/SuggestBooks',
+            library__pb2.SuggestBooksRequest.SerializeToString,
+            library__pb2.SuggestBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchCreateBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/BatchCreateBooks',
+            library__pb2.BatchCreateBooksRequest.SerializeToString,
+            library__pb2.BatchCreateBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/library.LibraryService/StreamBooks',
+            library__pb2.StreamBooksRequest.SerializeToString,
+            library__pb2.StreamBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def CreateMember(request,
             target,
@@ -555,6 +937,33 @@ class LibraryService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def BatchGetMembers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/BatchGetMembers',
+            library__pb2.BatchGetMembersRequest.SerializeToString,
+            library__pb2.BatchGetMembersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ListMembers(request,
             target,
@@ -582,6 +991,87 @@ class LibraryService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def SearchMembers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/SearchMembers',
+            library__pb2.SearchMembersRequest.SerializeToString,
+            library__pb2.SearchMembersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchCreateMembers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/BatchCreateMembers',
+            library__pb2.BatchCreateMembersRequest.SerializeToString,
+            library__pb2.BatchCreateMembersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamMembers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/library.LibraryService/StreamMembers',
+            library__pb2.StreamMembersRequest.SerializeToString,
+            library__pb2.StreamMembersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def BorrowBook(request,
             target,
@@ -662,3 +1152,138 @@ class LibraryService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StreamBorrowings(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/library.LibraryService/StreamBorrowings',
+            library__pb2.StreamBorrowingsRequest.SerializeToString,
+            library__pb2.StreamBorrowingsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ExportData(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/library.LibraryService/ExportData',
+            library__pb2.ExportDataRequest.SerializeToString,
+            library__pb2.ExportDataChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchBooks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/library.LibraryService/WatchBooks',
+            library__pb2.WatchBooksRequest.SerializeToString,
+            library__pb2.WatchBooksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchBorrowings(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/library.LibraryService/WatchBorrowings',
+            library__pb2.WatchBorrowingsRequest.SerializeToString,
+            library__pb2.WatchBorrowingsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListChangesSince(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/library.LibraryService/ListChangesSince',
+            library__pb2.ListChangesSinceRequest.SerializeToString,
+            library__pb2.ListChangesSinceResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,326 @@
+from sqlalchemy import select, any_, cast, text, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from app.db.changes import BOOKS, MEMBERS, WATERMARK_SQL
+from app.db.replicas import ReplicaUnavailable, on_replica
+from app.db.models import Book, Member, BorrowRecord, BorrowingStatus, ChangeEvent, ChangeKind
+from app.repositories.library_repository import (
+    apply_keyset_page,
+    borrow_statement,
+    book_search_statement,
+    member_search_statement,
+    return_statement,
+    changes_since_statement,
+    update_statement,
+    tombstone_statement,
+    export_query,
+    EXPORT_COPY_OPTIONS,
+    BULK_INSERT_OPTIONS,
+)
+from app.repositories.entity_cache import book_cache, member_cache, invalidate_on_commit
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+from datetime import date
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLibraryRepository:
+    """
+    asyncio counterpart of LibraryRepository, used by the grpc.aio server. Like it, methods only
+    flush and get_async_db_session commits.
+    Relationships are always loaded eagerly because lazy loading would need implicit IO.
+    """
+
+    def __init__(self, db_session: AsyncSession, cached: bool = True):
+        self.db_session = db_session
+        self.cached = cached
+
+    async def _read_through(self, cache, entity_id: str, load):
+        # Same read-through as LibraryRepository._read_through; the cache itself is shared.
+        if not (cache.enabled and self.cached):
+            return await load(entity_id)
+        values = cache.get(entity_id)
+        if values is not None:
+            return await self.db_session.merge(cache.to_instance(values), load=False)
+        generation = cache.generation()
+        obj = await load(entity_id)
+        if obj is not None and not on_replica(self.db_session):
+            cache.put(entity_id, obj, generation)
+        return obj
+
+    async def _record_changes(self, topic: str, kind: ChangeKind, entity_ids: Sequence[str]) -> None:
+        # See LibraryRepository._record_changes.
+        if entity_ids:
+            await self.db_session.execute(
+                insert(ChangeEvent),
+                [{"topic": topic, "kind": kind, "entity_id": entity_id} for entity_id in entity_ids],
+                execution_options=BULK_INSERT_OPTIONS,
+            )
+
+    async def create_book(self, title: str, author: str, published_date: date, isbn: str) -> Book:
+        logger.info("Creating book with title: %s", title)
+        book = Book(title=title, author=author, published_date=published_date, isbn=isbn)
+        self.db_session.add(book)
+        await self.db_session.flush()
+        await self._record_changes(BOOKS, ChangeKind.CREATED, [book.id])
+        logger.info("Book with title '%s' created successfully with id %s", title, book.id)
+        return book
+
+    async def bulk_create_books(self, rows: List[dict]) -> List[Book]:
+        logger.info("Bulk creating %s books", len(rows))
+        # See LibraryRepository.bulk_create_books.
+        stmt = insert(Book).on_conflict_do_nothing(index_elements=[Book.isbn]).returning(Book)
+        books = (await self.db_session.scalars(stmt, rows, execution_options=BULK_INSERT_OPTIONS)).all()
+        await self._record_changes(BOOKS, ChangeKind.CREATED, [book.id for book in books])
+        logger.info("Bulk created %s of %s books.", len(books), len(rows))
+        return books
+
+    async def get_book_by_id(self, book_id: str) -> Optional[Book]:
+        logger.info("Getting book by id: %s", book_id)
+        book = await self._read_through(book_cache, book_id, self._query_book)
+        if book:
+            logger.info("Book with id '%s' found.", book_id)
+        else:
+            logger.info("Book with id '%s' not found.", book_id)
+        return book
+
+    async def _query_book(self, book_id: str, *options) -> Optional[Book]:
+        # Uncached lookup; writes always start from the row in the database.
+        result = await self.db_session.execute(select(Book).options(*options).filter(Book.id == book_id))
+        return result.scalars().first()
+
+    async def get_books_by_ids(self, ids: List[str]) -> List[Book]:
+        logger.info("Getting %s books by id", len(ids))
+        result = await self.db_session.execute(select(Book).filter(Book.id == any_(cast(ids, ARRAY(String)))))
+        books = result.scalars().all()
+        logger.info("Found %s of %s books.", len(books), len(ids))
+        return books
+
+    async def update_book(self, book_id: str, title: str, author: str, published_date: date, isbn: str, expected_version: int = 0) -> Tuple[Optional[Book], Optional[int]]:
+        logger.info("Updating book with id: %s (expected version %s)", book_id, expected_version)
+        invalidate_on_commit(self.db_session.sync_session, book_cache, book_id)
+        values = dict(title=title, author=author, published_date=published_date, isbn=isbn)
+        row = (await self.db_session.execute(update_statement(Book, book_id, expected_version, values, BOOKS))).one()
+        if row.entity:
+            logger.info("Book with id '%s' updated successfully.", book_id)
+        else:
+            logger.info("Book with id '%s' was not updated (version %s).", book_id, row.previous_version)
+        return row.entity, row.previous_version
+
+    async def delete_book(self, book_id: str) -> bool:
+        logger.info("Deleting book with id: %s", book_id)
+        # The session dereferences borrow_records on delete, so load them up front.
+        book = await self._query_book(book_id, selectinload(Book.borrow_records))
+        if book:
+            invalidate_on_commit(self.db_session.sync_session, book_cache, book_id)
+            await self.db_session.delete(book)
+            await self.db_session.flush()
+            await self.db_session.execute(tombstone_statement("books", book_id))
+            await self._record_changes(BOOKS, ChangeKind.DELETED, [book_id])
+            logger.info("Book with id '%s' deleted successfully.", book_id)
+            return True
+        logger.info("Book with id '%s' not found for deletion.", book_id)
+        return False
+
+    async def list_books(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Book]:
+        logger.info("Listing books after %s with limit %s", after, limit)
+        query = apply_keyset_page(select(Book), (Book.title, Book.id), limit, after)
+        books = (await self.db_session.execute(query)).scalars().all()
+        logger.info("Found %s books.", len(books))
+        return books
+
+    async def iter_books(self, batch_size: int) -> AsyncIterator[List[Book]]:
+        logger.info("Streaming books in batches of %s", batch_size)
+        result = await self.db_session.stream(select(Book).execution_options(yield_per=batch_size))
+        async for books in result.scalars().partitions():
+            yield books
+
+    async def copy_export(self, dataset: str, file_format: str, output) -> None:
+        """
+        Passes dataset to the coroutine function output chunk by chunk with COPY TO STDOUT.
+        """
+        logger.info("Exporting %s as %s with COPY", dataset, file_format)
+        # COPY goes through asyncpg itself, on the connection of this transaction.
+        connection = await (await self.db_session.connection()).get_raw_connection()
+        await connection.driver_connection.copy_from_query(
+            export_query(dataset, file_format), output=output, **EXPORT_COPY_OPTIONS[file_format]
+        )
+        logger.info("Exported %s.", dataset)
+
+    async def list_available_books(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Book]:
+        logger.info("Listing books currently available for borrowing after %s with limit %s", after, limit)
+        query = apply_keyset_page(select(Book).filter(Book.is_available), (Book.title, Book.id), limit, after)
+        available_books = (await self.db_session.execute(query)).scalars().all()
+        logger.info("Found %s books available for borrowing.", len(available_books))
+        return available_books
+
+    async def search_books(self, text_query: str, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Tuple[Book, float]]:
+        logger.info("Searching books for '%s' after %s with limit %s", text_query, after, limit)
+        hits = (await self.db_session.execute(book_search_statement(text_query, limit, after))).all()
+        logger.info("Found %s matching books.", len(hits))
+        return hits
+
+    async def list_all_members(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Member]:
+        logger.info("Listing members after %s with limit %s", after, limit)
+        query = apply_keyset_page(select(Member), (Member.name, Member.id), limit, after)
+        members = (await self.db_session.execute(query)).scalars().all()
+        logger.info("Found %s members.", len(members))
+        return members
+
+    async def iter_members(self, batch_size: int) -> AsyncIterator[List[Member]]:
+        logger.info("Streaming members in batches of %s", batch_size)
+        result = await self.db_session.stream(select(Member).execution_options(yield_per=batch_size))
+        async for members in result.scalars().partitions():
+            yield members
+
+    async def search_members(self, text_query: str, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Tuple[Member, float]]:
+        logger.info("Searching members for '%s' after %s with limit %s", text_query, after, limit)
+        hits = (await self.db_session.execute(member_search_statement(text_query, limit, after))).all()
+        logger.info("Found %s matching members.", len(hits))
+        return hits
+
+    async def create_member(self, name: str, email: str) -> Member:
+        logger.info("Creating member with name: %s", name)
+        member = Member(name=name, email=email)
+        self.db_session.add(member)
+        await self.db_session.flush()
+        logger.info("Member with name '%s' created successfully with id %s", name, member.id)
+        return member
+
+    async def bulk_create_members(self, rows: List[dict]) -> List[Member]:
+        logger.info("Bulk creating %s members", len(rows))
+        stmt = insert(Member).on_conflict_do_nothing(index_elements=[Member.email]).returning(Member)
+        members = (await self.db_session.scalars(stmt, rows, execution_options=BULK_INSERT_OPTIONS)).all()
+        logger.info("Bulk created %s of %s members.", len(members), len(rows))
+        return members
+
+    async def get_member_by_id(self, member_id: str) -> Optional[Member]:
+        logger.info("Getting member by id: %s", member_id)
+        member = await self._read_through(member_cache, member_id, self._query_member)
+        if member:
+            logger.info("Member with id '%s' found.", member_id)
+        else:
+            logger.info("Member with id '%s' not found.", member_id)
+        return member
+
+    async def _query_member(self, member_id: str, *options) -> Optional[Member]:
+        # Uncached lookup; writes always start from the row in the database.
+        result = await self.db_session.execute(select(Member).options(*options).filter(Member.id == member_id))
+        return result.scalars().first()
+
+    async def get_members_by_ids(self, ids: List[str]) -> List[Member]:
+        logger.info("Getting %s members by id", len(ids))
+        result = await self.db_session.execute(select(Member).filter(Member.id == any_(cast(ids, ARRAY(String)))))
+        members = result.scalars().all()
+        logger.info("Found %s of %s members.", len(members), len(ids))
+        return members
+
+    async def update_member(self, member_id: str, name: str, email: str, expected_version: int = 0) -> Tuple[Optional[Member], Optional[int]]:
+        logger.info("Updating member with id: %s (expected version %s)", member_id, expected_version)
+        invalidate_on_commit(self.db_session.sync_session, member_cache, member_id)
+        statement = update_statement(Member, member_id, expected_version, dict(name=name, email=email), MEMBERS)
+        row = (await self.db_session.execute(statement)).one()
+        if row.entity:
+            logger.info("Member with id '%s' updated successfully.", member_id)
+        else:
+            logger.info("Member with id '%s' was not updated (version %s).", member_id, row.previous_version)
+        return row.entity, row.previous_version
+
+    async def delete_member(self, member_id: str) -> bool:
+        logger.info("Deleting member with id: %s", member_id)
+        member = await self._query_member(member_id, selectinload(Member.borrow_records))
+        if member:
+            invalidate_on_commit(self.db_session.sync_session, member_cache, member_id)
+            await self.db_session.delete(member)
+            await self.db_session.flush()
+            await self.db_session.execute(tombstone_statement("members", member_id))
+            await self._record_changes(MEMBERS, ChangeKind.DELETED, [member_id])
+            logger.info("Member with id '%s' deleted successfully.", member_id)
+            return True
+        logger.info("Member with id '%s' not found for deletion.", member_id)
+        return False
+
+    async def get_member_by_email(self, email: str) -> Optional[Member]:
+        logger.info("Getting member by email: %s", email)
+        result = await self.db_session.execute(select(Member).filter(Member.email == email))
+        member = result.scalars().first()
+        if member:
+            logger.info("Member with email '%s' found.", email)
+        else:
+            logger.info("Member with email '%s' not found.", email)
+        return member
+
+    async def borrow_book_if_available(self, book_id: str, member_id: str) -> Tuple[Optional[BorrowRecord], Optional[bool], bool]:
+        logger.info("Borrowing book id: %s for member id: %s", book_id, member_id)
+        invalidate_on_commit(self.db_session.sync_session, book_cache, book_id)
+        row = (await self.db_session.execute(borrow_statement(book_id, member_id))).one()
+        if row.BorrowRecord:
+            logger.info(
+                "Borrow record for book id '%s' and member id '%s' created successfully with id %s",
+                book_id, member_id, row.BorrowRecord.id,
+            )
+        else:
+            logger.info("Book id '%s' was not borrowed by member id '%s'.", book_id, member_id)
+        return row.BorrowRecord, row.book_available, row.member_exists
+
+    async def get_borrow_record_by_id(self, borrow_record_id: str) -> Optional[BorrowRecord]:
+        logger.info("Getting borrow record by id: %s", borrow_record_id)
+        result = await self.db_session.execute(select(BorrowRecord).filter(BorrowRecord.id == borrow_record_id))
+        borrow_record = result.scalars().first()
+        if borrow_record:
+            logger.info("Borrow record with id '%s' found.", borrow_record_id)
+        else:
+            logger.info("Borrow record with id '%s' not found.", borrow_record_id)
+        return borrow_record
+
+    async def return_borrowed_book(self, borrow_record_id: str) -> Tuple[Optional[BorrowRecord], Optional[BorrowingStatus]]:
+        logger.info("Returning borrow record with id: %s", borrow_record_id)
+        row = (await self.db_session.execute(return_statement(borrow_record_id))).one()
+        if row.BorrowRecord:
+            invalidate_on_commit(self.db_session.sync_session, book_cache, row.BorrowRecord.book_id)
+            logger.info("Borrow record with id '%s' updated to RETURNED successfully.", borrow_record_id)
+        else:
+            logger.info(
+                "Borrow record with id '%s' was not returned (status %s).",
+                borrow_record_id, row.previous_status,
+            )
+        return row.BorrowRecord, row.previous_status
+
+    async def list_all_borrowings(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[BorrowRecord]:
+        logger.info("Listing borrowing records with book and member details after %s with limit %s", after, limit)
+        query = select(BorrowRecord).options(
+            joinedload(BorrowRecord.book),
+            joinedload(BorrowRecord.member)
+        )
+        query = apply_keyset_page(query, (BorrowRecord.borrow_date, BorrowRecord.id), limit, after)
+        borrowings = (await self.db_session.execute(query)).scalars().all()
+        logger.info("Found %s borrowing records.", len(borrowings))
+        return borrowings
+
+    async def iter_borrowings(self, batch_size: int) -> AsyncIterator[List[BorrowRecord]]:
+        logger.info("Streaming borrowing records in batches of %s", batch_size)
+        result = await self.db_session.stream(
+            select(BorrowRecord)
+            .options(joinedload(BorrowRecord.book), joinedload(BorrowRecord.member))
+            .execution_options(yield_per=batch_size)
+        )
+        async for borrow_records in result.scalars().partitions():
+            yield borrow_records
+
+    async def change_watermark(self) -> int:
+        # See LibraryRepository.change_watermark.
+        return (await self.db_session.execute(text(WATERMARK_SQL))).scalar_one()
+
+    async def ensure_replayed(self, watermark: int) -> None:
+        # See LibraryRepository.ensure_replayed.
+        if on_replica(self.db_session) and await self.change_watermark() < watermark:
+            raise ReplicaUnavailable(f"Replica has not replayed the transactions below {watermark} yet.")
+
+    async def list_changes_since(self, entity: str, before: int, limit: Optional[int], after: Sequence, deletions: bool) -> list:
+        logger.info("Listing %s changed below version %s after %s with limit %s", entity, before, after, limit)
+        rows = (await self.db_session.execute(changes_since_statement(entity, before, limit, after, deletions))).all()
+        logger.info("Found %s changed %s.", len(rows), entity)
+        return rows
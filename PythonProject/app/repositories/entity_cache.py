@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.config import ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS
+from app.db.changes import BOOKS, MEMBERS
+from app.db.models import Book, Member
+from typing import Dict, Iterable, Optional, Tuple
+import threading
+import time
+
+_PENDING_INVALIDATIONS = "entity_cache_invalidations"
+
+
+class EntityCache:
+    """
+    Bounded, thread-safe LRU cache with a TTL for rows of one ORM model, keyed by primary key.
+
+    Only column values are stored, never ORM instances, so an entry can be shared between sessions
+    and threads. The cache is per process: writes of this process invalidate it as they commit, and
+    writes of other processes once the change feed is notified of them (see follow_changes).
+    Without the feed the cache is bypassed.
+    """
+
+    def __init__(self, model, max_size: int, ttl_seconds: float):
+        self.model = model
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._columns = [attr.key for attr in inspect(model).column_attrs]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation. A reader only fills the cache if no invalidation happened
+        # since it started its query, so a slow read can never put back a row a writer just changed.
+        self._generation = 0
+        # Whether the change feed of this process is listening for the writes of other processes.
+        self.following = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.following
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, values = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values
+
+    def put(self, key: str, obj, generation: int) -> None:
+        values = {column: getattr(obj, column) for column in self._columns}
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def to_instance(self, values: dict):
+        # Builds a detached instance with the cached identity; merge(load=False) attaches it to a
+        # session without emitting a SELECT.
+        obj = self.model(**values)
+        make_transient_to_detached(obj)
+        return obj
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def invalidate_on_commit(session: Session, cache: EntityCache, key: str) -> None:
+    """
+    Drops key from cache now and again once the session's transaction ends.
+
+    The second invalidation covers readers that miss between the write and the commit and would
+    otherwise cache the row as it was before the commit.
+    """
+    cache.invalidate(key)
+    session.info.setdefault(_PENDING_INVALIDATIONS, set()).add((cache, key))
+
+
+def _flush_pending_invalidations(session: Session) -> None:
+    for cache, key in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        cache.invalidate(key)
+
+
+# Registered on the Session class so it also covers the sessions behind AsyncSession.
+event.listen(Session, "after_commit", _flush_pending_invalidations)
+event.listen(Session, "after_rollback", _flush_pending_invalidations)
+
+
+book_cache = EntityCache(Book, ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS)
+member_cache = EntityCache(Member, ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL_SECONDS)
+_CACHES_BY_TOPIC = {BOOKS: book_cache, MEMBERS: member_cache}
+
+
+def invalidate_changed(changes: Iterable[Tuple[str, str]]) -> None:
+    """
+    Drops the entities of committed (topic, entity_id) change events, whichever process wrote them.
+    """
+    for topic, entity_id in changes:
+        cache = _CACHES_BY_TOPIC.get(topic)
+        if cache is not None:
+            cache.invalidate(entity_id)
+
+
+def follow_changes(following: bool) -> None:
+    """
+    Turns the caches on while the change feed listens for writes and off while it does not. They
+    start out empty either way, since writes made in between were not seen.
+    """
+    for cache in _CACHES_BY_TOPIC.values():
+        cache.clear()
+        cache.following = following
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Hit, miss and eviction counters of the entity caches of this process.
+    """
+    return {"books": book_cache.stats(), "members": member_cache.stats()}
@@ -1,192 +1,797 @@
-from sqlalchemy import not_
-from sqlalchemy.orm import Session, joinedload
-from app.db.models import Book, Member, BorrowRecord, BorrowingStatus
-from typing import List, Optional
-from datetime import date, datetime
+from sqlalchemy import select, update, delete, exists, inspect, literal, literal_column, func, case, true, or_, and_, tuple_, any_, cast, union_all, text, BigInteger, Double, String
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+from sqlalchemy.orm import Session, aliased, joinedload
+from app.db import search
+from app.db.changes import BOOKS, BORROWINGS, MEMBERS, WATERMARK_SQL
+from app.db.replicas import ReplicaUnavailable, on_replica
+from app.db.models import Book, Member, BorrowRecord, BorrowingStatus, ChangeEvent, ChangeKind, Tombstone, utc_today
+from app.config import MAX_BATCH_SIZE
+from app.repositories.entity_cache import book_cache, member_cache, invalidate_on_commit
+from typing import IO, Iterator, List, Optional, Sequence, Tuple
+from datetime import date
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Render a whole batch as a single multi-row VALUES statement. SQLAlchemy still splits it
+# when a driver's bind-parameter limit would be exceeded.
+BULK_INSERT_OPTIONS = {"insertmanyvalues_page_size": MAX_BATCH_SIZE}
+
+
+def apply_keyset_page(query, sort_columns, limit: Optional[int], after: Optional[Sequence]):
+    # Seeks past the last row of the previous page with a row-value comparison on the
+    # indexed sort key, so deep pages cost the same as the first one (no OFFSET). The key values
+    # are bound with the types of their columns: a plain int would go out as INTEGER, which a
+    # BIGINT version outgrows.
+    query = query.order_by(*sort_columns)
+    if after is not None:
+        query = query.filter(tuple_(*sort_columns) > tuple_(*(literal(value, column.type) for column, value in zip(sort_columns, after))))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def change_events_cte(name: str, *sources):
+    """
+    Data-modifying CTE that adds a change event for every (topic, kind, entity_id) row of sources,
+    for statements that change several tables at once. Postgres runs it even if nothing selects
+    from it, but SQLAlchemy only renders it if something does.
+    """
+    return (
+        insert(ChangeEvent)
+        .from_select(["topic", "kind", "entity_id"], union_all(*sources))
+        .returning(ChangeEvent.id)
+        .cte(name)
+    )
+
+
+def change_source(topic: str, kind: ChangeKind, entity_ids):
+    # The kind is cast explicitly: UNION ALL would resolve an untyped literal to text.
+    kind_type = ChangeEvent.__table__.c.kind.type
+    return select(literal(topic), cast(literal(kind, kind_type), kind_type), entity_ids)
+
+
+def borrow_statement(book_id: str, member_id: str):
+    """
+    Borrows a book in one statement: the UPDATE only matches while the book is available and the
+    member exists, and the borrow record is inserted from the updated row. Concurrent borrows of
+    the same book serialize on the row lock, and every one but the first matches nothing.
+
+    Always returns one row with the new BorrowRecord (None when nothing was borrowed) plus
+    book_available (None when the book does not exist) and member_exists as of the statement
+    snapshot, so failures can be reported without another round trip. A borrow also adds its
+    change events in the same statement.
+    """
+    member_exists = exists().where(Member.id == member_id)
+    flipped = (
+        update(Book)
+        .where(Book.id == book_id, Book.is_available.is_(True), member_exists)
+        .values(is_available=False)
+        .returning(Book.id)
+        .cte("flipped")
+    )
+    record_columns = BorrowRecord.__table__.c
+    inserted = (
+        insert(BorrowRecord)
+        .from_select(
+            ["id", "book_id", "member_id", "borrow_date", "status"],
+            select(
+                literal(str(uuid.uuid4())),
+                flipped.c.id,
+                literal(member_id),
+                literal(utc_today(), record_columns.borrow_date.type),
+                literal(BorrowingStatus.BORROWED, record_columns.status.type),
+            ),
+        )
+        .returning(*record_columns)
+        .cte("inserted")
+    )
+    changes = change_events_cte(
+        "changes",
+        change_source(BOOKS, ChangeKind.AVAILABILITY, flipped.c.id),
+        change_source(BORROWINGS, ChangeKind.CREATED, inserted.c.id),
+    )
+    diagnostics = select(
+        select(Book.is_available).where(Book.id == book_id).scalar_subquery().label("book_available"),
+        member_exists.label("member_exists"),
+        select(func.count()).select_from(changes).scalar_subquery().label("changes"),
+    ).subquery("diagnostics")
+    return select(
+        aliased(BorrowRecord, inserted, name="BorrowRecord"), diagnostics.c.book_available, diagnostics.c.member_exists
+    ).select_from(diagnostics.outerjoin(inserted, true()))
+
+
+def return_statement(borrow_record_id: str):
+    """
+    Returns a borrowed book in one statement: marks the record RETURNED only while it is still
+    BORROWED and makes its book available again, and adds the change events. Returns one row with
+    the updated BorrowRecord (None when nothing changed) and the status the record had before (None
+    when it does not exist).
+    """
+    returned = (
+        update(BorrowRecord)
+        .where(BorrowRecord.id == borrow_record_id, BorrowRecord.status == BorrowingStatus.BORROWED)
+        .values(status=BorrowingStatus.RETURNED, return_date=utc_today())
+        .returning(*BorrowRecord.__table__.c)
+        .cte("returned")
+    )
+    released = (
+        update(Book)
+        .where(Book.id == returned.c.book_id)
+        .values(is_available=True)
+        .returning(Book.id)
+        .cte("released")
+    )
+    changes = change_events_cte(
+        "changes",
+        change_source(BORROWINGS, ChangeKind.UPDATED, returned.c.id),
+        change_source(BOOKS, ChangeKind.AVAILABILITY, released.c.id),
+    )
+    diagnostics = select(
+        select(BorrowRecord.status).where(BorrowRecord.id == borrow_record_id).scalar_subquery().label("previous_status"),
+        select(func.count()).select_from(changes).scalar_subquery().label("changes"),
+    ).subquery("diagnostics")
+    return select(
+        aliased(BorrowRecord, returned, name="BorrowRecord"), diagnostics.c.previous_status
+    ).select_from(diagnostics.outerjoin(returned, true()))
+
+
+def update_statement(model, entity_id: str, expected_version: int, values: dict, topic: Optional[str] = None):
+    """
+    Updates a book or member in one statement, only if its version is still expected_version (any
+    version when 0). Concurrent updates serialize on the row lock, and once one commits the
+    others no longer match. With a topic, the change event is added by the same statement.
+
+    Always returns one row with the updated entity (None when nothing was updated) and the
+    version the row had as of the statement snapshot (None when it does not exist), so a
+    conflict can be told from a missing row without another round trip.
+    """
+    condition = model.id == entity_id
+    if expected_version:
+        condition = and_(condition, model.version == expected_version)
+    updated = (
+        update(model)
+        .where(condition)
+        .values(**values)
+        .returning(*inspect(model).columns)
+        .cte("updated")
+    )
+    diagnostics = [select(model.version).where(model.id == entity_id).scalar_subquery().label("previous_version")]
+    if topic is not None:
+        changes = change_events_cte("changes", change_source(topic, ChangeKind.UPDATED, updated.c.id))
+        diagnostics.append(select(func.count()).select_from(changes).scalar_subquery().label("changes"))
+    diagnostics = select(*diagnostics).subquery("diagnostics")
+    # The session may already hold the row (the email check loads it), and would otherwise keep its
+    # old values.
+    return (
+        select(aliased(model, updated, name="entity"), diagnostics.c.previous_version)
+        .select_from(diagnostics.outerjoin(updated, true()))
+        .execution_options(populate_existing=True)
+    )
+
+
+def availability_mismatch_statements(repair: bool):
+    """
+    Statements returning the ids of books marked available that have an active borrow record, and
+    of books marked unavailable that have none. With repair, they are UPDATEs that fix the flag.
+    """
+    active = exists().where(BorrowRecord.book_id == Book.id, BorrowRecord.status == BorrowingStatus.BORROWED)
+    wrongly_available = Book.is_available.isnot(False) & active
+    wrongly_unavailable = Book.is_available.isnot(True) & ~active
+    if not repair:
+        return select(Book.id).where(wrongly_available), select(Book.id).where(wrongly_unavailable)
+    return (
+        update(Book).where(wrongly_available).values(is_available=False).returning(Book.id),
+        update(Book).where(wrongly_unavailable).values(is_available=True).returning(Book.id),
+    )
+
+
+# Columns a bulk import supplies per table (besides id), with their staging types, and the unique
+# column that decides whether a row is new.
+IMPORT_COLUMNS = {
+    "books": (("title", "text"), ("author", "text"), ("published_date", "date"), ("isbn", "text")),
+    "members": (("name", "text"), ("email", "text")),
+}
+IMPORT_KEYS = {"books": "isbn", "members": "email"}
+# Values of the columns a bulk import does not supply, as SQL expressions. Written explicitly so
+# imports do not depend on the server defaults of the table.
+IMPORT_DEFAULTS = {"books": (("is_available", "true"),), "members": (("join_date", "current_date"),)}
+# Change topics of the imported tables that are watched.
+IMPORT_CHANGE_TOPICS = {"books": BOOKS}
+
+
+def import_statements(table: str) -> Tuple[str, str, str]:
+    """
+    Returns the staging table DDL, the COPY into it and the INSERT that moves the staged rows into
+    table, skipping those whose unique key is taken, and selects the (line, key) of the skipped ones.
+    Imported rows of a watched table get their change events in the same statement.
+    """
+    staging = f"import_{table}"
+    key = IMPORT_KEYS[table]
+    columns = ", ".join(name for name, _ in IMPORT_COLUMNS[table])
+    defaults = "".join(f", {name}" for name, _ in IMPORT_DEFAULTS[table])
+    default_values = "".join(f", {expression} AS {name}" for name, expression in IMPORT_DEFAULTS[table])
+    definitions = ", ".join(f"{name} {type_}" for name, type_ in IMPORT_COLUMNS[table])
+    create = f"CREATE TEMPORARY TABLE {staging} (line bigint, id text, {definitions}) ON COMMIT DROP"
+    copy = f"COPY {staging} (line, id, {columns}) FROM STDIN WITH (FORMAT csv)"
+    changes = ""
+    if table in IMPORT_CHANGE_TOPICS:
+        changes = f""",
+        changes AS (
+            INSERT INTO change_events (topic, kind, entity_id)
+            SELECT '{IMPORT_CHANGE_TOPICS[table]}', '{ChangeKind.CREATED.value}', id FROM inserted
+        )"""
+    # DISTINCT ON keeps the first occurrence of a key within the file; ON CONFLICT skips keys that
+    # are already in the table, including those loaded by an earlier batch of the same import.
+    insert = f"""
+        WITH inserted AS (
+            INSERT INTO {table} (id, {columns}{defaults})
+            SELECT DISTINCT ON ({key}) id, {columns}{default_values} FROM {staging} ORDER BY {key}, line
+            ON CONFLICT ({key}) DO NOTHING
+            RETURNING id
+        ){changes}
+        SELECT {staging}.line, {staging}.{key}
+        FROM {staging} LEFT JOIN inserted ON inserted.id = {staging}.id
+        WHERE inserted.id IS NULL
+        ORDER BY {staging}.line
+    """
+    return create, copy, insert
+
+
+# Exported columns per dataset as (name, SQL expression, type). Borrowings are denormalized with
+# the book and member they refer to, like ListBorrowings returns them.
+EXPORT_COLUMNS = {
+    "books": (
+        ("id", "id", "string"), ("title", "title", "string"), ("author", "author", "string"),
+        ("published_date", "published_date", "date"), ("isbn", "isbn", "string"),
+        ("is_available", "is_available", "bool"),
+    ),
+    "members": (
+        ("id", "id", "string"), ("name", "name", "string"), ("email", "email", "string"),
+        ("join_date", "join_date", "date"),
+    ),
+    "borrowings": (
+        ("id", "r.id", "string"), ("status", "r.status::text", "string"),
+        ("borrow_date", "r.borrow_date", "date"), ("return_date", "r.return_date", "date"),
+        ("book_id", "r.book_id", "string"), ("book_title", "b.title", "string"),
+        ("book_author", "b.author", "string"), ("book_isbn", "b.isbn", "string"),
+        ("member_id", "r.member_id", "string"), ("member_name", "m.name", "string"),
+        ("member_email", "m.email", "string"),
+    ),
+}
+EXPORT_SOURCES = {
+    "books": "books",
+    "members": "members",
+    "borrowings": "borrow_records r JOIN books b ON b.id = r.book_id JOIN members m ON m.id = r.member_id",
+}
+# COPY options per export format. NDJSON rows come out of row_to_json as single CSV fields;
+# control characters as delimiter and quote keep COPY from quoting or escaping them.
+EXPORT_COPY_OPTIONS = {
+    "csv": {"format": "csv", "header": True},
+    "ndjson": {"format": "csv", "delimiter": "\x02", "quote": "\x01"},
+}
+
+
+def export_query(dataset: str, file_format: str) -> str:
+    """
+    Returns the SELECT whose rows COPY writes for an export of dataset in file_format.
+    """
+    columns = ", ".join(f"{expression} AS {name}" for name, expression, _ in EXPORT_COLUMNS[dataset])
+    query = f"SELECT {columns} FROM {EXPORT_SOURCES[dataset]}"
+    if file_format == "ndjson":
+        query = f"SELECT row_to_json(export) FROM ({query}) AS export"
+    return query
+
+
+def copy_option_literal(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    # An escape string, so control characters survive as \xNN.
+    return "E'" + "".join(char if char.isalnum() else f"\\x{ord(char):02x}" for char in value) + "'"
+
+
+def export_copy_statement(dataset: str, file_format: str) -> str:
+    options = ", ".join(
+        f"{name.upper()} {copy_option_literal(value)}" for name, value in EXPORT_COPY_OPTIONS[file_format].items()
+    )
+    return f"COPY ({export_query(dataset, file_format)}) TO STDOUT WITH ({options})"
+
+
+def apply_ranked_page(query, score, id_column, limit: Optional[int], after: Optional[Sequence]):
+    # Keyset paging for relevance order: score descending, then id. Scores are computed as double
+    # precision so a score read back from a page token compares equal to the one in the database.
+    query = query.order_by(score.desc(), id_column)
+    if after is not None:
+        after_score, after_id = after
+        query = query.filter(or_(score < after_score, and_(score == after_score, id_column > after_id)))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def book_search_statement(text_query: str, limit: Optional[int], after: Optional[Sequence]):
+    """
+    Ranked full-text search over title and author, served by the ix_books_search GIN index.
+    Selects (Book, score) rows.
+    """
+    document = Book.__table__.c.search_document
+    ts_query = func.websearch_to_tsquery(literal_column("'english'"), text_query)
+    score = cast(func.ts_rank_cd(document, ts_query), Double)
+    query = select(Book, score.label("score")).where(document.op("@@")(ts_query))
+    return apply_ranked_page(query, score, Book.id, limit, after)
+
+
+def member_search_statement(text_query: str, limit: Optional[int], after: Optional[Sequence]):
+    """
+    Search over member name and email. Names or emails starting with the query always match (via
+    the lower(...) prefix indexes); with pg_trgm, names or emails similar to it (typos) match too,
+    scored by trigram similarity plus a bonus for prefix matches. Selects (Member, score) rows.
+    """
+    pattern = escape_like(text_query.lower()) + "%"
+    name_prefix = func.lower(Member.name).like(pattern, escape="\\")
+    email_prefix = func.lower(Member.email).like(pattern, escape="\\")
+    prefix_bonus = case((or_(name_prefix, email_prefix), 1.0), else_=0.0)
+    if search.trigram_search:
+        similarity = func.greatest(func.similarity(Member.name, text_query), func.similarity(Member.email, text_query))
+        score = cast(similarity, Double) + prefix_bonus
+        match = or_(Member.name.op("%")(text_query), Member.email.op("%")(text_query), name_prefix, email_prefix)
+    else:
+        score = prefix_bonus + case((name_prefix, 0.5), else_=0.0)
+        match = or_(name_prefix, email_prefix)
+    query = select(Member, score.label("score")).where(match)
+    return apply_ranked_page(query, score, Member.id, limit, after)
+
+
+def changes_statement(after: int, before: int, topic: Optional[str] = None, limit: Optional[int] = None):
+    """
+    The entities (of topic, or of every topic) with change events from transactions in
+    [after, before), one row each with its topic, id, whether it was created and whether only its
+    availability changed.
+    """
+    statement = (
+        select(
+            ChangeEvent.topic,
+            ChangeEvent.entity_id,
+            func.bool_or(ChangeEvent.kind == ChangeKind.CREATED).label("created"),
+            func.bool_and(ChangeEvent.kind == ChangeKind.AVAILABILITY).label("availability_only"),
+        )
+        .where(ChangeEvent.txid >= after, ChangeEvent.txid < before)
+        .group_by(ChangeEvent.topic, ChangeEvent.entity_id)
+    )
+    if topic is not None:
+        statement = statement.where(ChangeEvent.topic == topic)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+# Tables that ListChangesSince serves, by entity name, and the ones whose deletions leave a tombstone.
+SYNC_MODELS = {"books": Book, "members": Member, "borrowings": BorrowRecord}
+TOMBSTONE_ENTITIES = ("books", "members")
+
+
+def changes_since_statement(entity: str, before: int, limit: Optional[int], after: Sequence, deletions: bool):
+    """
+    The rows of entity last written by transactions below before, in (version, id) order past the
+    key after, as (row, version, id, deleted). With deletions, the tombstones of the same range are
+    merged in as rows of None, so both are paged by one key. Each side is a range scan of its
+    (version, id) index.
+    """
+    model = SYNC_MODELS[entity]
+    keys = apply_keyset_page(
+        select(model.version.label("version"), model.id.label("id"), literal(False).label("deleted")).where(model.version < before),
+        (model.version, model.id), limit, after,
+    )
+    if deletions and entity in TOMBSTONE_ENTITIES:
+        deleted = apply_keyset_page(
+            select(Tombstone.version, Tombstone.entity_id, literal(True))
+            .where(Tombstone.entity == entity, Tombstone.version < before),
+            (Tombstone.version, Tombstone.entity_id), limit, after,
+        )
+        keys = union_all(keys, deleted)
+    keys = keys.subquery("keys")
+    # A tombstone of a re-imported id must not pick up the new row.
+    statement = (
+        select(model, keys.c.version, keys.c.id, keys.c.deleted)
+        .select_from(keys)
+        .outerjoin(model, and_(model.id == keys.c.id, ~keys.c.deleted))
+        .order_by(keys.c.version, keys.c.id)
+    )
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def tombstone_statement(entity: str, entity_id: str):
+    # An id can come back through an import and be deleted again; the tombstone then moves up.
+    statement = insert(Tombstone).values(entity=entity, entity_id=entity_id)
+    return statement.on_conflict_do_update(
+        index_elements=[Tombstone.entity, Tombstone.entity_id],
+        set_={"version": statement.excluded.version, "deleted_at": statement.excluded.deleted_at},
+    )
+
 
 class LibraryRepository:
-    def __init__(self, db_session: Session):
+    """
+    Data access for books, members and borrow records. Methods only flush their changes; the
+    session scope (get_db_session) commits once at the end of the RPC. Without cached, point
+    lookups skip the entity caches, for clients that must see their own writes.
+    """
+
+    def __init__(self, db_session: Session, cached: bool = True):
         self.db_session = db_session
+        self.cached = cached
+
+    def _record_changes(self, topic: str, kind: ChangeKind, entity_ids: Sequence[str]) -> None:
+        # One INSERT in the transaction of the change; the trigger on change_events notifies
+        # the watchers when it commits.
+        if entity_ids:
+            self.db_session.execute(
+                insert(ChangeEvent),
+                [{"topic": topic, "kind": kind, "entity_id": entity_id} for entity_id in entity_ids],
+                execution_options=BULK_INSERT_OPTIONS,
+            )
+
+    def _read_through(self, cache, entity_id: str, load):
+        # Cache hits are attached to the session with merge(load=False), so callers get the same
+        # persistent instance they would get from a query, without the round trip. Only rows read
+        # from the primary are cached: a replica's may be older than an invalidation already seen.
+        if not (cache.enabled and self.cached):
+            return load(entity_id)
+        values = cache.get(entity_id)
+        if values is not None:
+            return self.db_session.merge(cache.to_instance(values), load=False)
+        generation = cache.generation()
+        obj = load(entity_id)
+        if obj is not None and not on_replica(self.db_session):
+            cache.put(entity_id, obj, generation)
+        return obj
 
     def create_book(self, title: str, author: str, published_date: date, isbn: str) -> Book:
-        logger.info(f"Creating book with title: {title}")
+        logger.info("Creating book with title: %s", title)
         book = Book(title=title, author=author, published_date=published_date, isbn=isbn)
         self.db_session.add(book)
-        self.db_session.commit()
-        self.db_session.refresh(book)
-        logger.info(f"Book with title '{title}' created successfully with id {book.id}")
+        self.db_session.flush()
+        self._record_changes(BOOKS, ChangeKind.CREATED, [book.id])
+        logger.info("Book with title '%s' created successfully with id %s", title, book.id)
         return book
 
+    def bulk_create_books(self, rows: List[dict]) -> List[Book]:
+        logger.info("Bulk creating %s books", len(rows))
+        # Sent as one multi-row INSERT ... RETURNING ("insertmanyvalues"), which also keeps the compiled
+        # statement cacheable. Rows whose ISBN already exists are skipped and not returned.
+        stmt = insert(Book).on_conflict_do_nothing(index_elements=[Book.isbn]).returning(Book)
+        books = self.db_session.scalars(stmt, rows, execution_options=BULK_INSERT_OPTIONS).all()
+        self._record_changes(BOOKS, ChangeKind.CREATED, [book.id for book in books])
+        logger.info("Bulk created %s of %s books.", len(books), len(rows))
+        return books
+
     def get_book_by_id(self, book_id: str) -> Optional[Book]:
-        logger.info(f"Getting book by id: {book_id}")
-        book = self.db_session.query(Book).filter(Book.id == book_id).first()
+        logger.info("Getting book by id: %s", book_id)
+        book = self._read_through(book_cache, book_id, self._query_book)
         if book:
-            logger.info(f"Book with id '{book_id}' found.")
+            logger.info("Book with id '%s' found.", book_id)
         else:
-            logger.info(f"Book with id '{book_id}' not found.")
+            logger.info("Book with id '%s' not found.", book_id)
         return book
 
-    def update_book(self, book_id: str, title: str, author: str, published_date: date, isbn: str) -> Optional[Book]:
-        logger.info(f"Updating book with id: {book_id}")
-        book = self.get_book_by_id(book_id)
-        if book:
-            book.title = title
-            book.author = author
-            book.published_date = published_date
-            book.isbn = isbn
-            self.db_session.commit()
-            self.db_session.refresh(book)
-            logger.info(f"Book with id '{book_id}' updated successfully.")
+    def _query_book(self, book_id: str) -> Optional[Book]:
+        # Uncached lookup; writes always start from the row in the database.
+        return self.db_session.query(Book).filter(Book.id == book_id).first()
+
+    def get_books_by_ids(self, ids: List[str]) -> List[Book]:
+        logger.info("Getting %s books by id", len(ids))
+        # A single array parameter keeps the statement text identical for any number of ids.
+        books = self.db_session.query(Book).filter(Book.id == any_(cast(ids, ARRAY(String)))).all()
+        logger.info("Found %s of %s books.", len(books), len(ids))
+        return books
+
+    def update_book(self, book_id: str, title: str, author: str, published_date: date, isbn: str, expected_version: int = 0) -> Tuple[Optional[Book], Optional[int]]:
+        logger.info("Updating book with id: %s (expected version %s)", book_id, expected_version)
+        invalidate_on_commit(self.db_session, book_cache, book_id)
+        values = dict(title=title, author=author, published_date=published_date, isbn=isbn)
+        row = self.db_session.execute(update_statement(Book, book_id, expected_version, values, BOOKS)).one()
+        if row.entity:
+            logger.info("Book with id '%s' updated successfully.", book_id)
         else:
-            logger.info(f"Book with id '{book_id}' not found for update.")
-        return book
+            logger.info("Book with id '%s' was not updated (version %s).", book_id, row.previous_version)
+        return row.entity, row.previous_version
 
     def delete_book(self, book_id: str) -> bool:
-        logger.info(f"Deleting book with id: {book_id}")
-        book = self.get_book_by_id(book_id)
+        logger.info("Deleting book with id: %s", book_id)
+        book = self._query_book(book_id)
         if book:
+            invalidate_on_commit(self.db_session, book_cache, book_id)
             self.db_session.delete(book)
-            self.db_session.commit()
-            logger.info(f"Book with id '{book_id}' deleted successfully.")
+            self.db_session.flush()
+            self.db_session.execute(tombstone_statement("books", book_id))
+            self._record_changes(BOOKS, ChangeKind.DELETED, [book_id])
+            logger.info("Book with id '%s' deleted successfully.", book_id)
             return True
-        logger.info(f"Book with id '{book_id}' not found for deletion.")
+        logger.info("Book with id '%s' not found for deletion.", book_id)
         return False
 
-    def list_books(self) -> List[Book]:
-        logger.info("Listing all books")
-        books = self.db_session.query(Book).all()
-        logger.info(f"Found {len(books)} books.")
+    def list_books(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Book]:
+        logger.info("Listing books after %s with limit %s", after, limit)
+        query = self.db_session.query(Book)
+        books = apply_keyset_page(query, (Book.title, Book.id), limit, after).all()
+        logger.info("Found %s books.", len(books))
         return books
 
-    def list_available_books(self) -> List[Book]:
-        logger.info("Listing all books currently available for borrowing.")
-        
-        # Subquery to find book_ids that are currently borrowed
-        subquery = self.db_session.query(BorrowRecord.book_id).filter(
-            BorrowRecord.status == BorrowingStatus.BORROWED
-        ).distinct().subquery()
-
-        # Query for books where their id is NOT in the list of currently borrowed books
-        available_books = self.db_session.query(Book).filter(
-            not_(Book.id.in_(subquery))
-        ).all()
-        
-        logger.info(f"Found {len(available_books)} books available for borrowing.")
+    def iter_books(self, batch_size: int) -> Iterator[List[Book]]:
+        logger.info("Streaming books in batches of %s", batch_size)
+        # yield_per uses a server-side cursor, so only one batch is held in memory at a time.
+        result = self.db_session.execute(select(Book).execution_options(yield_per=batch_size))
+        yield from result.scalars().partitions()
+
+    def iter_typeahead_rows(self, batch_size: int) -> Iterator[Tuple[str, str, str, str]]:
+        logger.info("Streaming book typeahead rows in batches of %s", batch_size)
+        # Plain column tuples: building the index from ORM objects would double its load time.
+        result = self.db_session.execute(
+            select(Book.id, Book.title, Book.author, Book.isbn).execution_options(yield_per=batch_size)
+        )
+        for row in result:
+            yield tuple(row)
+
+    def list_available_books(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Book]:
+        logger.info("Listing books currently available for borrowing after %s with limit %s", after, limit)
+        # is_available is kept in step with borrow_records by borrowing and returning (and repaired
+        # by reconcile_availability), so the partial index ix_books_available_title_id serves this.
+        query = self.db_session.query(Book).filter(Book.is_available)
+        available_books = apply_keyset_page(query, (Book.title, Book.id), limit, after).all()
+        logger.info("Found %s books available for borrowing.", len(available_books))
         return available_books
 
-    def list_all_members(self) -> List[Member]:
-        logger.info("Listing all members")
-        members = self.db_session.query(Member).all()
-        logger.info(f"Found {len(members)} members.")
+    def search_books(self, text_query: str, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Tuple[Book, float]]:
+        logger.info("Searching books for '%s' after %s with limit %s", text_query, after, limit)
+        hits = self.db_session.execute(book_search_statement(text_query, limit, after)).all()
+        logger.info("Found %s matching books.", len(hits))
+        return hits
+
+    def list_all_members(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Member]:
+        logger.info("Listing members after %s with limit %s", after, limit)
+        query = self.db_session.query(Member)
+        members = apply_keyset_page(query, (Member.name, Member.id), limit, after).all()
+        logger.info("Found %s members.", len(members))
         return members
 
+    def iter_members(self, batch_size: int) -> Iterator[List[Member]]:
+        logger.info("Streaming members in batches of %s", batch_size)
+        result = self.db_session.execute(select(Member).execution_options(yield_per=batch_size))
+        yield from result.scalars().partitions()
+
+    def search_members(self, text_query: str, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[Tuple[Member, float]]:
+        logger.info("Searching members for '%s' after %s with limit %s", text_query, after, limit)
+        hits = self.db_session.execute(member_search_statement(text_query, limit, after)).all()
+        logger.info("Found %s matching members.", len(hits))
+        return hits
+
     def create_member(self, name: str, email: str) -> Member:
-        logger.info(f"Creating member with name: {name}")
+        logger.info("Creating member with name: %s", name)
         member = Member(name=name, email=email)
         self.db_session.add(member)
-        self.db_session.commit()
-        self.db_session.refresh(member)
-        logger.info(f"Member with name '{name}' created successfully with id {member.id}")
+        self.db_session.flush()
+        logger.info("Member with name '%s' created successfully with id %s", name, member.id)
         return member
 
+    def bulk_create_members(self, rows: List[dict]) -> List[Member]:
+        logger.info("Bulk creating %s members", len(rows))
+        # Same approach as bulk_create_books; rows whose email already exists are skipped.
+        stmt = insert(Member).on_conflict_do_nothing(index_elements=[Member.email]).returning(Member)
+        members = self.db_session.scalars(stmt, rows, execution_options=BULK_INSERT_OPTIONS).all()
+        logger.info("Bulk created %s of %s members.", len(members), len(rows))
+        return members
+
     def get_member_by_id(self, member_id: str) -> Optional[Member]:
-        logger.info(f"Getting member by id: {member_id}")
-        member = self.db_session.query(Member).filter(Member.id == member_id).first()
+        logger.info("Getting member by id: %s", member_id)
+        member = self._read_through(member_cache, member_id, self._query_member)
         if member:
-            logger.info(f"Member with id '{member_id}' found.")
+            logger.info("Member with id '%s' found.", member_id)
         else:
-            logger.info(f"Member with id '{member_id}' not found.")
+            logger.info("Member with id '%s' not found.", member_id)
         return member
 
-    def update_member(self, member_id: str, name: str, email: str) -> Optional[Member]:
-        logger.info(f"Updating member with id: {member_id}")
-        member = self.get_member_by_id(member_id)
-        if member:
-            member.name = name
-            member.email = email
-            self.db_session.commit()
-            self.db_session.refresh(member)
-            logger.info(f"Member with id '{member_id}' updated successfully.")
+    def _query_member(self, member_id: str) -> Optional[Member]:
+        # Uncached lookup; writes always start from the row in the database.
+        return self.db_session.query(Member).filter(Member.id == member_id).first()
+
+    def get_members_by_ids(self, ids: List[str]) -> List[Member]:
+        logger.info("Getting %s members by id", len(ids))
+        # A single array parameter keeps the statement text identical for any number of ids.
+        members = self.db_session.query(Member).filter(Member.id == any_(cast(ids, ARRAY(String)))).all()
+        logger.info("Found %s of %s members.", len(members), len(ids))
+        return members
+
+    def update_member(self, member_id: str, name: str, email: str, expected_version: int = 0) -> Tuple[Optional[Member], Optional[int]]:
+        logger.info("Updating member with id: %s (expected version %s)", member_id, expected_version)
+        invalidate_on_commit(self.db_session, member_cache, member_id)
+        values = dict(name=name, email=email)
+        row = self.db_session.execute(update_statement(Member, member_id, expected_version, values, MEMBERS)).one()
+        if row.entity:
+            logger.info("Member with id '%s' updated successfully.", member_id)
         else:
-            logger.info(f"Member with id '{member_id}' not found for update.")
-        return member
+            logger.info("Member with id '%s' was not updated (version %s).", member_id, row.previous_version)
+        return row.entity, row.previous_version
 
     def delete_member(self, member_id: str) -> bool:
-        logger.info(f"Deleting member with id: {member_id}")
-        member = self.get_member_by_id(member_id)
+        logger.info("Deleting member with id: %s", member_id)
+        member = self._query_member(member_id)
         if member:
+            invalidate_on_commit(self.db_session, member_cache, member_id)
             self.db_session.delete(member)
-            self.db_session.commit()
-            logger.info(f"Member with id '{member_id}' deleted successfully.")
+            self.db_session.flush()
+            self.db_session.execute(tombstone_statement("members", member_id))
+            self._record_changes(MEMBERS, ChangeKind.DELETED, [member_id])
+            logger.info("Member with id '%s' deleted successfully.", member_id)
             return True
-        logger.info(f"Member with id '{member_id}' not found for deletion.")
+        logger.info("Member with id '%s' not found for deletion.", member_id)
         return False
 
     def get_member_by_email(self, email: str) -> Optional[Member]:
-        logger.info(f"Getting member by email: {email}")
+        logger.info("Getting member by email: %s", email)
         member = self.db_session.query(Member).filter(Member.email == email).first()
         if member:
-            logger.info(f"Member with email '{email}' found.")
+            logger.info("Member with email '%s' found.", email)
         else:
-            logger.info(f"Member with email '{email}' not found.")
+            logger.info("Member with email '%s' not found.", email)
         return member
 
-    def create_borrow_record(self, book_id: str, member_id: str) -> BorrowRecord:
-        logger.info(f"Creating borrow record for book id: {book_id} and member id: {member_id}")
-        borrow_record = BorrowRecord(book_id=book_id, member_id=member_id, status=BorrowingStatus.BORROWED)
-        
-        book = self.get_book_by_id(book_id)
-        if book:
-            book.is_available = False
-        
-        self.db_session.add(borrow_record)
-        self.db_session.commit()
-        self.db_session.refresh(borrow_record)
-        logger.info(f"Borrow record for book id '{book_id}' and member id '{member_id}' created successfully with id {borrow_record.id}")
-        return borrow_record
+    def borrow_book_if_available(self, book_id: str, member_id: str) -> Tuple[Optional[BorrowRecord], Optional[bool], bool]:
+        logger.info("Borrowing book id: %s for member id: %s", book_id, member_id)
+        invalidate_on_commit(self.db_session, book_cache, book_id)
+        row = self.db_session.execute(borrow_statement(book_id, member_id)).one()
+        if row.BorrowRecord:
+            logger.info(
+                "Borrow record for book id '%s' and member id '%s' created successfully with id %s",
+                book_id, member_id, row.BorrowRecord.id,
+            )
+        else:
+            logger.info("Book id '%s' was not borrowed by member id '%s'.", book_id, member_id)
+        return row.BorrowRecord, row.book_available, row.member_exists
 
     def get_borrow_record_by_id(self, borrow_record_id: str) -> Optional[BorrowRecord]:
-        logger.info(f"Getting borrow record by id: {borrow_record_id}")
+        logger.info("Getting borrow record by id: %s", borrow_record_id)
         borrow_record = self.db_session.query(BorrowRecord).filter(BorrowRecord.id == borrow_record_id).first()
         if borrow_record:
-            logger.info(f"Borrow record with id '{borrow_record_id}' found.")
+            logger.info("Borrow record with id '%s' found.", borrow_record_id)
         else:
-            logger.info(f"Borrow record with id '{borrow_record_id}' not found.")
+            logger.info("Borrow record with id '%s' not found.", borrow_record_id)
         return borrow_record
 
-    def update_borrow_record_status_to_returned(self, borrow_record_id: str) -> Optional[BorrowRecord]:
-        logger.info(f"Attempting to return borrow record with id: {borrow_record_id}")
-        borrow_record = self.get_borrow_record_by_id(borrow_record_id)
-        if borrow_record:
-            if borrow_record.status == BorrowingStatus.RETURNED:
-                logger.info(f"Borrow record with id '{borrow_record_id}' is already returned.")
-                return borrow_record # Already returned, no change needed
-            
-            borrow_record.return_date = datetime.utcnow().date() # Use date() to match Column(Date)
-            borrow_record.status = BorrowingStatus.RETURNED
-            
-            book = self.get_book_by_id(borrow_record.book_id)
-            if book:
-                book.is_available = True
-            
-            self.db_session.commit()
-            self.db_session.refresh(borrow_record)
-            logger.info(f"Borrow record with id '{borrow_record_id}' updated to RETURNED successfully.")
+    def get_borrow_records_by_ids(self, ids: List[str]) -> List[BorrowRecord]:
+        logger.info("Getting %s borrow records by id", len(ids))
+        borrow_records = self.db_session.query(BorrowRecord).filter(BorrowRecord.id == any_(cast(ids, ARRAY(String)))).all()
+        logger.info("Found %s of %s borrow records.", len(borrow_records), len(ids))
+        return borrow_records
+
+    def return_borrowed_book(self, borrow_record_id: str) -> Tuple[Optional[BorrowRecord], Optional[BorrowingStatus]]:
+        logger.info("Returning borrow record with id: %s", borrow_record_id)
+        row = self.db_session.execute(return_statement(borrow_record_id)).one()
+        if row.BorrowRecord:
+            invalidate_on_commit(self.db_session, book_cache, row.BorrowRecord.book_id)
+            logger.info("Borrow record with id '%s' updated to RETURNED successfully.", borrow_record_id)
         else:
-            logger.info(f"Borrow record with id '{borrow_record_id}' not found for update.")
-        return borrow_record
-        
-    def list_all_borrowings(self) -> List[BorrowRecord]:
-        logger.info("Listing all borrowing records with book and member details")
-        borrowings = self.db_session.query(BorrowRecord).options(
+            logger.info(
+                "Borrow record with id '%s' was not returned (status %s).",
+                borrow_record_id, row.previous_status,
+            )
+        return row.BorrowRecord, row.previous_status
+
+    def reconcile_availability(self, repair: bool) -> Tuple[int, int]:
+        """
+        Finds books whose is_available flag disagrees with their active borrow records and, when
+        repair is set, corrects the flag. Returns the number of books wrongly marked available
+        and wrongly marked unavailable.
+        """
+        logger.info("Reconciling book availability (repair=%s)", repair)
+        counts = []
+        for statement in availability_mismatch_statements(repair):
+            book_ids = self.db_session.execute(statement).scalars().all()
+            if repair:
+                for book_id in book_ids:
+                    invalidate_on_commit(self.db_session, book_cache, book_id)
+                self._record_changes(BOOKS, ChangeKind.AVAILABILITY, book_ids)
+            counts.append(len(book_ids))
+        logger.info("Availability mismatches: %s marked available, %s marked unavailable.", counts[0], counts[1])
+        return counts[0], counts[1]
+
+    def copy_import(self, table: str, rows: IO[str]) -> List[Tuple[int, str]]:
+        """
+        Loads CSV rows of (line, id, *IMPORT_COLUMNS[table]) into table with COPY through a staging
+        table. Returns the (line, key) of the rows skipped because their unique key was taken.
+        """
+        create, copy, insert = import_statements(table)
+        # COPY is not available through SQLAlchemy; use the DBAPI connection of this transaction.
+        with self.db_session.connection().connection.cursor() as cursor:
+            cursor.execute(create)
+            cursor.copy_expert(copy, rows)
+            cursor.execute(insert)
+            skipped = cursor.fetchall()
+        logger.info("Copied rows into %s; skipped %s with a duplicate %s.", table, len(skipped), IMPORT_KEYS[table])
+        return skipped
+
+    def copy_export(self, dataset: str, file_format: str, output) -> None:
+        """
+        Writes dataset to output (anything with a write(bytes) method) with COPY TO STDOUT, row by
+        row as the server sends them.
+        """
+        logger.info("Exporting %s as %s with COPY", dataset, file_format)
+        with self.db_session.connection().connection.cursor() as cursor:
+            try:
+                cursor.copy_expert(export_copy_statement(dataset, file_format), output)
+            except BaseException:
+                # When output fails the server keeps sending, and the rollback would have to read
+                # the rest of the table first; cancel the COPY instead.
+                cursor.connection.cancel()
+                raise
+        logger.info("Exported %s.", dataset)
+
+    def list_all_borrowings(self, limit: Optional[int] = None, after: Optional[Sequence] = None) -> List[BorrowRecord]:
+        logger.info("Listing borrowing records with book and member details after %s with limit %s", after, limit)
+        query = self.db_session.query(BorrowRecord).options(
             joinedload(BorrowRecord.book),
             joinedload(BorrowRecord.member)
-        ).all()
-        logger.info(f"Found {len(borrowings)} borrowing records.")
+        )
+        borrowings = apply_keyset_page(query, (BorrowRecord.borrow_date, BorrowRecord.id), limit, after).all()
+        logger.info("Found %s borrowing records.", len(borrowings))
         return borrowings
         
 
+    def iter_borrowings(self, batch_size: int) -> Iterator[List[BorrowRecord]]:
+        logger.info("Streaming borrowing records in batches of %s", batch_size)
+        # Book and member are many-to-one, so joined eager loading is compatible with yield_per.
+        result = self.db_session.execute(
+            select(BorrowRecord)
+            .options(joinedload(BorrowRecord.book), joinedload(BorrowRecord.member))
+            .execution_options(yield_per=batch_size)
+        )
+        yield from result.scalars().partitions()
+
+    def change_watermark(self) -> int:
+        """
+        The txid below which every transaction has finished (see app.db.changes).
+        """
+        return self.db_session.execute(text(WATERMARK_SQL)).scalar_one()
+
+    def ensure_replayed(self, watermark: int) -> None:
+        """
+        Raises ReplicaUnavailable if the session is on a replica that has not replayed every
+        transaction below watermark yet, so the caller reads from the primary instead.
+        """
+        if on_replica(self.db_session) and self.change_watermark() < watermark:
+            raise ReplicaUnavailable(f"Replica has not replayed the transactions below {watermark} yet.")
+
+    def iter_changes(self, after: int, before: int, batch_size: int, topic: Optional[str] = None, limit: Optional[int] = None) -> Iterator[list]:
+        logger.info("Streaming %s changes in [%s, %s) in batches of %s", topic or "all", after, before, batch_size)
+        statement = changes_statement(after, before, topic, limit).execution_options(yield_per=batch_size)
+        result = self.db_session.execute(statement)
+        yield from result.partitions()
+
+    def get_committed_changes(self, txids: List[int]) -> List[Tuple[str, str]]:
+        logger.info("Getting changes of %s committed transactions", len(txids))
+        # Served by ix_change_events_txid; one array parameter, as in get_books_by_ids.
+        rows = self.db_session.execute(
+            select(ChangeEvent.topic, ChangeEvent.entity_id)
+            .where(ChangeEvent.txid == any_(cast(txids, ARRAY(BigInteger))))
+            .distinct()
+        ).all()
+        return [tuple(row) for row in rows]
+
+    def list_changes_since(self, entity: str, before: int, limit: Optional[int], after: Sequence, deletions: bool) -> list:
+        logger.info("Listing %s changed below version %s after %s with limit %s", entity, before, after, limit)
+        rows = self.db_session.execute(changes_since_statement(entity, before, limit, after, deletions)).all()
+        logger.info("Found %s changed %s.", len(rows), entity)
+        return rows
+
+    def prune_changes(self, older_than_seconds: float) -> int:
+        logger.info("Pruning change events older than %ss", older_than_seconds)
+        result = self.db_session.execute(
+            delete(ChangeEvent).where(ChangeEvent.created_at < func.now() - func.make_interval(0, 0, 0, 0, 0, 0, older_than_seconds))
+        )
+        logger.info("Pruned %s change events.", result.rowcount)
+        return result.rowcount
@@ -0,0 +1,293 @@
+from app.repositories.async_library_repository import AsyncLibraryRepository
+from app.services.library_service import (
+    parse_published_date,
+    is_valid_email,
+    book_row,
+    member_row,
+    resolve_batch_size,
+    book_sort_key,
+    member_sort_key,
+    borrowing_sort_key,
+    parse_borrowing_sort_key,
+    validate_expected_version,
+    version_conflict,
+    validate_sync_entity,
+    changes_page,
+)
+from app.services.pagination import (
+    resolve_page_request,
+    resolve_search_request,
+    resolve_changes_request,
+    search_kind,
+    search_sort_key,
+    build_page,
+    fetch_limit,
+)
+from app.services.batch import plan_batch, complete_batch, unique_batch_ids, in_request_order
+from app.services.typeahead import book_typeahead, resolve_suggest_request
+from app.services.export import validate_export, stream_copy_async
+import grpc
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AsyncLibraryService:
+    """
+    asyncio counterpart of LibraryService with the same validation rules and errors.
+    """
+
+    def __init__(self, repository: AsyncLibraryRepository):
+        self.repository = repository
+
+    async def create_book(self, title: str, author: str, published_date: str, isbn: str):
+        logger.info(
+            "Creating book with title: %s and author: %s and published date: %s and isbn: %s",
+            title, author, published_date, isbn,
+        )
+        if not all([title, author, published_date, isbn]):
+            raise ValueError("All fields are required for creating a book.")
+        published_date_obj = parse_published_date(published_date)
+        book = await self.repository.create_book(title, author, published_date_obj, isbn)
+        logger.info("Book '%s' created successfully.", title)
+        return book
+
+    async def batch_create_books(self, books):
+        logger.info("Batch creating %s books.", len(books))
+        results, rows, pending = plan_batch(books, book_row, "isbn", "book")
+        created = await self.repository.bulk_create_books(rows) if rows else []
+        logger.info("Batch created %s of %s books.", len(created), len(books))
+        return complete_batch(results, created, pending, "isbn", "book")
+
+    async def batch_get_books(self, book_ids):
+        logger.info("Batch getting %s books.", len(book_ids))
+        books = await self.repository.get_books_by_ids(unique_batch_ids(book_ids, "book"))
+        logger.info("Found %s books.", len(books))
+        return in_request_order(book_ids, books)
+
+    async def update_book(self, book_id: str, title: str, author: str, published_date: str, isbn: str, expected_version: int = 0):
+        logger.info("Updating book with id: %s", book_id)
+        if not all([book_id, title, author, published_date, isbn]):
+            raise ValueError("All fields are required for updating a book.")
+        validate_expected_version(expected_version)
+        published_date_obj = parse_published_date(published_date)
+
+        updated_book, previous_version = await self.repository.update_book(book_id, title, author, published_date_obj, isbn, expected_version)
+        if not updated_book:
+            if previous_version is None:
+                return None
+            raise version_conflict("Book", book_id, expected_version)
+        logger.info("Book with id '%s' updated successfully.", book_id)
+        return updated_book
+
+    async def delete_book(self, book_id: str) -> bool:
+        logger.info("Deleting book with id: %s", book_id)
+        if not book_id:
+            raise ValueError("Book ID is required for deleting a book.")
+
+        result = await self.repository.delete_book(book_id)
+        if not result:
+            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
+        logger.info("Book with id '%s' deleted successfully.", book_id)
+        return result
+
+    async def get_book(self, book_id: str):
+        logger.info("Getting book with id: %s", book_id)
+        if not book_id:
+            raise ValueError("Book ID is required for getting a book.")
+        book = await self.repository.get_book_by_id(book_id)
+        if not book:
+            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
+        logger.info("Book with id '%s' retrieved successfully.", book_id)
+        return book
+
+    async def search_books(self, query: str, page_size: int = 0, page_token: str = ""):
+        logger.info("Searching books for '%s' with page size %s.", query, page_size)
+        query, limit, after = resolve_search_request("search_books", query, page_size, page_token)
+        hits, next_page_token = build_page(
+            search_kind("search_books", query), await self.repository.search_books(query, fetch_limit(limit), after), limit, search_sort_key
+        )
+        logger.info("Found %s matching books.", len(hits))
+        return hits, next_page_token
+
+    async def suggest_books(self, query: str, limit: int = 0):
+        # Answered from the in-process index; nothing here awaits.
+        logger.info("Suggesting books for '%s' with limit %s.", query, limit)
+        query, limit = resolve_suggest_request(query, limit)
+        suggestions = book_typeahead.suggest(query, limit)
+        logger.info("Found %s book suggestions.", len(suggestions))
+        return suggestions
+
+    async def list_books(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing books with page size %s.", page_size)
+        limit, after = resolve_page_request("books", page_size, page_token)
+        books, next_page_token = build_page(
+            "books", await self.repository.list_books(fetch_limit(limit), after), limit, book_sort_key
+        )
+        logger.info("Found %s books.", len(books))
+        return books, next_page_token
+
+    def stream_books(self, batch_size: int = 0):
+        batch_size = resolve_batch_size(batch_size)
+        logger.info("Streaming all books in batches of %s.", batch_size)
+        return self.repository.iter_books(batch_size)
+
+    async def list_available_books(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing available books with page size %s.", page_size)
+        limit, after = resolve_page_request("available_books", page_size, page_token)
+        books, next_page_token = build_page(
+            "available_books", await self.repository.list_available_books(fetch_limit(limit), after), limit, book_sort_key
+        )
+        logger.info("Found %s available books.", len(books))
+        return books, next_page_token
+
+    async def search_members(self, query: str, page_size: int = 0, page_token: str = ""):
+        logger.info("Searching members for '%s' with page size %s.", query, page_size)
+        query, limit, after = resolve_search_request("search_members", query, page_size, page_token)
+        hits, next_page_token = build_page(
+            search_kind("search_members", query), await self.repository.search_members(query, fetch_limit(limit), after), limit, search_sort_key
+        )
+        logger.info("Found %s matching members.", len(hits))
+        return hits, next_page_token
+
+    async def list_members(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing members with page size %s.", page_size)
+        limit, after = resolve_page_request("members", page_size, page_token)
+        members, next_page_token = build_page(
+            "members", await self.repository.list_all_members(fetch_limit(limit), after), limit, member_sort_key
+        )
+        logger.info("Found %s members.", len(members))
+        return members, next_page_token
+
+    def stream_members(self, batch_size: int = 0):
+        batch_size = resolve_batch_size(batch_size)
+        logger.info("Streaming all members in batches of %s.", batch_size)
+        return self.repository.iter_members(batch_size)
+
+    async def create_member(self, name: str, email: str):
+        logger.info("Creating member with name: %s", name)
+        if not all([name, email]):
+            raise ValueError("Name and email are required for creating a member.")
+
+        if not is_valid_email(email):
+            raise ValueError("Invalid email format.")
+
+        existing_member = await self.repository.get_member_by_email(email)
+        if existing_member:
+            raise grpc.RpcError(grpc.StatusCode.ALREADY_EXISTS, f"Member with email {email} already exists.")
+        member = await self.repository.create_member(name, email)
+        logger.info("Member '%s' created successfully.", name)
+        return member
+
+    async def batch_create_members(self, members):
+        logger.info("Batch creating %s members.", len(members))
+        results, rows, pending = plan_batch(members, member_row, "email", "member")
+        created = await self.repository.bulk_create_members(rows) if rows else []
+        logger.info("Batch created %s of %s members.", len(created), len(members))
+        return complete_batch(results, created, pending, "email", "member")
+
+    async def batch_get_members(self, member_ids):
+        logger.info("Batch getting %s members.", len(member_ids))
+        members = await self.repository.get_members_by_ids(unique_batch_ids(member_ids, "member"))
+        logger.info("Found %s members.", len(members))
+        return in_request_order(member_ids, members)
+
+    async def update_member(self, member_id: str, name: str, email: str, expected_version: int = 0):
+        logger.info("Updating member with id: %s", member_id)
+        if not all([member_id, name, email]):
+            raise ValueError("All fields are required for updating a member.")
+        validate_expected_version(expected_version)
+        if not is_valid_email(email):
+            raise ValueError("Invalid email format.")
+
+        existing_member_with_email = await self.repository.get_member_by_email(email)
+        if existing_member_with_email and existing_member_with_email.id != member_id:
+            raise grpc.RpcError(grpc.StatusCode.ALREADY_EXISTS, f"Another member with email {email} already exists.")
+        updated_member, previous_version = await self.repository.update_member(member_id, name, email, expected_version)
+        if not updated_member:
+            if previous_version is None:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
+            raise version_conflict("Member", member_id, expected_version)
+        logger.info("Member with id '%s' updated successfully.", member_id)
+        return updated_member
+
+    async def delete_member(self, member_id: str) -> bool:
+        logger.info("Deleting member with id: %s", member_id)
+        if not member_id:
+            raise ValueError("Member ID is required for deleting a member.")
+        result = await self.repository.delete_member(member_id)
+        if not result:
+            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
+        logger.info("Member with id '%s' deleted successfully.", member_id)
+        return result
+
+    async def get_member(self, member_id: str):
+        logger.info("Getting member with id: %s", member_id)
+        if not member_id:
+            raise ValueError("Member ID is required for getting a member.")
+        member = await self.repository.get_member_by_id(member_id)
+        if not member:
+            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
+        logger.info("Member with id '%s' retrieved successfully.", member_id)
+        return member
+
+    async def borrow_book(self, book_id: str, member_id: str):
+        logger.info("Borrowing book with id: %s for member: %s", book_id, member_id)
+        if not all([book_id, member_id]):
+            raise ValueError("Book ID and Member ID are required for borrowing a book.")
+
+        # Availability check, flag flip and insert happen in one statement, so two concurrent
+        # borrows of the same book cannot both succeed.
+        borrow_record, book_available, member_exists = await self.repository.borrow_book_if_available(book_id, member_id)
+        if not borrow_record:
+            if book_available is None:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
+            if book_available and not member_exists:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
+            raise grpc.RpcError(grpc.StatusCode.FAILED_PRECONDITION, f"Book with id {book_id} is not available.")
+        logger.info("Book with id '%s' borrowed by member with id '%s' successfully.", book_id, member_id)
+        return borrow_record
+
+    async def return_book(self, borrow_record_id: str):
+        logger.info("Returning book for borrow record id: %s", borrow_record_id)
+        if not borrow_record_id:
+            raise ValueError("Borrow record ID is required for returning a book.")
+
+        updated_borrow_record, previous_status = await self.repository.return_borrowed_book(borrow_record_id)
+        if not updated_borrow_record:
+            if previous_status is None:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Borrow record with id {borrow_record_id} not found.")
+            raise grpc.RpcError(grpc.StatusCode.FAILED_PRECONDITION, f"Book for borrow record id {borrow_record_id} has already been returned.")
+        logger.info("Book for borrow record id '%s' returned successfully.", borrow_record_id)
+        return updated_borrow_record
+
+    async def list_borrowings(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing borrowing records with page size %s.", page_size)
+        limit, after = resolve_page_request("borrowings", page_size, page_token, parse_borrowing_sort_key)
+        borrow_records, next_page_token = build_page(
+            "borrowings", await self.repository.list_all_borrowings(fetch_limit(limit), after), limit, borrowing_sort_key
+        )
+        logger.info("Found %s borrowing records.", len(borrow_records))
+        return borrow_records, next_page_token
+
+    def stream_borrowings(self, batch_size: int = 0):
+        batch_size = resolve_batch_size(batch_size)
+        logger.info("Streaming all borrowing records in batches of %s.", batch_size)
+        return self.repository.iter_borrowings(batch_size)
+
+    def export_data(self, dataset: str, file_format: str):
+        logger.info("Exporting %s as %s.", dataset, file_format)
+        validate_export(dataset, file_format)
+        return stream_copy_async(lambda output: self.repository.copy_export(dataset, file_format, output))
+
+    async def list_changes_since(self, entity: str, version: int, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing %s changed since version %s with page size %s.", entity, version, page_size)
+        validate_sync_entity(entity)
+        limit, after, before = resolve_changes_request(entity, version, page_size, page_token)
+        if before is None:
+            before = await self.repository.change_watermark()
+        else:
+            await self.repository.ensure_replayed(before)
+        rows = await self.repository.list_changes_since(entity, before, fetch_limit(limit), after, deletions=version > 0)
+        changed, deleted_ids, next_version, next_page_token = changes_page(entity, version, rows, limit, before)
+        logger.info("Found %s changed and %s deleted %s.", len(changed), len(deleted_ids), entity)
+        return changed, deleted_ids, next_version, next_page_token
@@ -0,0 +1,65 @@
+from app.config import MAX_BATCH_SIZE
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import grpc
+
+
+def plan_batch(items: Sequence, to_row: Callable, unique_field: str, entity: str) -> Tuple[List, List[dict], Dict]:
+    """
+    Validates the items of a batch create with to_row and drops repeats of the unique field.
+    Returns the per-item results (an exception for rejected items, None for rows still to be
+    inserted), the rows to insert and the item index of each row keyed by its unique value.
+    """
+    if not items:
+        raise ValueError(f"At least one {entity} is required.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} items are allowed per batch.")
+
+    results = [None] * len(items)
+    rows = []
+    pending = {}
+    for index, item in enumerate(items):
+        try:
+            row = to_row(*item)
+        except ValueError as e:
+            results[index] = e
+            continue
+        key = row[unique_field]
+        if key in pending:
+            results[index] = grpc.RpcError(grpc.StatusCode.ALREADY_EXISTS, f"Duplicate {unique_field} {key} in batch.")
+            continue
+        pending[key] = index
+        rows.append(row)
+    return results, rows, pending
+
+
+def complete_batch(results: List, created: Sequence, pending: Dict, unique_field: str, entity: str) -> List:
+    """
+    Fills in the results of plan_batch with the created entities. Rows that the insert skipped
+    because of a conflict on the unique field are reported as ALREADY_EXISTS.
+    """
+    for obj in created:
+        results[pending.pop(getattr(obj, unique_field))] = obj
+    for key, index in pending.items():
+        results[index] = grpc.RpcError(grpc.StatusCode.ALREADY_EXISTS, f"{entity.capitalize()} with {unique_field} {key} already exists.")
+    return results
+
+
+def unique_batch_ids(ids: Sequence[str], entity: str) -> List[str]:
+    """
+    Validates the ids of a batch lookup and returns them without repeats, in request order.
+    """
+    if not ids:
+        raise ValueError(f"At least one {entity} id is required.")
+    if len(ids) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} items are allowed per batch.")
+    if not all(ids):
+        raise ValueError(f"{entity.capitalize()} ids must not be empty.")
+    return list(dict.fromkeys(ids))
+
+
+def in_request_order(ids: Sequence[str], found: Sequence) -> List[Tuple[str, Optional[object]]]:
+    """
+    Pairs every requested id with its entity, or None when it was not found.
+    """
+    by_id = {obj.id: obj for obj in found}
+    return [(entity_id, by_id.get(entity_id)) for entity_id in ids]
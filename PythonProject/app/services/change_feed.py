@@ -0,0 +1,582 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from app.config import (
+    STREAM_BATCH_SIZE,
+    WATCH_HEARTBEAT_SECONDS,
+    WATCH_QUEUE_SIZE,
+    WATCH_MAX_SUBSCRIBERS,
+    WATCH_MAX_CATCH_UP,
+    CHANGE_RETENTION_HOURS,
+)
+from app.db import database
+from app.db.changes import BOOKS, BORROWINGS, CHANNEL
+from app.db.database import get_db_session
+from app.db.models import ChangeKind
+from app.repositories.entity_cache import follow_changes, invalidate_changed
+from app.repositories.library_repository import LibraryRepository
+from app.services.pagination import decode_page_token, encode_page_token
+import asyncio
+import grpc
+import logging
+import os
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Entities of every topic by id, as (repository method, ids) -> entities.
+_LOADERS = {
+    BOOKS: LibraryRepository.get_books_by_ids,
+    BORROWINGS: LibraryRepository.get_borrow_records_by_ids,
+}
+# Poll again this soon while notified changes are held back behind an older open transaction.
+_HELD_BACK_RETRY_SECONDS = 0.1
+# Warn this often while changes stay held back.
+_HELD_BACK_WARNING_SECONDS = 60
+_RECONNECT_SECONDS = 1
+_PRUNE_INTERVAL_SECONDS = 3600
+# Events are pruned by created_at, the start of their transaction, which may be somewhat older
+# than the watermark of a resume token that still needs them.
+_PRUNE_SLACK_SECONDS = 3600
+
+
+@dataclass
+class Change:
+    kind: ChangeKind
+    entity_id: str
+    # Current state of the entity; None once it is deleted.
+    entity: object
+
+
+def collapse(created: bool, availability_only: bool, entity) -> ChangeKind:
+    """
+    The kind of change reported for an entity, given whether any of its events in the range
+    created it and whether all of them only flipped its availability.
+    """
+    if entity is None:
+        return ChangeKind.DELETED
+    if created:
+        return ChangeKind.CREATED
+    if availability_only:
+        return ChangeKind.AVAILABILITY
+    return ChangeKind.UPDATED
+
+
+def encode_resume_token(topic: str, watermark: int, issued_at: float) -> str:
+    return encode_page_token(f"watch_{topic}", [watermark, issued_at])
+
+
+def decode_resume_token(topic: str, resume_token: str, retention_seconds: float) -> Tuple[int, float]:
+    """
+    Returns the watermark of a resume token and when it was issued. Tokens older than the
+    retention of change events cannot be resumed: the changes after them may be gone.
+    """
+    try:
+        watermark, issued_at = decode_page_token(f"watch_{topic}", resume_token)
+        if not isinstance(watermark, int) or not isinstance(issued_at, (int, float)):
+            raise ValueError
+    except ValueError:
+        raise ValueError("Invalid resume_token.")
+    if time.time() - issued_at > retention_seconds:
+        raise grpc.RpcError(grpc.StatusCode.OUT_OF_RANGE, "The resume_token has expired; reload and watch again.")
+    return watermark, issued_at
+
+
+class ChangeBatch:
+    """
+    Changes of one read of the change feed, by topic, and the resume token watermark after it.
+    A large read is split into several batches; all but the last keep the previous watermark, so
+    resuming after any of them reads the whole range again. Responses are built once per topic and
+    shared by every subscriber.
+    """
+
+    def __init__(self, changes: Dict[str, List[Change]], watermark: int, end: int, issued_at: float):
+        self.changes = changes
+        self.watermark = watermark
+        # Upper bound (exclusive) of the txid range the changes were read from.
+        self.end = end
+        self.issued_at = issued_at
+        self._responses: Dict[str, bytes] = {}
+
+    def resume_token(self, topic: str) -> str:
+        return encode_resume_token(topic, self.watermark, self.issued_at)
+
+    def response(self, topic: str, build: Callable) -> bytes:
+        """
+        The serialized response of topic, built with build(changes, resume_token).
+        """
+        response = self._responses.get(topic)
+        if response is None:
+            response = self._responses[topic] = build(self.changes.get(topic, []), self.resume_token(topic)).SerializeToString()
+        return response
+
+
+class Subscription:
+    """
+    The batches of the change feed for one Watch stream, read by the thread of the stream. The
+    feed thread delivers them; a subscriber more than queue_size batches behind is dropped.
+    """
+
+    def __init__(self, feed: "ChangeFeed", topic: str, after: Optional[int], issued_at: Optional[float]):
+        self.feed = feed
+        self.topic = topic
+        # Watermark of the resume token, then of the feed once registered.
+        self.after = after
+        self.issued_at = issued_at
+        self.closed = False
+        self._batches: Deque[ChangeBatch] = deque()
+        self._error: Optional[Exception] = None
+        self._delivered_at = 0.0
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+
+    def wants(self, batch: ChangeBatch) -> bool:
+        # Changes of the topic, a heartbeat, or something to refresh the resume token with now and then.
+        return bool(batch.changes.get(self.topic)) or not batch.changes or time.monotonic() - self._delivered_at >= self.feed.heartbeat_seconds
+
+    def deliver(self, batch: ChangeBatch) -> bool:
+        """
+        Queues batch; returns False if the subscription is closed or was dropped for falling behind.
+        """
+        with self._lock:
+            if self.closed or self._error is not None:
+                return False
+            if len(self._batches) >= self.feed.queue_size:
+                self._error = grpc.RpcError(grpc.StatusCode.ABORTED, "The stream fell behind; resume with the last resume_token.")
+            else:
+                self._batches.append(batch)
+                self._delivered_at = time.monotonic()
+            delivered = self._error is None
+        self._wake()
+        return delivered
+
+    def fail(self, error: Exception) -> None:
+        with self._lock:
+            self._error = self._error or error
+        self._wake()
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+        self.feed.unsubscribe(self)
+        self._wake()
+
+    def _next(self) -> Optional[ChangeBatch]:
+        # Called with the lock held: the next batch, None at the end, or the error that ended it.
+        if self._batches:
+            return self._batches.popleft()
+        if self._error is not None:
+            raise self._error
+        return None
+
+    def _wake(self) -> None:
+        with self._lock:
+            self._ready.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self._lock:
+                while not (self._batches or self._error is not None or self.closed):
+                    self._ready.wait()
+                batch = self._next()
+            if batch is None:
+                return
+            yield batch
+
+
+class AsyncSubscription(Subscription):
+    """
+    Subscription read by a coroutine of the grpc.aio server; the feed thread wakes it on its loop.
+    """
+
+    def __init__(self, feed: "ChangeFeed", topic: str, after: Optional[int], issued_at: Optional[float]):
+        super().__init__(feed, topic, after, issued_at)
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def _wake(self) -> None:
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    async def __aiter__(self):
+        while True:
+            with self._lock:
+                waiting = not (self._batches or self._error is not None or self.closed)
+                if waiting:
+                    self._event.clear()
+                else:
+                    batch = self._next()
+            if waiting:
+                await self._event.wait()
+            elif batch is None:
+                return
+            else:
+                yield batch
+
+
+class ChangeFeed:
+    """
+    Reads the change_events outbox and fans the changes out to the Watch streams of this process.
+
+    One thread per process LISTENs on a dedicated connection and, when a transaction with change
+    events commits, reads the entities changed since its watermark (see app.db.changes) and
+    publishes their current state. The same thread registers new subscribers and reads their
+    catch-up from a resume token, so every subscriber sees entity states in the order they were
+    read and never an older state after a newer one. Delivery is at least once: an entity may be
+    sent again with the same state.
+
+    Commit followers (see follow_commits) are told which entities a transaction changed as soon
+    as its notification arrives, without waiting for the watermark. Change followers (see
+    follow_changes) get the same batches as the Watch streams, to keep state of their own current.
+    """
+
+    def __init__(self, max_subscribers: int, queue_size: int, heartbeat_seconds: float, max_catch_up: int, retention_seconds: float):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_catch_up = max_catch_up
+        self.retention_seconds = retention_seconds
+        self.watermark: Optional[int] = None
+        self._watermark_at = 0.0
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._registrations: Deque[Subscription] = deque()
+        self._pid = None
+        self._listening = False
+        self._wake_read = self._wake_write = None
+        self._changes_total = 0
+        self._dropped_total = 0
+        # (changed, listening) callbacks of follow_commits; kept across fork.
+        self._commit_followers: List[Tuple[Callable, Callable]] = []
+        # (changed, reload) callbacks of follow_changes; kept across fork.
+        self._change_followers: List[Tuple[Callable, Callable]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._pid == os.getpid()
+
+    @property
+    def listening(self) -> bool:
+        """
+        Whether the feed thread of this process holds its LISTEN connection, so commits reach it.
+        """
+        return self.running and self._listening
+
+    def start(self) -> None:
+        """
+        Starts the feed thread of this process; servers call it after fork, once per process.
+        """
+        if self.running:
+            return
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._registrations = deque()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        threading.Thread(target=self._run, name="change-feed", daemon=True).start()
+        logger.info("Change feed started.")
+
+    def follow_commits(self, changed: Callable, listening: Callable) -> None:
+        """
+        Calls changed(changes) with the (topic, entity_id) pairs of every committed transaction with
+        change events, whichever process wrote it, as soon as its notification arrives; and
+        listening(True) or listening(False) when the feed starts or stops receiving notifications.
+        Writes made while it is not listening are never passed to changed. Register before start().
+        """
+        if (changed, listening) not in self._commit_followers:
+            self._commit_followers.append((changed, listening))
+
+    def follow_changes(self, changed: Callable, reload: Callable) -> None:
+        """
+        Calls changed(changes) with the changes by topic of every read of the feed, in order,
+        starting from its watermark; see start_from. If the watermark is older than the retention
+        of change events when the feed connects, the changes since may be gone: reload() is
+        called instead, to rebuild the state from the tables. Register before start().
+        """
+        if (changed, reload) not in self._change_followers:
+            self._change_followers.append((changed, reload))
+
+    def start_from(self, watermark: int, at: Optional[float] = None) -> None:
+        """
+        Makes the feed read the changes after watermark, taken at time at, rather than from when it
+        connects; for state loaded from the tables before the feed starts. Prefork workers inherit it.
+        """
+        self.watermark, self._watermark_at = watermark, time.time() if at is None else at
+
+    def subscribe(self, topic: str, resume_token: str, subscription_class=Subscription) -> Subscription:
+        """
+        Subscribes to the changes of topic after resume_token, or from now on without one. The
+        first batch is either the catch-up or an empty one with a resume token for now. Refused
+        with UNAVAILABLE while the feed is not listening, as the stream would only get heartbeats.
+        """
+        if not self.listening:
+            raise grpc.RpcError(grpc.StatusCode.UNAVAILABLE, "Change streams are not available; try again later.")
+        after = issued_at = None
+        if resume_token:
+            after, issued_at = decode_resume_token(topic, resume_token, self.retention_seconds)
+        with self._lock:
+            if len(self._subscriptions) + len(self._registrations) >= self.max_subscribers:
+                raise grpc.RpcError(grpc.StatusCode.RESOURCE_EXHAUSTED, "Too many change streams; try again later.")
+            subscription = subscription_class(self, topic, after, issued_at)
+            self._registrations.append(subscription)
+        self._wake()
+        logger.info("Subscribed to %s changes after %s", topic, after)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            subscribers = len(self._subscriptions) + len(self._registrations)
+        return {"subscribers": subscribers, "changes": self._changes_total, "dropped": self._dropped_total}
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            pass  # Already awake.
+
+    def _run(self) -> None:
+        while True:
+            connection = None
+            try:
+                connection = self._listen()
+                self._serve(connection)
+            except Exception as e:
+                logger.warning("Change feed lost its connection; reconnecting in %ss: %s", _RECONNECT_SECONDS, e)
+            finally:
+                self._set_listening(False)
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            time.sleep(_RECONNECT_SECONDS)
+
+    def _listen(self):
+        # A connection of its own, taken out of the pool for good: it stays idle between polls so
+        # notifications can arrive, and LISTEN must not leak into RPC transactions.
+        connection = database.engine.raw_connection()
+        driver_connection = connection.driver_connection
+        connection.detach()
+        driver_connection.rollback()
+        driver_connection.autocommit = True
+        with driver_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        if self.watermark is None:
+            with get_db_session() as db_session:
+                self.watermark = LibraryRepository(db_session).change_watermark()
+            self._watermark_at = time.time()
+        elif self._change_followers and time.time() - self._watermark_at > self.retention_seconds:
+            self._reload_followers()
+        self._set_listening(True)
+        logger.info("Change feed listening on %s from watermark %s", CHANNEL, self.watermark)
+        return driver_connection
+
+    def _set_listening(self, listening: bool) -> None:
+        self._listening = listening
+        for _, set_listening in self._commit_followers:
+            set_listening(listening)
+
+    def _reload_followers(self) -> None:
+        # A worker restarted long after its parent loaded the state it inherited. The watermark is
+        # moved first, so changes committed while reloading are applied again afterwards.
+        logger.warning("Change feed watermark %s is older than the retention of change events; reloading.", self.watermark)
+        with get_db_session() as db_session:
+            self.watermark = LibraryRepository(db_session).change_watermark()
+        self._watermark_at = time.time()
+        for _, reload in self._change_followers:
+            reload()
+
+    def _follow(self, txids: List[int]) -> None:
+        with get_db_session() as db_session:
+            changes = LibraryRepository(db_session).get_committed_changes(txids)
+        for changed, _ in self._commit_followers:
+            changed(changes)
+
+    def _serve(self, driver_connection) -> None:
+        notified = None
+        # Catch up on whatever committed while there was no connection.
+        poll_at = time.monotonic()
+        published_at = time.monotonic()
+        prune_at = time.monotonic()
+        held_back_since = None
+        while True:
+            self._register_pending()
+            now = time.monotonic()
+            deadlines = [published_at + self.heartbeat_seconds, prune_at]
+            if poll_at is not None:
+                deadlines.append(poll_at)
+            readable, _, _ = select.select([driver_connection, self._wake_read], [], [], max(0.0, min(deadlines) - now))
+            if self._wake_read in readable:
+                while True:
+                    try:
+                        if not os.read(self._wake_read, 4096):
+                            break
+                    except BlockingIOError:
+                        break
+            if driver_connection in readable:
+                driver_connection.poll()
+                committed = []
+                while driver_connection.notifies:
+                    txid = int(driver_connection.notifies.pop().payload)
+                    committed.append(txid)
+                    notified = txid if notified is None else max(notified, txid)
+                    poll_at = poll_at or time.monotonic()
+                if committed and self._commit_followers:
+                    self._follow(committed)
+
+            now = time.monotonic()
+            heartbeat = now >= published_at + self.heartbeat_seconds
+            if heartbeat or (poll_at is not None and now >= poll_at):
+                if self._poll(heartbeat):
+                    published_at = time.monotonic()
+                poll_at = None
+                # The notified transaction committed, but an older one that is still open keeps the
+                # watermark below it; its changes are read once that one ends.
+                if notified is not None and notified >= self.watermark:
+                    poll_at = time.monotonic() + _HELD_BACK_RETRY_SECONDS
+                    if held_back_since is None:
+                        held_back_since = now
+                    elif now - held_back_since >= _HELD_BACK_WARNING_SECONDS:
+                        logger.warning(
+                            "Changes of transaction %s have been held back for %.0fs behind an open transaction older than %s.",
+                            notified, now - held_back_since, self.watermark,
+                        )
+                        held_back_since = now
+                else:
+                    held_back_since = None
+            if now >= prune_at:
+                self._prune()
+                prune_at = now + _PRUNE_INTERVAL_SECONDS
+
+    def _load(self, repo: LibraryRepository, rows) -> Dict[str, List[Change]]:
+        # Current state of the entities of rows of changes_statement, as changes by topic.
+        rows_by_topic = defaultdict(list)
+        for row in rows:
+            rows_by_topic[row.topic].append(row)
+        changes = {}
+        for topic, topic_rows in rows_by_topic.items():
+            load = _LOADERS.get(topic)
+            if load is None:
+                continue
+            entities = {entity.id: entity for entity in load(repo, [row.entity_id for row in topic_rows])}
+            changes[topic] = [
+                Change(collapse(row.created, row.availability_only, entities.get(row.entity_id)), row.entity_id, entities.get(row.entity_id))
+                for row in topic_rows
+            ]
+        return changes
+
+    def _poll(self, heartbeat: bool) -> bool:
+        """
+        Publishes the changes since the watermark and moves it up; with heartbeat, publishes an
+        empty batch if there are none. Returns whether anything was published.
+        """
+        after, after_at = self.watermark, self._watermark_at
+        published = False
+        with get_db_session() as db_session:
+            repo = LibraryRepository(db_session)
+            before = max(repo.change_watermark(), after)
+            pending = None
+            # Every batch but the last keeps the old watermark.
+            for rows in repo.iter_changes(after, before, STREAM_BATCH_SIZE):
+                if pending is not None:
+                    self._publish(ChangeBatch(pending, after, before, after_at))
+                pending = self._load(repo, rows)
+            now = time.time()
+            if pending is not None or heartbeat:
+                self._publish(ChangeBatch(pending or {}, before, before, now))
+                published = True
+        self.watermark, self._watermark_at = before, now
+        return published
+
+    def _publish(self, batch: ChangeBatch) -> None:
+        for changed, _ in self._change_followers:
+            changed(batch.changes)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            # A resume token from another process may be ahead of this feed.
+            if batch.end <= subscription.after and (batch.changes or batch.watermark < subscription.after):
+                continue
+            if subscription.wants(batch) and not subscription.deliver(batch):
+                with self._lock:
+                    self._subscriptions.discard(subscription)
+                if not subscription.closed:
+                    self._dropped_total += 1
+                    logger.warning("Dropped a %s change stream that fell behind by %s batches.", subscription.topic, self.queue_size)
+        self._changes_total += sum(len(changes) for changes in batch.changes.values())
+
+    def _register_pending(self) -> None:
+        while True:
+            with self._lock:
+                if not self._registrations:
+                    return
+                subscription = self._registrations.popleft()
+            try:
+                self._register(subscription)
+            except grpc.RpcError as e:
+                subscription.fail(e)
+                continue
+            except Exception as e:
+                logger.warning("Could not start a %s change stream: %s", subscription.topic, e)
+                subscription.fail(e)
+                continue
+            with self._lock:
+                if not subscription.closed:
+                    self._subscriptions.add(subscription)
+
+    def _register(self, subscription: Subscription) -> None:
+        if subscription.after is None or subscription.after >= self.watermark:
+            if subscription.after is None:
+                subscription.after, subscription.issued_at = self.watermark, self._watermark_at
+            subscription.deliver(ChangeBatch({}, subscription.after, subscription.after, subscription.issued_at))
+            return
+        after = subscription.after
+        with get_db_session() as db_session:
+            repo = LibraryRepository(db_session)
+            rows = [
+                row
+                for rows in repo.iter_changes(after, self.watermark, STREAM_BATCH_SIZE, topic=subscription.topic, limit=self.max_catch_up + 1)
+                for row in rows
+            ]
+            if len(rows) <= self.max_catch_up:
+                chunks = [rows[start:start + STREAM_BATCH_SIZE] for start in range(0, len(rows), STREAM_BATCH_SIZE)] or [[]]
+                for index, chunk in enumerate(chunks):
+                    final = index == len(chunks) - 1
+                    batch = ChangeBatch(
+                        self._load(repo, chunk),
+                        self.watermark if final else after,
+                        self.watermark,
+                        self._watermark_at if final else subscription.issued_at,
+                    )
+                    if not subscription.deliver(batch):
+                        return
+        if len(rows) > self.max_catch_up:
+            raise grpc.RpcError(grpc.StatusCode.OUT_OF_RANGE, "Too many changes since the resume_token; reload and watch again.")
+        subscription.after = self.watermark
+        logger.info("Caught up a %s change stream on %s changes since %s", subscription.topic, len(rows), after)
+
+    def _prune(self) -> None:
+        try:
+            with get_db_session() as db_session:
+                LibraryRepository(db_session).prune_changes(self.retention_seconds + _PRUNE_SLACK_SECONDS)
+        except Exception as e:
+            logger.warning("Could not prune change events: %s", e)
+
+
+change_feed = ChangeFeed(
+    WATCH_MAX_SUBSCRIBERS,
+    WATCH_QUEUE_SIZE,
+    WATCH_HEARTBEAT_SECONDS,
+    WATCH_MAX_CATCH_UP,
+    CHANGE_RETENTION_HOURS * 3600,
+)
+# Entity caches of every process drop what any process writes as soon as the write commits.
+change_feed.follow_commits(invalidate_changed, follow_changes)
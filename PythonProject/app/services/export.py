@@ -0,0 +1,135 @@
+from app.config import EXPORT_CHUNK_SIZE
+from app.repositories.library_repository import EXPORT_COLUMNS, EXPORT_COPY_OPTIONS
+from typing import AsyncIterator, Callable, Iterator
+import asyncio
+import queue
+import threading
+
+# Chunks buffered between COPY and the consumer; the producer waits when they are all in use, so
+# a slow client holds at most this many chunks in memory.
+QUEUE_CHUNKS = 8
+
+_DONE = object()
+
+
+def validate_export(dataset: str, file_format: str) -> None:
+    if dataset not in EXPORT_COLUMNS:
+        raise ValueError(f"dataset must be one of {', '.join(EXPORT_COLUMNS)}.")
+    if file_format not in EXPORT_COPY_OPTIONS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_COPY_OPTIONS)}.")
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class _ChunkWriter:
+    # File-like target for copy_expert: collects the rows COPY writes one at a time into chunks.
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event, chunk_size: int):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def put(self, item) -> None:
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+    def close(self) -> None:
+        if self.buffer:
+            self.put(bytes(self.buffer))
+        self.put(_DONE)
+
+
+def stream_copy(copy: Callable, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Runs copy(output) on a helper thread and yields what it writes in chunks of about
+    chunk_size bytes. copy_expert only writes to a file, so the thread turns it into a generator;
+    closing the generator early makes the next write raise and abort the COPY.
+    """
+    chunks = queue.Queue(maxsize=QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    writer = _ChunkWriter(chunks, cancelled, chunk_size)
+    errors = []
+
+    def run():
+        try:
+            copy(writer)
+            writer.close()
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            errors.append(e)
+            try:
+                writer.put(_DONE)
+            except ExportCancelled:
+                pass
+
+    thread = threading.Thread(target=run, name="copy-export", daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                break
+            yield chunk
+        if errors:
+            raise errors[0]
+    finally:
+        cancelled.set()
+        thread.join()
+
+
+async def stream_copy_async(copy: Callable, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    asyncio counterpart of stream_copy: copy(output) runs as a task and awaits output(data) for
+    the data it receives, which waits while the consumer is behind.
+    """
+    chunks = asyncio.Queue(maxsize=QUEUE_CHUNKS)
+    buffer = bytearray()
+    errors = []
+
+    async def output(data: bytes) -> None:
+        buffer.extend(data)
+        if len(buffer) >= chunk_size:
+            await chunks.put(bytes(buffer))
+            buffer.clear()
+
+    async def run():
+        try:
+            await copy(output)
+            if buffer:
+                await chunks.put(bytes(buffer))
+        except Exception as e:
+            errors.append(e)
+        await chunks.put(_DONE)
+
+    task = asyncio.ensure_future(run())
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is _DONE:
+                break
+            yield chunk
+        if errors:
+            raise errors[0]
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
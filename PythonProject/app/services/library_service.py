@@ -1,46 +1,142 @@
-from app.repositories.library_repository import LibraryRepository
-from app.db.models import BorrowingStatus
+from app.repositories.library_repository import LibraryRepository, SYNC_MODELS
 from datetime import date, datetime
-from app.logging_service import logger
+from app.config import STREAM_BATCH_SIZE, MAX_STREAM_BATCH_SIZE
+from app.services.pagination import (
+    resolve_page_request,
+    resolve_search_request,
+    resolve_changes_request,
+    changes_kind,
+    search_kind,
+    search_sort_key,
+    build_page,
+    fetch_limit,
+)
+from app.services.batch import plan_batch, complete_batch, unique_batch_ids, in_request_order
+from app.services.typeahead import book_typeahead, resolve_suggest_request
+from app.services.export import validate_export, stream_copy
 import grpc
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
+def parse_published_date(published_date: str) -> date:
+    try:
+        return datetime.strptime(published_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("Invalid date format for published_date. Use YYYY-MM-DD.")
+
+def is_valid_email(email: str) -> bool:
+    return bool(re.match(r"[^@]+@[^@]+\.[^@]+", email))
+
+def book_row(title: str, author: str, published_date: str, isbn: str) -> dict:
+    if not all([title, author, published_date, isbn]):
+        raise ValueError("All fields are required for creating a book.")
+    return dict(title=title, author=author, published_date=parse_published_date(published_date), isbn=isbn)
+
+def member_row(name: str, email: str) -> dict:
+    if not all([name, email]):
+        raise ValueError("Name and email are required for creating a member.")
+    if not is_valid_email(email):
+        raise ValueError("Invalid email format.")
+    return dict(name=name, email=email)
+
+def resolve_batch_size(batch_size: int) -> int:
+    if batch_size < 0:
+        raise ValueError("batch_size must not be negative.")
+    if batch_size == 0:
+        return STREAM_BATCH_SIZE
+    return min(batch_size, MAX_STREAM_BATCH_SIZE)
+
+def book_sort_key(book):
+    return [book.title, book.id]
+
+def member_sort_key(member):
+    return [member.name, member.id]
+
+def borrowing_sort_key(borrow_record):
+    return [borrow_record.borrow_date.isoformat(), borrow_record.id]
+
+def parse_borrowing_sort_key(key):
+    return [date.fromisoformat(key[0]), key[1]]
+
+def validate_expected_version(expected_version: int) -> None:
+    if expected_version < 0:
+        raise ValueError("expected_version must not be negative.")
+
+def version_conflict(entity: str, entity_id: str, expected_version: int) -> grpc.RpcError:
+    # Only raised for a row that exists, so the version check is what failed.
+    return grpc.RpcError(
+        grpc.StatusCode.ABORTED,
+        f"{entity} with id {entity_id} was changed after version {expected_version}; read it again and retry.",
+    )
+
+def validate_sync_entity(entity: str) -> None:
+    if entity not in SYNC_MODELS:
+        raise ValueError(f"entity must be one of {', '.join(SYNC_MODELS)}.")
+
+def changes_page(entity: str, version: int, rows, limit, before: int):
+    """
+    Trims rows of list_changes_since to the page and splits them into the changed rows and the
+    deleted ids, followed by the version to sync from next time and the next page token.
+    """
+    rows, next_page_token = build_page(changes_kind(entity, version), rows, limit, lambda row: [row.version, row.id, before])
+    changed = [row[0] for row in rows if not row.deleted]
+    deleted_ids = [row.id for row in rows if row.deleted]
+    # Only a complete pass moves the client on; one that stops halfway starts over from version.
+    next_version = version if next_page_token else max(version, before)
+    return changed, deleted_ids, next_version, next_page_token
+
 class LibraryService:
     def __init__(self, repository: LibraryRepository):
         self.repository = repository
 
     def create_book(self, title: str, author: str, published_date: str, isbn: str):
-        logger.info(f"Creating book with title: {title} and author: {author} and published date: {published_date} and isbn: {isbn}")
+        logger.info(
+            "Creating book with title: %s and author: %s and published date: %s and isbn: %s",
+            title, author, published_date, isbn,
+        )
         if not all([title, author, published_date, isbn]):
             raise ValueError("All fields are required for creating a book.")
-        try:
-            published_date_obj = datetime.strptime(published_date, "%Y-%m-%d").date()
-        except ValueError:
-            raise ValueError("Invalid date format for published_date. Use YYYY-MM-DD.")
+        published_date_obj = parse_published_date(published_date)
         book = self.repository.create_book(title, author, published_date_obj, isbn)
-        logger.info(f"Book '{title}' created successfully.")
+        logger.info("Book '%s' created successfully.", title)
         return book
 
-    def update_book(self, book_id: str, title: str, author: str, published_date: str, isbn: str):
-        logger.info(f"Updating book with id: {book_id}")
+    def batch_create_books(self, books):
+        """
+        Creates (title, author, published_date, isbn) items in one INSERT. Returns a Book or the
+        exception that rejected the item for each item, in request order.
+        """
+        logger.info("Batch creating %s books.", len(books))
+        results, rows, pending = plan_batch(books, book_row, "isbn", "book")
+        created = self.repository.bulk_create_books(rows) if rows else []
+        logger.info("Batch created %s of %s books.", len(created), len(books))
+        return complete_batch(results, created, pending, "isbn", "book")
+
+    def batch_get_books(self, book_ids):
+        logger.info("Batch getting %s books.", len(book_ids))
+        books = self.repository.get_books_by_ids(unique_batch_ids(book_ids, "book"))
+        logger.info("Found %s books.", len(books))
+        return in_request_order(book_ids, books)
+
+    def update_book(self, book_id: str, title: str, author: str, published_date: str, isbn: str, expected_version: int = 0):
+        logger.info("Updating book with id: %s", book_id)
         if not all([book_id, title, author, published_date, isbn]):
             raise ValueError("All fields are required for updating a book.")
-        
-        book = self.repository.get_book_by_id(book_id)
-        if not book:
-            return None
-        
-        try:
-            published_date_obj = datetime.strptime(published_date, "%Y-%m-%d").date()
-        except ValueError:
-            raise ValueError("Invalid date format for published_date. Use YYYY-MM-DD.")
+        validate_expected_version(expected_version)
+        published_date_obj = parse_published_date(published_date)
 
-        updated_book = self.repository.update_book(book_id, title, author, published_date_obj, isbn)
-        logger.info(f"Book with id '{book_id}' updated successfully.")
+        updated_book, previous_version = self.repository.update_book(book_id, title, author, published_date_obj, isbn, expected_version)
+        if not updated_book:
+            if previous_version is None:
+                return None
+            raise version_conflict("Book", book_id, expected_version)
+        logger.info("Book with id '%s' updated successfully.", book_id)
         return updated_book
 
     def delete_book(self, book_id: str) -> bool:
-        logger.info(f"Deleting book with id: {book_id}")
+        logger.info("Deleting book with id: %s", book_id)
         if not book_id:
             raise ValueError("Book ID is required for deleting a book.")
         
@@ -49,131 +145,215 @@ class LibraryService:
             raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
             
         result = self.repository.delete_book(book_id)
-        logger.info(f"Book with id '{book_id}' deleted successfully.")
+        logger.info("Book with id '%s' deleted successfully.", book_id)
         return result
 
     def get_book(self, book_id: str):
-        logger.info(f"Getting book with id: {book_id}")
+        logger.info("Getting book with id: %s", book_id)
         if not book_id:
             raise ValueError("Book ID is required for getting a book.")
         book = self.repository.get_book_by_id(book_id)
         if not book:
             raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
-        logger.info(f"Book with id '{book_id}' retrieved successfully.")
+        logger.info("Book with id '%s' retrieved successfully.", book_id)
         return book
 
-    def list_books(self):
-        logger.info("Listing all books.")
-        books = self.repository.list_books()
-        logger.info(f"Found {len(books)} books.")
-        return books
+    def search_books(self, query: str, page_size: int = 0, page_token: str = ""):
+        logger.info("Searching books for '%s' with page size %s.", query, page_size)
+        query, limit, after = resolve_search_request("search_books", query, page_size, page_token)
+        hits, next_page_token = build_page(
+            search_kind("search_books", query), self.repository.search_books(query, fetch_limit(limit), after), limit, search_sort_key
+        )
+        logger.info("Found %s matching books.", len(hits))
+        return hits, next_page_token
+
+    def suggest_books(self, query: str, limit: int = 0):
+        logger.info("Suggesting books for '%s' with limit %s.", query, limit)
+        query, limit = resolve_suggest_request(query, limit)
+        suggestions = book_typeahead.suggest(query, limit)
+        logger.info("Found %s book suggestions.", len(suggestions))
+        return suggestions
+
+    def list_books(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing books with page size %s.", page_size)
+        limit, after = resolve_page_request("books", page_size, page_token)
+        books, next_page_token = build_page(
+            "books", self.repository.list_books(fetch_limit(limit), after), limit, book_sort_key
+        )
+        logger.info("Found %s books.", len(books))
+        return books, next_page_token
+
+    def stream_books(self, batch_size: int = 0):
+        batch_size = resolve_batch_size(batch_size)
+        logger.info("Streaming all books in batches of %s.", batch_size)
+        return self.repository.iter_books(batch_size)
+
+    def list_available_books(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing available books with page size %s.", page_size)
+        limit, after = resolve_page_request("available_books", page_size, page_token)
+        books, next_page_token = build_page(
+            "available_books", self.repository.list_available_books(fetch_limit(limit), after), limit, book_sort_key
+        )
+        logger.info("Found %s available books.", len(books))
+        return books, next_page_token
+
+    def search_members(self, query: str, page_size: int = 0, page_token: str = ""):
+        logger.info("Searching members for '%s' with page size %s.", query, page_size)
+        query, limit, after = resolve_search_request("search_members", query, page_size, page_token)
+        hits, next_page_token = build_page(
+            search_kind("search_members", query), self.repository.search_members(query, fetch_limit(limit), after), limit, search_sort_key
+        )
+        logger.info("Found %s matching members.", len(hits))
+        return hits, next_page_token
 
-    def list_available_books(self):
-        logger.info("Listing all available books.")
-        books = self.repository.list_available_books()
-        logger.info(f"Found {len(books)} available books.")
-        return books
+    def list_members(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing members with page size %s.", page_size)
+        limit, after = resolve_page_request("members", page_size, page_token)
+        members, next_page_token = build_page(
+            "members", self.repository.list_all_members(fetch_limit(limit), after), limit, member_sort_key
+        )
+        logger.info("Found %s members.", len(members))
+        return members, next_page_token
 
-    def list_members(self):
-        logger.info("Listing all members.")
-        members = self.repository.list_all_members()
-        logger.info(f"Found {len(members)} members.")
-        return members
+    def stream_members(self, batch_size: int = 0):
+        batch_size = resolve_batch_size(batch_size)
+        logger.info("Streaming all members in batches of %s.", batch_size)
+        return self.repository.iter_members(batch_size)
 
     def create_member(self, name: str, email: str):
-        logger.info(f"Creating member with name: {name}")
+        logger.info("Creating member with name: %s", name)
         if not all([name, email]):
             raise ValueError("Name and email are required for creating a member.")
         
         # Basic email format validation
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        if not is_valid_email(email):
             raise ValueError("Invalid email format.")
 
         existing_member = self.repository.get_member_by_email(email)
         if existing_member:
             raise grpc.RpcError(grpc.StatusCode.ALREADY_EXISTS, f"Member with email {email} already exists.")
         member = self.repository.create_member(name, email)
-        logger.info(f"Member '{name}' created successfully.")
+        logger.info("Member '%s' created successfully.", name)
         return member
 
-    def update_member(self, member_id: str, name: str, email: str):
-        logger.info(f"Updating member with id: {member_id}")
+    def batch_create_members(self, members):
+        """
+        Creates (name, email) items in one INSERT. Returns a Member or the exception that rejected
+        the item for each item, in request order.
+        """
+        logger.info("Batch creating %s members.", len(members))
+        results, rows, pending = plan_batch(members, member_row, "email", "member")
+        created = self.repository.bulk_create_members(rows) if rows else []
+        logger.info("Batch created %s of %s members.", len(created), len(members))
+        return complete_batch(results, created, pending, "email", "member")
+
+    def batch_get_members(self, member_ids):
+        logger.info("Batch getting %s members.", len(member_ids))
+        members = self.repository.get_members_by_ids(unique_batch_ids(member_ids, "member"))
+        logger.info("Found %s members.", len(members))
+        return in_request_order(member_ids, members)
+
+    def update_member(self, member_id: str, name: str, email: str, expected_version: int = 0):
+        logger.info("Updating member with id: %s", member_id)
         if not all([member_id, name, email]):
             raise ValueError("All fields are required for updating a member.")
-        member = self.repository.get_member_by_id(member_id)
-        if not member:
-            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
-        
-        # Basic email format validation
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        validate_expected_version(expected_version)
+        if not is_valid_email(email):
             raise ValueError("Invalid email format.")
-        
+
         existing_member_with_email = self.repository.get_member_by_email(email)
         if existing_member_with_email and existing_member_with_email.id != member_id:
             raise grpc.RpcError(grpc.StatusCode.ALREADY_EXISTS, f"Another member with email {email} already exists.")
-        updated_member = self.repository.update_member(member_id, name, email)
-        logger.info(f"Member with id '{member_id}' updated successfully.")
+        updated_member, previous_version = self.repository.update_member(member_id, name, email, expected_version)
+        if not updated_member:
+            if previous_version is None:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
+            raise version_conflict("Member", member_id, expected_version)
+        logger.info("Member with id '%s' updated successfully.", member_id)
         return updated_member
 
     def delete_member(self, member_id: str) -> bool:
-        logger.info(f"Deleting member with id: {member_id}")
+        logger.info("Deleting member with id: %s", member_id)
         if not member_id:
             raise ValueError("Member ID is required for deleting a member.")
         member = self.repository.get_member_by_id(member_id)
         if not member:
             raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
         result = self.repository.delete_member(member_id)
-        logger.info(f"Member with id '{member_id}' deleted successfully.")
+        logger.info("Member with id '%s' deleted successfully.", member_id)
         return result
     
     def get_member(self, member_id: str):
-        logger.info(f"Getting member with id: {member_id}")
+        logger.info("Getting member with id: %s", member_id)
         if not member_id:
             raise ValueError("Member ID is required for getting a member.")
         member = self.repository.get_member_by_id(member_id)
         if not member:
             raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
-        logger.info(f"Member with id '{member_id}' retrieved successfully.")
+        logger.info("Member with id '%s' retrieved successfully.", member_id)
         return member
 
     def borrow_book(self, book_id: str, member_id: str):
-        logger.info(f"Borrowing book with id: {book_id} for member: {member_id}")
+        logger.info("Borrowing book with id: %s for member: %s", book_id, member_id)
         if not all([book_id, member_id]):
             raise ValueError("Book ID and Member ID are required for borrowing a book.")
 
-        book = self.repository.get_book_by_id(book_id)
-        if not book:
-            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
-
-        if not book.is_available:
+        # Availability check, flag flip and insert happen in one statement, so two concurrent
+        # borrows of the same book cannot both succeed.
+        borrow_record, book_available, member_exists = self.repository.borrow_book_if_available(book_id, member_id)
+        if not borrow_record:
+            if book_available is None:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Book with id {book_id} not found.")
+            if book_available and not member_exists:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
             raise grpc.RpcError(grpc.StatusCode.FAILED_PRECONDITION, f"Book with id {book_id} is not available.")
-
-        member = self.repository.get_member_by_id(member_id)
-        if not member:
-            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Member with id {member_id} not found.")
-
-        borrow_record = self.repository.create_borrow_record(book_id, member_id)
-        logger.info(f"Book with id '{book_id}' borrowed by member with id '{member_id}' successfully.")
+        logger.info("Book with id '%s' borrowed by member with id '%s' successfully.", book_id, member_id)
         return borrow_record
 
     def return_book(self, borrow_record_id: str):
-        logger.info(f"Returning book for borrow record id: {borrow_record_id}")
+        logger.info("Returning book for borrow record id: %s", borrow_record_id)
         if not borrow_record_id:
             raise ValueError("Borrow record ID is required for returning a book.")
 
-        borrow_record = self.repository.get_borrow_record_by_id(borrow_record_id)
-        if not borrow_record:
-            raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Borrow record with id {borrow_record_id} not found.")
-        
-        if borrow_record.status == BorrowingStatus.RETURNED:
+        updated_borrow_record, previous_status = self.repository.return_borrowed_book(borrow_record_id)
+        if not updated_borrow_record:
+            if previous_status is None:
+                raise grpc.RpcError(grpc.StatusCode.NOT_FOUND, f"Borrow record with id {borrow_record_id} not found.")
             raise grpc.RpcError(grpc.StatusCode.FAILED_PRECONDITION, f"Book for borrow record id {borrow_record_id} has already been returned.")
-
-        updated_borrow_record = self.repository.update_borrow_record_status_to_returned(borrow_record_id)
-        logger.info(f"Book for borrow record id '{borrow_record_id}' returned successfully.")
+        logger.info("Book for borrow record id '%s' returned successfully.", borrow_record_id)
         return updated_borrow_record
 
-    def list_borrowings(self):
-        logger.info("Listing all borrowing records.")
-        borrow_records = self.repository.list_all_borrowings()
-        logger.info(f"Found {len(borrow_records)} borrowing records.")
-        return borrow_records
+    def list_borrowings(self, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing borrowing records with page size %s.", page_size)
+        limit, after = resolve_page_request("borrowings", page_size, page_token, parse_borrowing_sort_key)
+        borrow_records, next_page_token = build_page(
+            "borrowings", self.repository.list_all_borrowings(fetch_limit(limit), after), limit, borrowing_sort_key
+        )
+        logger.info("Found %s borrowing records.", len(borrow_records))
+        return borrow_records, next_page_token
+
+    def stream_borrowings(self, batch_size: int = 0):
+        batch_size = resolve_batch_size(batch_size)
+        logger.info("Streaming all borrowing records in batches of %s.", batch_size)
+        return self.repository.iter_borrowings(batch_size)
+
+    def export_data(self, dataset: str, file_format: str):
+        logger.info("Exporting %s as %s.", dataset, file_format)
+        validate_export(dataset, file_format)
+        return stream_copy(lambda output: self.repository.copy_export(dataset, file_format, output))
+
+    def list_changes_since(self, entity: str, version: int, page_size: int = 0, page_token: str = ""):
+        logger.info("Listing %s changed since version %s with page size %s.", entity, version, page_size)
+        validate_sync_entity(entity)
+        limit, after, before = resolve_changes_request(entity, version, page_size, page_token)
+        # Pages after the first are read below the watermark of the first, which a lagging replica
+        # may not have reached; the read then moves to the primary.
+        if before is None:
+            before = self.repository.change_watermark()
+        else:
+            self.repository.ensure_replayed(before)
+        # Deletions are of no use to a client that has nothing yet.
+        rows = self.repository.list_changes_since(entity, before, fetch_limit(limit), after, deletions=version > 0)
+        changed, deleted_ids, next_version, next_page_token = changes_page(entity, version, rows, limit, before)
+        logger.info("Found %s changed and %s deleted %s.", len(changed), len(deleted_ids), entity)
+        return changed, deleted_ids, next_version, next_page_token
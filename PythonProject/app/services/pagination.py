@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import json
+from typing import List, Optional, Tuple
+from app.config import MAX_PAGE_SIZE, SEARCH_PAGE_SIZE
+
+
+def encode_page_token(kind: str, sort_key: List) -> str:
+    """
+    Encodes the sort key of the last row on a page into an opaque page token.
+    """
+    payload = json.dumps({"k": kind, "v": sort_key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(kind: str, page_token: str) -> List:
+    """
+    Decodes a page token produced by encode_page_token for the same kind of list.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(page_token.encode("ascii")))
+        if payload["k"] != kind or not isinstance(payload["v"], list):
+            raise ValueError
+        return payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid page_token.")
+
+
+def resolve_page_request(kind: str, page_size: int, page_token: str, parse_key=None) -> Tuple[Optional[int], Optional[List]]:
+    """
+    Validates the paging fields of a list request and returns the page limit and the
+    sort key to seek past. A page_size of 0 means no limit.
+    """
+    if page_size < 0:
+        raise ValueError("page_size must not be negative.")
+    limit = min(page_size, MAX_PAGE_SIZE) if page_size else None
+    after = None
+    if page_token:
+        after = decode_page_token(kind, page_token)
+        if len(after) != 2:
+            raise ValueError("Invalid page_token.")
+        if parse_key:
+            try:
+                after = parse_key(after)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid page_token.")
+    return limit, after
+
+
+def fetch_limit(limit: Optional[int]) -> Optional[int]:
+    # One extra row is fetched to find out whether another page follows.
+    return limit + 1 if limit else None
+
+
+def build_page(kind: str, rows: List, limit: Optional[int], sort_key) -> Tuple[List, str]:
+    """
+    Trims rows fetched with fetch_limit to the page size and returns them with the next page token.
+    """
+    next_page_token = ""
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_page_token = encode_page_token(kind, sort_key(rows[-1]))
+    return rows, next_page_token
+
+
+def search_kind(kind: str, query: str) -> str:
+    # Ties search page tokens to the query they were issued for.
+    digest = hashlib.blake2b(query.encode("utf-8"), digest_size=6).hexdigest()
+    return f"{kind}:{digest}"
+
+
+def parse_search_key(key: List) -> List:
+    score, entity_id = key
+    if not isinstance(entity_id, str):
+        raise ValueError
+    return [float(score), entity_id]
+
+
+def search_sort_key(hit) -> List:
+    entity, score = hit
+    return [score, entity.id]
+
+
+def resolve_search_request(kind: str, query: str, page_size: int, page_token: str) -> Tuple[str, int, Optional[List]]:
+    """
+    Validates a search request and returns the normalized query, the page limit and the
+    (score, id) key to seek past. Searches are always paged.
+    """
+    query = query.strip()
+    if not query:
+        raise ValueError("query is required for searching.")
+    limit, after = resolve_page_request(search_kind(kind, query), page_size or SEARCH_PAGE_SIZE, page_token, parse_search_key)
+    return query, limit, after
+
+
+def changes_kind(entity: str, version: int) -> str:
+    # Ties ListChangesSince page tokens to the entity and version they were issued for.
+    return f"changes_{entity}:{version}"
+
+
+def resolve_changes_request(entity: str, version: int, page_size: int, page_token: str) -> Tuple[Optional[int], List, Optional[int]]:
+    """
+    Validates the paging fields of a ListChangesSince request and returns the page limit, the
+    (version, id) key to seek past and the watermark every page is read below, which the first
+    page takes (None) and the page tokens carry.
+    """
+    if version < 0:
+        raise ValueError("version must not be negative.")
+    if page_size < 0:
+        raise ValueError("page_size must not be negative.")
+    limit = min(page_size, MAX_PAGE_SIZE) if page_size else None
+    if not page_token:
+        # Ids are never empty, so this key starts the first page at version itself.
+        return limit, [version, ""], None
+    key = decode_page_token(changes_kind(entity, version), page_token)
+    if len(key) != 3 or not isinstance(key[0], int) or not isinstance(key[1], str) or not isinstance(key[2], int):
+        raise ValueError("Invalid page_token.")
+    return limit, key[:2], key[2]
@@ -0,0 +1,286 @@
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+from app.config import TYPEAHEAD_LIMIT, MAX_TYPEAHEAD_LIMIT
+from app.db.changes import BOOKS
+from app.db.database import get_db_session
+from app.db.models import ChangeKind
+from app.repositories.library_repository import LibraryRepository
+import grpc
+import re
+import threading
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+_ISBN_PATTERN = re.compile(r"^[0-9Xx][0-9Xx\- ]*$")
+
+# Compact once removed or replaced books make up this share of the documents.
+_COMPACT_RATIO = 0.25
+# Matches collected per requested suggestion before ranking; the scan stops after that many.
+_CANDIDATES_PER_SUGGESTION = 4
+# Postings of at most this many tokens are counted per prefix when picking the term to scan.
+_MAX_COUNTED_TOKENS = 64
+# Prefixes matching at most this many tokens are checked with a set of token ids.
+_MAX_FILTER_TOKENS = 4096
+
+
+def tokenize(value: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(value.lower())
+
+
+def normalize_isbn(isbn: str) -> str:
+    return "".join(tokenize(isbn))
+
+
+def query_terms(query: str) -> List[str]:
+    # Something that looks like a (partial) ISBN is matched as one prefix, hyphens or not.
+    if _ISBN_PATTERN.match(query.strip()):
+        return [normalize_isbn(query)]
+    return tokenize(query)
+
+
+class TypeaheadIndex:
+    """
+    In-memory inverted index over book titles, authors and ISBNs for prefix suggestions.
+
+    Tokens are interned to integer ids; a sorted vocabulary turns a query prefix into a range of
+    token ids. Each token's posting list is an array of unsigned ints (document ordinals), or a
+    bare int while the token occurs in a single book, which is the common case for ISBNs. A flat
+    forward index (the token ids of every document, addressed by offsets) answers "does this book
+    also match the other terms" without a set per book.
+
+    Documents are never moved: removing a book tombstones its ordinal and an update adds a new
+    one. Once tombstones pass _COMPACT_RATIO, postings are rebuilt from the forward index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self._token_ids: Dict[str, int] = {}
+        self._tokens: List[str] = []
+        self._sorted_tokens: List[str] = []
+        self._postings: List = []
+        self._book_ids: List[Optional[str]] = []
+        self._titles: List[str] = []
+        self._authors: List[str] = []
+        self._doc_tokens = array("I")
+        self._doc_offsets = array("I", [0])
+        self._ordinals: Dict[str, int] = {}
+        self._author_strings: Dict[str, str] = {}
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def _intern(self, token: str, keep_sorted: bool) -> int:
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            token_id = len(self._postings)
+            self._token_ids[token] = token_id
+            self._tokens.append(token)
+            self._postings.append(None)
+            if keep_sorted:
+                insort(self._sorted_tokens, token)
+            else:
+                self._sorted_tokens.append(token)
+        return token_id
+
+    def _append_posting(self, token_id: int, ordinal: int) -> None:
+        posting = self._postings[token_id]
+        if posting is None:
+            self._postings[token_id] = ordinal
+        elif isinstance(posting, int):
+            self._postings[token_id] = array("I", (posting, ordinal))
+        else:
+            posting.append(ordinal)
+
+    def _add(self, book_id: str, title: str, author: str, isbn: str, keep_sorted: bool) -> None:
+        previous = self._ordinals.get(book_id)
+        if previous is not None:
+            self._book_ids[previous] = None
+            self._removed += 1
+        ordinal = len(self._book_ids)
+        token_ids = []
+        for token in dict.fromkeys(tokenize(title) + tokenize(author) + [normalize_isbn(isbn)]):
+            if token:
+                token_id = self._intern(token, keep_sorted)
+                token_ids.append(token_id)
+                self._append_posting(token_id, ordinal)
+        self._doc_tokens.extend(token_ids)
+        self._doc_offsets.append(len(self._doc_tokens))
+        self._book_ids.append(book_id)
+        self._titles.append(title)
+        # Authors repeat across many books; share one string object per author.
+        self._authors.append(self._author_strings.setdefault(author, author))
+        self._ordinals[book_id] = ordinal
+
+    def load(self, books) -> None:
+        """
+        Replaces the contents with books, an iterable of (id, title, author, isbn) tuples.
+        The new index is built aside and swapped in, so suggestions keep working meanwhile.
+        """
+        fresh = TypeaheadIndex()
+        for book_id, title, author, isbn in books:
+            fresh._add(book_id, title, author, isbn, keep_sorted=False)
+        fresh._sorted_tokens.sort()
+        fresh.loaded = True
+        with self._lock:
+            self.__dict__.update({key: value for key, value in fresh.__dict__.items() if key != "_lock"})
+
+    def add(self, book_id: str, title: str, author: str, isbn: str) -> None:
+        """
+        Adds a book, or replaces the entry of a book that is already indexed. Ignored until the
+        index has been loaded.
+        """
+        if not self.loaded:
+            return
+        with self._lock:
+            self._add(book_id, title, author, isbn, keep_sorted=True)
+            self._compact_if_needed()
+
+    def remove(self, book_id: str) -> None:
+        if not self.loaded:
+            return
+        with self._lock:
+            ordinal = self._ordinals.pop(book_id, None)
+            if ordinal is not None:
+                self._book_ids[ordinal] = None
+                self._removed += 1
+                self._compact_if_needed()
+
+    def _compact_if_needed(self) -> None:
+        if self._removed <= _COMPACT_RATIO * len(self._book_ids):
+            return
+        postings: List = [None] * len(self._postings)
+        self._postings = postings
+        doc_tokens, doc_offsets = array("I"), array("I", [0])
+        book_ids, titles, authors = [], [], []
+        for ordinal, book_id in enumerate(self._book_ids):
+            if book_id is None:
+                continue
+            new_ordinal = len(book_ids)
+            token_ids = self._doc_tokens[self._doc_offsets[ordinal]:self._doc_offsets[ordinal + 1]]
+            for token_id in token_ids:
+                self._append_posting(token_id, new_ordinal)
+            doc_tokens.extend(token_ids)
+            doc_offsets.append(len(doc_tokens))
+            book_ids.append(book_id)
+            titles.append(self._titles[ordinal])
+            authors.append(self._authors[ordinal])
+            self._ordinals[book_id] = new_ordinal
+        self._doc_tokens, self._doc_offsets = doc_tokens, doc_offsets
+        self._book_ids, self._titles, self._authors = book_ids, titles, authors
+        # Tokens no remaining book uses leave the vocabulary; their ids are never reused.
+        for token_id, posting in enumerate(postings):
+            if posting is None and self._tokens[token_id] is not None:
+                del self._token_ids[self._tokens[token_id]]
+                self._tokens[token_id] = None
+        self._sorted_tokens = [token for token in self._sorted_tokens if token in self._token_ids]
+        self._removed = 0
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        # Positions in the sorted vocabulary of the tokens starting with prefix.
+        tokens = self._sorted_tokens
+        return bisect_left(tokens, prefix), bisect_left(tokens, prefix + "\U0010ffff")
+
+    def _range_size(self, start: int, end: int) -> int:
+        # Number of postings under a prefix. Past the first tokens, the rest is extrapolated from
+        # their median: a common word is followed by many rare words it prefixes, not by more like it.
+        counted = min(end, start + _MAX_COUNTED_TOKENS)
+        sizes = []
+        for position in range(start, counted):
+            posting = self._postings[self._token_ids[self._sorted_tokens[position]]]
+            sizes.append(1 if isinstance(posting, int) else len(posting))
+        return sum(sizes) + (end - counted) * sorted(sizes)[len(sizes) // 2]
+
+    def _term_filter(self, term: str, start: int, end: int):
+        # Checks whether a book's token ids include one starting with term.
+        if end - start <= _MAX_FILTER_TOKENS:
+            allowed = frozenset(self._token_ids[token] for token in self._sorted_tokens[start:end])
+            return lambda token_ids: not allowed.isdisjoint(token_ids)
+        tokens = self._tokens
+        return lambda token_ids: any(tokens[token_id].startswith(term) for token_id in token_ids)
+
+    def suggest(self, query: str, limit: int) -> List[Tuple[str, str, str]]:
+        """
+        Returns up to limit (id, title, author) tuples of books that have, for every term of the
+        query, a word starting with it. Books whose title starts with the query come first.
+
+        The scan stops after a bounded number of matches, so a short prefix matching most of the
+        catalogue costs the same as a selective one; suggestions are not an exhaustive search.
+        """
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            ranges = [self._prefix_range(term) for term in terms]
+            if any(start == end for start, end in ranges):
+                return []
+            # Walk the postings of the most selective term and check the others per book against
+            # its own few tokens.
+            sizes = [self._range_size(start, end) for start, end in ranges]
+            driver = sizes.index(min(sizes))
+            others = [self._term_filter(term, *ranges[index]) for index, term in enumerate(terms) if index != driver]
+            sorted_tokens = self._sorted_tokens
+            wanted = limit * _CANDIDATES_PER_SUGGESTION
+            matches = []
+            seen = set()
+            for position in range(*ranges[driver]):
+                posting = self._postings[self._token_ids[sorted_tokens[position]]]
+                for ordinal in ((posting,) if isinstance(posting, int) else posting):
+                    if ordinal in seen or self._book_ids[ordinal] is None:
+                        continue
+                    seen.add(ordinal)
+                    if others:
+                        token_ids = self._doc_tokens[self._doc_offsets[ordinal]:self._doc_offsets[ordinal + 1]]
+                        if not all(matches_term(token_ids) for matches_term in others):
+                            continue
+                    matches.append((self._book_ids[ordinal], self._titles[ordinal], self._authors[ordinal]))
+                    if len(matches) >= wanted:
+                        break
+                if len(matches) >= wanted:
+                    break
+        prefix = query.strip().lower()
+        matches.sort(key=lambda match: (not match[1].lower().startswith(prefix), match[1].lower()))
+        return matches[:limit]
+
+
+book_typeahead = TypeaheadIndex()
+
+
+def load_book_typeahead() -> int:
+    """
+    Loads book_typeahead from the books table and returns the change watermark taken before, so
+    the change feed can apply every write the load may have missed (see ChangeFeed.start_from).
+    """
+    with get_db_session() as db_session:
+        repository = LibraryRepository(db_session)
+        watermark = repository.change_watermark()
+        book_typeahead.load(repository.iter_typeahead_rows(10000))
+    return watermark
+
+
+def apply_book_changes(changes) -> None:
+    """
+    Applies the book changes of a change feed read (see ChangeFeed.follow_changes), whichever
+    process or job made them. Borrows and returns leave the indexed fields alone.
+    """
+    for change in changes.get(BOOKS, ()):
+        if change.entity is None:
+            book_typeahead.remove(change.entity_id)
+        elif change.kind != ChangeKind.AVAILABILITY:
+            book = change.entity
+            book_typeahead.add(book.id, book.title, book.author, book.isbn)
+
+
+def resolve_suggest_request(query: str, limit: int) -> Tuple[str, int]:
+    """
+    Validates a SuggestBooks request and returns the query and the number of suggestions.
+    """
+    query = query.strip()
+    if not query:
+        raise ValueError("query is required for suggestions.")
+    if limit < 0:
+        raise ValueError("limit must not be negative.")
+    if not book_typeahead.loaded:
+        raise grpc.RpcError(grpc.StatusCode.UNAVAILABLE, "Book suggestions are not available.")
+    return query, min(limit or TYPEAHEAD_LIMIT, MAX_TYPEAHEAD_LIMIT)
@@ -0,0 +1,104 @@
+"""
+Compares the old NOT IN (SELECT DISTINCT ...) availability query with the is_available partial
+index used by ListAvailableBooks.
+
+Seeds the database configured in .env with synthetic rows (ids prefixed with "bench-") when
+--seed is given; 10% of the books end up borrowed. Seeding the default 1M books / 20M borrow
+records takes several minutes and a few GB of disk.
+
+    python -m benchmarks.bench_available_books --seed
+    python -m benchmarks.bench_available_books --seed --books 100000 --borrows 2000000
+"""
+from app.db import database
+from app.db.database import create_tables
+from app.jobs.reconcile_availability import reconcile_availability
+from sqlalchemy import text
+import argparse
+import statistics
+import time
+
+PAGE_SIZE = 50
+
+OLD_QUERY = text("""
+    SELECT books.* FROM books
+    WHERE books.id NOT IN (SELECT DISTINCT book_id FROM borrow_records WHERE status = 'BORROWED')
+      AND (books.title, books.id) > (:title, :id)
+    ORDER BY books.title, books.id LIMIT :limit
+""")
+
+NEW_QUERY = text("""
+    SELECT books.* FROM books
+    WHERE books.is_available AND (books.title, books.id) > (:title, :id)
+    ORDER BY books.title, books.id LIMIT :limit
+""")
+
+
+def seed(connection, books, borrows, members):
+    started = time.perf_counter()
+    connection.execute(text("""
+        INSERT INTO books (id, title, author, published_date, isbn, is_available)
+        SELECT 'bench-' || i, 'Title ' || md5(i::text), 'Author ' || (i % 1000),
+               date '1950-01-01' + (i % 25000), 'bench-isbn-' || i, true
+        FROM generate_series(1, :books) AS i
+    """), {"books": books})
+    connection.execute(text("""
+        INSERT INTO members (id, name, email, join_date)
+        SELECT 'bench-member-' || i, 'Member ' || i, 'bench-' || i || '@example.com', date '2020-01-01'
+        FROM generate_series(1, :members) AS i
+    """), {"members": members})
+    # The last books / 10 records are the active ones; consecutive rows hit distinct books.
+    connection.execute(text("""
+        INSERT INTO borrow_records (id, book_id, member_id, borrow_date, return_date, status)
+        SELECT 'bench-borrow-' || i, 'bench-' || (1 + i % :books), 'bench-member-' || (1 + i % :members),
+               date '2020-01-01' + (i % 1500),
+               CASE WHEN i > :borrows - :active THEN NULL ELSE date '2020-01-02' + (i % 1500) END,
+               (CASE WHEN i > :borrows - :active THEN 'BORROWED' ELSE 'RETURNED' END)::borrowingstatus
+        FROM generate_series(1, :borrows) AS i
+    """), {"books": books, "members": members, "borrows": borrows, "active": books // 10})
+    connection.commit()
+    print(f"seeded {books:,} books and {borrows:,} borrow records in {time.perf_counter() - started:.0f}s")
+
+
+def time_query(connection, query, after, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(query, {"title": after[0], "id": after[1], "limit": PAGE_SIZE}).all()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert synthetic rows first")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--borrows", type=int, default=20_000_000)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    create_tables()
+    with database.engine.connect() as connection:
+        if args.seed:
+            seed(connection, args.books, args.borrows, args.members)
+            started = time.perf_counter()
+            reconcile_availability(repair=True)
+            print(f"reconciled is_available in {time.perf_counter() - started:.0f}s")
+            connection.execute(text("ANALYZE books"))
+            connection.execute(text("ANALYZE borrow_records"))
+            connection.commit()
+
+        middle = connection.execute(text(
+            "SELECT title, id FROM books ORDER BY title, id OFFSET (SELECT count(*) / 2 FROM books) LIMIT 1"
+        )).one()
+        for label, after in (("first page", ("", "")), ("middle page", tuple(middle))):
+            old = time_query(connection, OLD_QUERY, after, args.repeat)
+            new = time_query(connection, NEW_QUERY, after, args.repeat)
+            print(f"{label:<12} NOT IN: {old:9.2f} ms   partial index: {new:7.2f} ms   ({old / new:,.0f}x)")
+
+        plan = connection.execute(text("EXPLAIN " + NEW_QUERY.text), {"title": "", "id": "", "limit": PAGE_SIZE}).scalars().all()
+        print("\n".join(plan))
+
+
+if __name__ == "__main__":
+    main()
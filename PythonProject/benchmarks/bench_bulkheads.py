@@ -0,0 +1,127 @@
+"""
+Latency of point lookups on the sync server while heavy scans run, with one thread pool for every
+RPC and with the per-class pools (bulkheads).
+
+For every mode a forked child serves the database configured in .env. Its ListBorrowings query is
+made --scan-delay-ms slower by a pg_sleep on the server, like a ListBorrowings over a large borrow
+table. The parent first runs --point-clients threads of GetBook calls alone, then the same with
+--scan-clients threads of ListBorrowings calls at the same time, and reports the GetBook latency
+percentiles of both phases and the scans completed. Admission control is off in the children so
+that only the thread pools differ. Needs at least a few books in the database (seed some with
+benchmarks.bench_available_books --seed):
+
+    python -m benchmarks.bench_bulkheads
+    python -m benchmarks.bench_bulkheads --scan-clients 20 --scan-delay-ms 500
+    python -m benchmarks.bench_bulkheads --pools point=2,scan=6,write=2
+"""
+from app.proto import library_pb2, library_pb2_grpc
+import argparse
+import grpc
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+
+MODES = {
+    # Every RPC on one pool of GRPC_MAX_WORKERS threads, as before the bulkheads.
+    "single-pool": "",
+    "bulkheads": None,  # --pools
+}
+
+
+def serve(pools, port, scan_delay_ms, ready):
+    # The parent has not imported app.config, so these settings apply from here on.
+    os.environ.update(GRPC_POOLS=pools, GRPC_MAX_WORKERS="10", ADMISSION_CONTROL="false", COALESCE_READS="false")
+    from app.logging_service import setup_logging
+    from app.grpc.server import create_server
+    from app.repositories.library_repository import LibraryRepository
+    from sqlalchemy import text
+
+    list_all_borrowings = LibraryRepository.list_all_borrowings
+
+    def slow_list_all_borrowings(self, *args, **kwargs):
+        self.db_session.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": scan_delay_ms / 1000})
+        return list_all_borrowings(self, *args, **kwargs)
+
+    LibraryRepository.list_all_borrowings = slow_list_all_borrowings
+    setup_logging(level="ERROR")
+    server = create_server()
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+    ready.set()
+    server.wait_for_termination()
+
+
+def run_phase(stub, book_ids, point_clients, scan_clients, seconds):
+    """
+    Runs the clients for seconds; returns the GetBook latencies in ms, sorted, and the scans completed.
+    """
+    deadline = time.perf_counter() + seconds
+    latencies = [[] for _ in range(point_clients)]
+    scans = [0] * scan_clients
+
+    def point_client(samples, offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            stub.GetBook(library_pb2.GetBookRequest(id=book_ids[i % len(book_ids)]))
+            samples.append((time.perf_counter() - started) * 1000)
+            i += 1
+
+    def scan_client(n):
+        while time.perf_counter() < deadline:
+            stub.ListBorrowings(library_pb2.ListBorrowingsRequest(page_size=100))
+            scans[n] += 1
+
+    threads = [threading.Thread(target=point_client, args=(latencies[n], n * 7919)) for n in range(point_clients)]
+    threads += [threading.Thread(target=scan_client, args=(n,)) for n in range(scan_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(sample for samples in latencies for sample in samples), sum(scans)
+
+
+def describe(latencies):
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return f"p50 {statistics.median(latencies):6.2f} ms  p99 {p99:7.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", default="point=4,scan=3,write=3", help="GRPC_POOLS of the bulkheads mode")
+    parser.add_argument("--point-clients", type=int, default=4)
+    parser.add_argument("--scan-clients", type=int, default=12)
+    parser.add_argument("--scan-delay-ms", type=float, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=50093)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    for mode in args.modes.split(","):
+        pools = MODES[mode] if MODES[mode] is not None else args.pools
+        ready = context.Event()
+        child = context.Process(target=serve, args=(pools, args.port, args.scan_delay_ms, ready), daemon=True)
+        child.start()
+        ready.wait(30)
+        channel = grpc.insecure_channel(f"127.0.0.1:{args.port}")
+        stub = library_pb2_grpc.LibraryServiceStub(channel)
+        book_ids = [book.id for book in stub.ListBooks(library_pb2.ListBooksRequest(page_size=1000)).books]
+        if not book_ids:
+            raise SystemExit("No books in the database; seed some first.")
+        run_phase(stub, book_ids, args.point_clients, 0, 1)  # connections and caches
+        alone, _ = run_phase(stub, book_ids, args.point_clients, 0, args.seconds)
+        mixed, scans = run_phase(stub, book_ids, args.point_clients, args.scan_clients, args.seconds)
+        channel.close()
+        child.terminate()
+        child.join()
+        print(
+            f"{mode:<12} GetBook alone: {describe(alone)}   with scans: {describe(mixed)}   "
+            f"{len(mixed) / args.seconds:6.0f} GetBook/s  {scans / args.seconds:5.1f} scans/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Bytes and time of a client resync of the books table: paging through ListBooks against
+ListChangesSince from the version of the previous sync, after a day's worth of writes.
+
+Runs the service layer in process against the database configured in .env and counts the size of
+the serialized responses. Seeds --books synthetic rows (ids prefixed with "bench-delta-") when
+--seed is given. Each round updates --updates books and deletes --deletes of them; deleted books
+are not put back.
+
+    python -m benchmarks.bench_delta_sync --seed
+    python -m benchmarks.bench_delta_sync --updates 2000 --deletes 100
+"""
+from app.db.database import create_tables, get_db_session
+from app.grpc.mapping import to_book_proto, to_list_changes_since_response
+from app.proto import library_pb2
+from app.repositories.library_repository import LibraryRepository
+from app.services.library_service import LibraryService
+from sqlalchemy import text
+import argparse
+import time
+
+PAGE_SIZE = 1000
+
+
+def seed(books):
+    with get_db_session() as session:
+        session.execute(text("""
+            INSERT INTO books (id, title, author, published_date, isbn, is_available)
+            SELECT 'bench-delta-' || i, 'Title ' || md5(i::text), 'Author ' || (i % 1000),
+                   date '1950-01-01' + (i % 25000), 'bench-delta-isbn-' || i, true
+            FROM generate_series(1, :books) AS i
+            ON CONFLICT DO NOTHING
+        """), {"books": books})
+    print(f"seeded {books:,} books")
+
+
+def full_sync():
+    total, token = 0, ""
+    while True:
+        with get_db_session(read_only=True) as session:
+            books, token = LibraryService(LibraryRepository(session)).list_books(PAGE_SIZE, token)
+            total += library_pb2.ListBooksResponse(books=[to_book_proto(book) for book in books], next_page_token=token).ByteSize()
+        if not token:
+            return total
+
+
+def delta_sync(version):
+    total, token = 0, ""
+    while True:
+        with get_db_session(read_only=True) as session:
+            page = LibraryService(LibraryRepository(session)).list_changes_since("books", version, PAGE_SIZE, token)
+            total += to_list_changes_since_response("books", *page).ByteSize()
+        _, _, next_version, token = page
+        if not token:
+            return total, next_version
+
+
+def write(updates, deletes):
+    with get_db_session() as session:
+        ids = session.execute(
+            text("SELECT id FROM books WHERE id LIKE 'bench-delta-%' ORDER BY random() LIMIT :n"), {"n": updates + deletes}
+        ).scalars().all()
+        session.execute(text("UPDATE books SET author = author || '.' WHERE id = ANY(:ids)"), {"ids": ids[:updates]})
+        repository = LibraryRepository(session)
+        for book_id in ids[updates:]:
+            repository.delete_book(book_id)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--deletes", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    create_tables()
+    if args.seed:
+        seed(args.books)
+    (_, version), _ = timed(delta_sync, 0)
+    for _ in range(args.rounds):
+        write(args.updates, args.deletes)
+        full_bytes, full_seconds = timed(full_sync)
+        (delta_bytes, version), delta_seconds = timed(delta_sync, version)
+        print(
+            f"ListBooks {full_bytes / 1024:10,.0f} KiB {full_seconds * 1000:8.0f} ms   "
+            f"ListChangesSince {delta_bytes / 1024:8,.0f} KiB {delta_seconds * 1000:6.0f} ms   "
+            f"{full_bytes / max(1, delta_bytes):6.0f}x fewer bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
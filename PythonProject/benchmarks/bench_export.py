@@ -0,0 +1,138 @@
+"""
+Time and peak memory of exporting the borrow records (with their book and member columns):
+ExportData's COPY TO as CSV, NDJSON and Parquet against reading them through the ORM, either
+page by page like ListBorrowings or in batches like StreamBorrowings, and serializing the
+protobuf responses.
+
+Each method runs in a forked process and reports how far it raised that process's peak RSS.
+The ORM methods stop after --orm-rows records; their time and output size are extrapolated to the
+whole table.
+Seeding (--seed, same synthetic rows as bench_available_books) the default 10M borrow records
+takes several minutes and a few GB of disk.
+
+    python -m benchmarks.bench_export --seed
+    python -m benchmarks.bench_export --seed --books 100000 --borrows 1000000
+"""
+from app.db import database
+from app.db.database import create_tables
+from app.grpc.mapping import to_borrowing_details_proto
+from app.jobs.export import write_parquet
+from app.proto import library_pb2
+from app.repositories.library_repository import LibraryRepository
+from app.services.export import stream_copy
+from benchmarks.bench_available_books import seed
+from sqlalchemy import text
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+PAGE_SIZE = 1000
+
+
+def copy_export(file_format):
+    def run(db_session, orm_rows):
+        repository = LibraryRepository(db_session)
+        size = 0
+        for chunk in stream_copy(lambda output: repository.copy_export("borrowings", file_format, output)):
+            size += len(chunk)
+        return None, size
+    return run
+
+
+def parquet_export(db_session, orm_rows):
+    repository = LibraryRepository(db_session)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "borrowings.parquet")
+        rows = write_parquet("borrowings", stream_copy(lambda output: repository.copy_export("borrowings", "csv", output)), path)
+        return rows, os.path.getsize(path)
+
+
+def orm_pages(db_session, orm_rows):
+    repository = LibraryRepository(db_session)
+    rows = size = 0
+    after = None
+    while rows < orm_rows:
+        borrowings = repository.list_all_borrowings(limit=PAGE_SIZE, after=after)
+        if not borrowings:
+            break
+        response = library_pb2.ListBorrowingsResponse(borrowings=[to_borrowing_details_proto(b) for b in borrowings])
+        size += len(response.SerializeToString())
+        rows += len(borrowings)
+        after = (borrowings[-1].borrow_date, borrowings[-1].id)
+        db_session.expunge_all()
+    return rows, size
+
+
+def orm_stream(db_session, orm_rows):
+    repository = LibraryRepository(db_session)
+    rows = size = 0
+    for borrowings in repository.iter_borrowings(PAGE_SIZE):
+        response = library_pb2.StreamBorrowingsResponse(borrowings=[to_borrowing_details_proto(b) for b in borrowings])
+        size += len(response.SerializeToString())
+        rows += len(borrowings)
+        if rows >= orm_rows:
+            break
+    return rows, size
+
+
+METHODS = {
+    "COPY csv": copy_export("csv"),
+    "COPY ndjson": copy_export("ndjson"),
+    "COPY -> parquet": parquet_export,
+    "ORM pages": orm_pages,
+    "ORM stream": orm_stream,
+}
+
+
+def measure(method, orm_rows, results):
+    # Connections inherited from the parent belong to it.
+    database.engine.dispose(close=False)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with database.SessionFactory() as db_session:
+        rows, size = METHODS[method](db_session, orm_rows)
+        db_session.rollback()
+    elapsed = time.perf_counter() - started
+    results.put((rows, size, elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert synthetic rows first")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--borrows", type=int, default=10_000_000)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--orm-rows", type=int, default=1_000_000, help="records read by the ORM methods")
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    args = parser.parse_args()
+
+    create_tables()
+    with database.engine.connect() as connection:
+        if args.seed:
+            seed(connection, args.books, args.borrows, args.members)
+            connection.execute(text("ANALYZE borrow_records"))
+            connection.commit()
+        total = connection.execute(text("SELECT count(*) FROM borrow_records")).scalar()
+    database.engine.dispose()
+    print(f"exporting {total:,} borrow records")
+
+    context = multiprocessing.get_context("fork")
+    for method in args.methods:
+        results = context.Queue()
+        process = context.Process(target=measure, args=(method, args.orm_rows, results))
+        process.start()
+        rows, size, elapsed, peak = results.get()
+        process.join()
+        rows = total if rows is None else rows
+        scale = total / rows if rows else 1
+        estimate, size = elapsed * scale, size * scale
+        note = f" (extrapolated from {rows:,} rows)" if rows < total else ""
+        print(f"{method:<16} {estimate:8.1f} s   {total / estimate:>10,.0f} rows/s   "
+              f"peak +{peak:7.1f} MiB   {size / 2**20:9,.1f} MiB out{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares building a ListBooksResponse from per-row messages with concatenating cached fragments.
+
+Runs without a database: the rows are transient Book instances.
+
+    python -m benchmarks.bench_list_fragments --rows 1000 --repeat 200
+"""
+from app.db.models import Book
+from app.grpc.fragments import FragmentCache, book_fragments, BOOK_KEY_COLUMNS
+from app.grpc.mapping import to_book_proto
+from app.proto import library_pb2
+from datetime import date
+import argparse
+import time
+import uuid
+
+
+def make_books(count):
+    return [
+        Book(
+            id=str(uuid.uuid4()),
+            title=f"Title {i}",
+            author=f"Author {i % 97}",
+            published_date=date(2000 + i % 20, 1 + i % 12, 1 + i % 28),
+            isbn=f"isbn-{i:09d}",
+            is_available=i % 3 != 0,
+            version=1000 + i,
+        )
+        for i in range(count)
+    ]
+
+
+def message_path(books, token):
+    return library_pb2.ListBooksResponse(books=[to_book_proto(book) for book in books], next_page_token=token).SerializeToString()
+
+
+def timed(label, fn, rows, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / repeat * 1e3:8.3f} ms/response  {rows * repeat / elapsed:12,.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    books = make_books(args.rows)
+    token = "eyJrIjogImJvb2tzIiwgInYiOiBbIlRpdGxlIDk5OSIsICIwMDAwIl19"
+    expected = message_path(books, token)
+    assert book_fragments.encode_list_response(books, token) == expected
+    assert library_pb2.ListBooksResponse.FromString(expected).books[0].id == books[0].id
+
+    baseline = timed("to_book_proto + serialize", lambda: message_path(books, token), args.rows, args.repeat)
+    warm = timed("fragments (warm cache)", lambda: book_fragments.encode_list_response(books, token), args.rows, args.repeat)
+
+    def cold():
+        FragmentCache(to_book_proto, BOOK_KEY_COLUMNS, args.rows).encode_list_response(books, token)
+
+    timed("fragments (cold cache)", cold, args.rows, args.repeat)
+    print(f"warm speedup: {baseline / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+RPC throughput and latency of the sync server with logging off and in each logging setup.
+
+For every mode a forked child configures logging, writes it to a file and serves the database
+configured in .env; the parent runs --clients threads of GetBook and ListBooks calls against it
+for --seconds and reports RPCs per second and latency percentiles. --write-delay-ms makes every
+write to the log block for that long, like a stdout pipe whose reader falls behind. Needs at
+least a few books in the database (seed some with benchmarks.bench_available_books --seed):
+
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --write-delay-ms 0.2
+    python -m benchmarks.bench_logging --clients 16 --seconds 20 --modes off,direct-text,queue-json
+"""
+from app.proto import library_pb2, library_pb2_grpc
+import argparse
+import grpc
+import logging
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+HOT_PATH_LOGGERS = ("app.grpc.server", "app.services", "app.repositories", "app.db.database")
+
+MODES = {
+    # Everything below WARNING is dropped before a record is created.
+    "off": dict(level="WARNING", log_format="text", background=False),
+    # Text written by the RPC thread, as before the queue existed.
+    "direct-text": dict(level="INFO", log_format="text", background=False),
+    "queue-text": dict(level="INFO", log_format="text", background=True),
+    "queue-json": dict(level="INFO", log_format="json", background=True),
+    "queue-json-sampled": dict(
+        level="INFO", log_format="json", background=True, sample_rates={name: 0.01 for name in HOT_PATH_LOGGERS}
+    ),
+}
+
+
+class SlowStream:
+    def __init__(self, stream, delay_seconds):
+        self.stream = stream
+        self.delay_seconds = delay_seconds
+
+    def write(self, data):
+        time.sleep(self.delay_seconds)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def serve(mode, port, log_path, write_delay_ms, ready):
+    from app.logging_service import setup_logging
+    from app.grpc.server import create_server
+
+    options = {"sample_rates": {}, **MODES[mode]}
+    with open(log_path, "w") as log_file:
+        stream = SlowStream(log_file, write_delay_ms / 1000) if write_delay_ms else log_file
+        setup_logging(stream=stream, **options)
+        server = create_server()
+        server.add_insecure_port(f"127.0.0.1:{port}")
+        server.start()
+        ready.set()
+        server.wait_for_termination()
+
+
+def run_clients(port, clients, seconds, book_ids):
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    stub = library_pb2_grpc.LibraryServiceStub(channel)
+    latencies = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + seconds
+
+    def client(samples, offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if i % 4:
+                stub.GetBook(library_pb2.GetBookRequest(id=book_ids[i % len(book_ids)]))
+            else:
+                stub.ListBooks(library_pb2.ListBooksRequest(page_size=20))
+            samples.append((time.perf_counter() - started) * 1000)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(latencies[n], n * 7919)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    channel.close()
+    return sorted(sample for samples in latencies for sample in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=50091)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--write-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    from app.db.database import get_db_session
+    from app.db.models import Book
+    from sqlalchemy import select
+
+    with get_db_session() as db_session:
+        book_ids = db_session.execute(select(Book.id).limit(1000)).scalars().all()
+    if not book_ids:
+        raise SystemExit("No books in the database; seed some first.")
+    # The children build their own engines; do not hand them the parent's connections.
+    from app.db import database
+    database.engine.dispose()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    context = multiprocessing.get_context("fork")
+    for mode in args.modes.split(","):
+        log_path = os.path.join(tempfile.gettempdir(), f"bench_logging_{mode}.log")
+        ready = context.Event()
+        child = context.Process(target=serve, args=(mode, args.port, log_path, args.write_delay_ms, ready), daemon=True)
+        child.start()
+        ready.wait(30)
+        warm_up = run_clients(args.port, args.clients, 1, book_ids)  # connections and caches
+        latencies = run_clients(args.port, args.clients, args.seconds, book_ids)
+        child.terminate()
+        child.join()
+        p99 = latencies[int(len(latencies) * 0.99)]
+        # Fewer lines per RPC than with direct writes means the queue was full and records were dropped.
+        with open(log_path, "rb") as log_file:
+            lines = sum(1 for _ in log_file)
+        print(
+            f"{mode:<19} {len(latencies) / args.seconds:8.0f} RPC/s   p50 {statistics.median(latencies):6.2f} ms   "
+            f"p99 {p99:6.2f} ms   {lines / (len(warm_up) + len(latencies)):5.2f} log lines/RPC"
+        )
+
+
+if __name__ == "__main__":
+    main()
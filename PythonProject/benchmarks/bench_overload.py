@@ -0,0 +1,127 @@
+"""
+Goodput of the sync server under overload with and without deadline propagation and admission
+control.
+
+For every mode a forked child serves the database configured in .env with every transaction
+made --db-delay-ms slower by a pg_sleep on the server, like a Postgres that has slowed down. The
+parent sends ListBooks calls with a --deadline-ms deadline at a fixed --rate, whether or not
+earlier calls have completed (open loop, as many independent gateway requests would), and
+reports the calls per second that succeeded within their deadline, how the others failed and the
+latency of the successful ones. The default rate is more than twice what 10 threads can serve at a
+20 ms delay:
+
+    python -m benchmarks.bench_overload
+    python -m benchmarks.bench_overload --rate 1500 --db-delay-ms 10 --deadline-ms 100
+    python -m benchmarks.bench_overload --modes unprotected,admission --seconds 20
+"""
+from app.proto import library_pb2, library_pb2_grpc
+import argparse
+import collections
+import functools
+import grpc
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+
+MODES = {
+    # As before: every RPC queues for a thread and runs to completion.
+    "unprotected": {"DEADLINE_PROPAGATION": "false", "ADMISSION_CONTROL": "false"},
+    # Expired RPCs are skipped and statements are cancelled at the deadline.
+    "deadlines": {"DEADLINE_PROPAGATION": "true", "ADMISSION_CONTROL": "false"},
+    # And RPCs over the adaptive limit fail at once with RESOURCE_EXHAUSTED.
+    "admission": {"DEADLINE_PROPAGATION": "true", "ADMISSION_CONTROL": "true"},
+}
+
+
+def serve(mode, port, db_delay_ms, latency_target_ms, ready):
+    # The parent has not imported app.config, so the mode's settings apply from here on.
+    os.environ.update(MODES[mode], ADMISSION_LATENCY_TARGET_MS=str(latency_target_ms), COALESCE_READS="false")
+    from app.logging_service import setup_logging
+    from app.grpc.server import create_server
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    # Registered after the statement_timeout listener, so the sleep counts against the deadline.
+    @event.listens_for(Session, "after_begin")
+    def slow_database(session, transaction, connection):
+        connection.exec_driver_sql(f"SELECT pg_sleep({db_delay_ms / 1000})")
+
+    setup_logging(level="ERROR")
+    server = create_server()
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+    ready.set()
+    server.wait_for_termination()
+
+
+def offer_load(stub, rate, seconds, deadline_seconds):
+    """
+    Sends rate calls per second for seconds and returns (status code, latency in ms) per call.
+    """
+    request = library_pb2.ListBooksRequest(page_size=20)
+    total = int(rate * seconds)
+    results = []
+    lock = threading.Lock()
+    finished = threading.Event()
+
+    def done(sent, future):
+        latency = (time.perf_counter() - sent) * 1000
+        with lock:
+            results.append((future.code(), latency))
+            if len(results) == total:
+                finished.set()
+
+    started = time.perf_counter()
+    for i in range(total):
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent = time.perf_counter()
+        stub.ListBooks.future(request, timeout=deadline_seconds).add_done_callback(functools.partial(done, sent))
+    finished.wait(deadline_seconds + 30)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=1200, help="calls per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--deadline-ms", type=float, default=250)
+    parser.add_argument("--db-delay-ms", type=float, default=20)
+    parser.add_argument("--latency-target-ms", type=float, default=100)
+    parser.add_argument("--port", type=int, default=50092)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    for mode in args.modes.split(","):
+        ready = context.Event()
+        child = context.Process(
+            target=serve, args=(mode, args.port, args.db_delay_ms, args.latency_target_ms, ready), daemon=True
+        )
+        child.start()
+        ready.wait(30)
+        channel = grpc.insecure_channel(f"127.0.0.1:{args.port}")
+        stub = library_pb2_grpc.LibraryServiceStub(channel)
+        offer_load(stub, 50, 1, 5)  # connections and caches
+        results = offer_load(stub, args.rate, args.seconds, args.deadline_ms / 1000)
+        channel.close()
+        child.terminate()
+        child.join()
+
+        codes = collections.Counter(code for code, _ in results)
+        good = sorted(latency for code, latency in results if code == grpc.StatusCode.OK)
+        p50 = statistics.median(good) if good else float("nan")
+        p99 = good[int(len(good) * 0.99)] if good else float("nan")
+        print(
+            f"{mode:<12} offered {len(results) / args.seconds:6.0f}/s   goodput {len(good) / args.seconds:6.0f}/s   "
+            f"deadline exceeded {codes[grpc.StatusCode.DEADLINE_EXCEEDED]:6d}   "
+            f"rejected {codes[grpc.StatusCode.RESOURCE_EXHAUSTED]:6d}   "
+            f"ok p50 {p50:6.1f} ms   p99 {p99:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
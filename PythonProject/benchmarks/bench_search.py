@@ -0,0 +1,87 @@
+"""
+Latency of SearchBooks / SearchMembers queries over a synthetic catalogue.
+
+Seeds the database configured in .env when --seed is given (ids prefixed with "search-"), then
+runs each query --repeat times through the repository and prints p50/p95 latency and the plan.
+
+    python -m benchmarks.bench_search --seed --books 1000000 --members 200000
+"""
+from app.db import database, search
+from app.db.database import create_tables, get_db_session
+from app.repositories.library_repository import LibraryRepository, book_search_statement
+from sqlalchemy import text
+import argparse
+import statistics
+import time
+
+WORDS = [
+    "shadow", "river", "kingdom", "garden", "winter", "silent", "empire", "stone", "ocean", "night",
+    "fire", "glass", "orchard", "harbor", "crown", "forest", "iron", "letters", "summer", "storm",
+    "secret", "island", "mountain", "paper", "light", "memory", "wolf", "desert", "silver", "bridge",
+]
+SURNAMES = ["Tolkien", "Herbert", "Austen", "Le Guin", "Morrison", "Achebe", "Murakami", "Atwood", "Eco", "Borges"]
+
+BOOK_QUERIES = ["shadow", "winter kingdom", "\"silent river\"", "tolkien", "storm -island", "zzzz"]
+MEMBER_QUERIES = ["mem", "member 4242", "membr 12", "search-99"]
+
+
+def seed(connection, books, members):
+    started = time.perf_counter()
+    connection.execute(text("""
+        INSERT INTO books (id, title, author, published_date, isbn, is_available)
+        SELECT 'search-' || i,
+               initcap((:words)[1 + i % 30] || ' ' || (:words)[1 + (i / 30) % 30] || ' ' || (:words)[1 + (i / 900) % 30]),
+               (:surnames)[1 + i % 10] || ' ' || i % 5000,
+               date '1950-01-01' + (i % 25000), 'search-isbn-' || i, true
+        FROM generate_series(1, :books) AS i
+    """), {"books": books, "words": WORDS, "surnames": SURNAMES})
+    connection.execute(text("""
+        INSERT INTO members (id, name, email, join_date)
+        SELECT 'search-member-' || i, 'Member ' || i, 'search-' || i || '@example.com', date '2020-01-01'
+        FROM generate_series(1, :members) AS i
+    """), {"members": members})
+    connection.execute(text("ANALYZE books"))
+    connection.execute(text("ANALYZE members"))
+    connection.commit()
+    print(f"seeded {books:,} books and {members:,} members in {time.perf_counter() - started:.0f}s")
+
+
+def measure(label, run, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hits = run()
+        samples.append((time.perf_counter() - started) * 1e3)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<28} {len(hits):3d} hits   p50 {statistics.median(samples):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert synthetic rows first")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--members", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    create_tables()
+    print(f"trigram member search: {'on' if search.trigram_search else 'off (prefix only)'}")
+    if args.seed:
+        with database.engine.connect() as connection:
+            seed(connection, args.books, args.members)
+
+    with get_db_session() as session:
+        repository = LibraryRepository(session)
+        for query in BOOK_QUERIES:
+            measure(f"books  {query}", lambda: repository.search_books(query, args.page_size), args.repeat)
+        for query in MEMBER_QUERIES:
+            measure(f"members {query}", lambda: repository.search_members(query, args.page_size), args.repeat)
+        statement = book_search_statement(BOOK_QUERIES[0], args.page_size, None)
+        compiled = statement.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+        print("\n".join(session.execute(text(f"EXPLAIN {compiled}")).scalars().all()))
+
+
+if __name__ == "__main__":
+    main()
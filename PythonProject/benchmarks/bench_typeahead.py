@@ -0,0 +1,79 @@
+"""
+Memory footprint and latency of the SuggestBooks typeahead index.
+
+Builds the index in-process from synthetic books (no database needed), reports the memory it
+holds per million books as measured by tracemalloc, then times suggestions and incremental
+updates:
+
+    python -m benchmarks.bench_typeahead
+    python -m benchmarks.bench_typeahead --books 200000
+"""
+from app.services.typeahead import TypeaheadIndex
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+
+WORDS = [
+    "shadow", "river", "kingdom", "garden", "winter", "silent", "empire", "stone", "ocean", "night",
+    "fire", "glass", "orchard", "harbor", "crown", "forest", "iron", "letters", "summer", "storm",
+    "secret", "island", "mountain", "paper", "light", "memory", "wolf", "desert", "silver", "bridge",
+]
+QUERIES = ["s", "sha", "shadow riv", "winter kingdom garden", "author 42", "978000012", "zzz"]
+
+
+def synthetic_books(count, seed=7):
+    rng = random.Random(seed)
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+        # A vocabulary of rare words so the token count grows with the catalogue, as real titles do.
+        title += f" {rng.choice(WORDS)}{i % 50000}"
+        yield str(uuid.UUID(int=rng.getrandbits(128))), title, f"Author {i % 20000}", f"978{i:010d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    index = TypeaheadIndex()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.load(synthetic_books(args.books))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"loaded {len(index):,} books in {elapsed:.1f}s (traced)")
+    print(f"index memory: {size / 2**20:,.0f} MiB, {size / len(index):.0f} bytes per book, "
+          f"{size / len(index) * 1e6 / 2**20:,.0f} MiB per million books")
+
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            suggestions = index.suggest(query, args.limit)
+            samples.append((time.perf_counter() - started) * 1e6)
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"suggest {query!r:<26} {len(suggestions):3d} hits   p50 {statistics.median(samples):8.1f} us   p95 {p95:8.1f} us")
+
+    additions = list(synthetic_books(1000, seed=11))
+    started = time.perf_counter()
+    for book_id, title, author, isbn in additions:
+        index.add(book_id, title, author, isbn)
+    print(f"add: {(time.perf_counter() - started) / len(additions) * 1e6:.1f} us per book")
+    started = time.perf_counter()
+    for book_id, _, _, _ in additions:
+        index.remove(book_id)
+    print(f"remove: {(time.perf_counter() - started) / len(additions) * 1e6:.1f} us per book")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Database load and staleness of clients that poll ListAvailableBooks against clients that watch
+WatchBooks, while a writer keeps borrowing and returning one book.
+
+For every mode a forked child serves the database configured in .env and counts the statements it
+sends to Postgres. The parent picks the first book of ListAvailableBooks as the probe and runs
+--clients threads that either call ListAvailableBooks every --poll-seconds, or keep a WatchBooks
+stream open. Meanwhile a writer borrows or returns the probe every --write-seconds. The report
+has the server's statements per second (the writer's included), the share of writes each client
+saw and how long after the write it saw them. Needs at least one available book (seed some with
+benchmarks.bench_available_books --seed); a member for the writer is created:
+
+    python -m benchmarks.bench_watch
+    python -m benchmarks.bench_watch --clients 200 --poll-seconds 5
+"""
+from app.proto import library_pb2, library_pb2_grpc
+import argparse
+import grpc
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+import uuid
+
+MODES = ("poll", "watch")
+
+
+def serve(clients, port, statements, ready):
+    # The parent has not imported app.config, so these settings apply from here on. Every
+    # ListAvailableBooks runs its own query, as polls from separate clients rarely line up anyway.
+    os.environ.update(
+        GRPC_POOLS=f"point=4,scan=4,write=2,watch={clients + 2}",
+        ADMISSION_CONTROL="false",
+        COALESCE_READS="false",
+        WATCH_MAX_SUBSCRIBERS=str(clients + 2),
+    )
+    from app.logging_service import setup_logging
+    from app.grpc.server import create_server
+    from app.services.change_feed import change_feed
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def count_statement(*args):
+        with statements.get_lock():
+            statements.value += 1
+
+    setup_logging(level="ERROR")
+    server = create_server()
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+    # Streams are refused until the change feed listens.
+    while not change_feed.listening:
+        time.sleep(0.05)
+    ready.set()
+    server.wait_for_termination()
+
+
+class Observations:
+    """
+    States of the probe seen by one client, matched with the writes that produced them.
+    """
+
+    def __init__(self, writes):
+        self.writes = writes
+        self.available = None
+        self.latencies = []
+
+    def see(self, available: bool) -> None:
+        seen_at = time.perf_counter()
+        if available == self.available:
+            return
+        self.available = available
+        # The latest write that left the probe in this state.
+        written = [written_at for written_at, state in list(self.writes) if state == available and written_at <= seen_at]
+        if written:
+            self.latencies.append(seen_at - written[-1])
+
+
+def poll_client(stub, probe, seconds, offset, deadline, observations):
+    time.sleep(offset)  # Clients poll at different moments, not in lockstep.
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        books = stub.ListAvailableBooks(library_pb2.ListAvailableBooksRequest(page_size=50)).books
+        observations.see(any(book.id == probe for book in books))
+        time.sleep(max(0.0, seconds - (time.perf_counter() - started)))
+
+
+def watch_client(stub, probe, deadline, observations, calls):
+    call = stub.WatchBooks(library_pb2.WatchBooksRequest())
+    calls.append(call)
+    try:
+        for response in call:
+            for change in response.changes:
+                if change.id == probe and change.HasField("book"):
+                    observations.see(change.book.is_available)
+            if time.perf_counter() >= deadline:
+                break
+    except grpc.RpcError as e:
+        if e.code() != grpc.StatusCode.CANCELLED:
+            raise
+
+
+def writer(stub, probe, member_id, seconds, deadline, writes):
+    borrow_record_id = None
+    while time.perf_counter() < deadline:
+        if borrow_record_id is None:
+            borrow_record_id = stub.BorrowBook(library_pb2.BorrowBookRequest(book_id=probe, member_id=member_id)).borrow_record.id
+        else:
+            stub.ReturnBook(library_pb2.ReturnBookRequest(borrow_record_id=borrow_record_id))
+            borrow_record_id = None
+        writes.append((time.perf_counter(), borrow_record_id is None))
+        time.sleep(seconds)
+    return borrow_record_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--poll-seconds", type=float, default=1)
+    parser.add_argument("--write-seconds", type=float, default=2)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--port", type=int, default=50094)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    for mode in args.modes.split(","):
+        statements = context.Value("q", 0)
+        ready = context.Event()
+        child = context.Process(target=serve, args=(args.clients, args.port, statements, ready), daemon=True)
+        child.start()
+        ready.wait(30)
+        channel = grpc.insecure_channel(f"127.0.0.1:{args.port}")
+        stub = library_pb2_grpc.LibraryServiceStub(channel)
+        books = stub.ListAvailableBooks(library_pb2.ListAvailableBooksRequest(page_size=1)).books
+        if not books:
+            raise SystemExit("No available books in the database; seed some first.")
+        probe = books[0].id
+        member_id = stub.CreateMember(
+            library_pb2.CreateMemberRequest(name="bench_watch", email=f"bench-watch-{uuid.uuid4().hex}@example.org")
+        ).member.id
+
+        writes = []
+        observations = [Observations(writes) for _ in range(args.clients)]
+        calls = []
+        deadline = time.perf_counter() + args.seconds
+        if mode == "poll":
+            threads = [
+                threading.Thread(
+                    target=poll_client, args=(stub, probe, args.poll_seconds, args.poll_seconds * n / args.clients, deadline, observed)
+                )
+                for n, observed in enumerate(observations)
+            ]
+        else:
+            threads = [
+                threading.Thread(target=watch_client, args=(stub, probe, deadline, observed, calls))
+                for observed in observations
+            ]
+        for thread in threads:
+            thread.start()
+        # Connect and take the first look before the writes start.
+        time.sleep(max(1.0, args.poll_seconds) if mode == "poll" else 1)
+        counted_from = statements.value
+        borrow_record_id = writer(stub, probe, member_id, args.write_seconds, deadline, writes)
+        counted = statements.value - counted_from
+        for call in calls:
+            call.cancel()
+        for thread in threads:
+            thread.join()
+        if borrow_record_id is not None:
+            stub.ReturnBook(library_pb2.ReturnBookRequest(borrow_record_id=borrow_record_id))
+        channel.close()
+        child.terminate()
+        child.join()
+
+        latencies = sorted(latency * 1000 for observed in observations for latency in observed.latencies)
+        seen = len(latencies) / max(1, len(writes) * args.clients)
+        p99 = latencies[int(len(latencies) * 0.99)] if latencies else float("nan")
+        median = statistics.median(latencies) if latencies else float("nan")
+        print(
+            f"{mode:<6} {counted / (deadline - writes[0][0]):7.0f} statements/s  {seen:6.1%} of writes seen  "
+            f"after p50 {median:7.1f} ms  p99 {p99:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
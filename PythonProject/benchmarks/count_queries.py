@@ -0,0 +1,122 @@
+"""
+Checks the SQL statements and commits issued by each RPC of the thread-pool server against
+EXPECTED, and exits with status 1 if any RPC issues more than expected.
+
+Starts the server in-process against the database configured in .env (tables are created if
+missing) and prints one line per RPC. Statements of the change feed thread are not counted. Run
+it after changes to the data access layer to catch extra round trips; when a change saves one,
+lower the expected count with it:
+
+    python -m benchmarks.count_queries
+"""
+from app.db import database
+from app.db.database import create_tables
+from app.grpc.server import create_server
+from app.proto import library_pb2, library_pb2_grpc
+from app.repositories.entity_cache import book_cache
+from sqlalchemy import event
+import grpc
+import sys
+import threading
+import time
+import uuid
+
+ADDRESS = "127.0.0.1:50199"
+
+# (statements, commits) per RPC.
+EXPECTED = {
+    "CreateBook": (2, 1),
+    "CreateMember": (2, 1),
+    "GetBook (cold)": (1, 1),
+    "GetBook (cached)": (0, 0),
+    "UpdateBook": (1, 1),
+    "UpdateBook (versioned)": (1, 1),
+    "UpdateMember": (2, 1),
+    "BorrowBook": (1, 1),
+    "ReturnBook": (1, 1),
+    "ListBooks": (1, 1),
+    "ListBorrowings": (1, 1),
+    "ListChangesSince": (2, 1),
+    "DeleteBook": (6, 1),
+}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        self.failures = []
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _counted(self) -> bool:
+        # The change feed reads and prunes on a thread of its own, whenever it is notified.
+        return threading.current_thread().name != "change-feed"
+
+    def _on_execute(self, *args):
+        if self._counted():
+            self.statements += 1
+
+    def _on_commit(self, *args):
+        if self._counted():
+            self.commits += 1
+
+    def measure(self, label, call):
+        self.statements = self.commits = 0
+        response = call()
+        statements, commits = EXPECTED[label]
+        status = "ok"
+        if self.statements > statements or self.commits > commits:
+            status = f"FAIL: expected {statements} statements and {commits} commits"
+            self.failures.append(label)
+        elif (self.statements, self.commits) != (statements, commits):
+            status = f"fewer than expected ({statements} / {commits}); lower EXPECTED"
+        print(f"{label:<24} {self.statements:3d} statements  {self.commits:2d} commits  {status}")
+        return response
+
+
+def main():
+    create_tables()
+    counter = StatementCounter(database.engine)
+    server = create_server()
+    server.add_insecure_port(ADDRESS)
+    server.start()
+    stub = library_pb2_grpc.LibraryServiceStub(grpc.insecure_channel(ADDRESS))
+    # The entity cache is bypassed until the change feed listens.
+    while not book_cache.following:
+        time.sleep(0.05)
+    suffix = uuid.uuid4().hex[:8]
+
+    try:
+        book = counter.measure("CreateBook", lambda: stub.CreateBook(library_pb2.CreateBookRequest(
+            title="Count", author="Queries", published_date="2020-01-01", isbn=f"count-{suffix}"))).book
+        member = counter.measure("CreateMember", lambda: stub.CreateMember(library_pb2.CreateMemberRequest(
+            name="Count", email=f"count-{suffix}@example.com"))).member
+        counter.measure("GetBook (cold)", lambda: stub.GetBook(library_pb2.GetBookRequest(id=book.id)))
+        counter.measure("GetBook (cached)", lambda: stub.GetBook(library_pb2.GetBookRequest(id=book.id)))
+        book = counter.measure("UpdateBook", lambda: stub.UpdateBook(library_pb2.UpdateBookRequest(
+            id=book.id, title="Count 2", author="Queries", published_date="2020-01-01", isbn=f"count-{suffix}"))).book
+        counter.measure("UpdateBook (versioned)", lambda: stub.UpdateBook(library_pb2.UpdateBookRequest(
+            id=book.id, title="Count 3", author="Queries", published_date="2020-01-01", isbn=f"count-{suffix}",
+            expected_version=book.version)))
+        counter.measure("UpdateMember", lambda: stub.UpdateMember(library_pb2.UpdateMemberRequest(
+            id=member.id, name="Count 2", email=f"count-{suffix}@example.com")))
+        record = counter.measure("BorrowBook", lambda: stub.BorrowBook(library_pb2.BorrowBookRequest(
+            book_id=book.id, member_id=member.id))).borrow_record
+        counter.measure("ReturnBook", lambda: stub.ReturnBook(library_pb2.ReturnBookRequest(borrow_record_id=record.id)))
+        counter.measure("ListBooks", lambda: stub.ListBooks(library_pb2.ListBooksRequest(page_size=100)))
+        counter.measure("ListBorrowings", lambda: stub.ListBorrowings(library_pb2.ListBorrowingsRequest(page_size=100)))
+        counter.measure("ListChangesSince", lambda: stub.ListChangesSince(library_pb2.ListChangesSinceRequest(
+            entity=library_pb2.SYNC_BOOKS, version=book.version, page_size=100)))
+        scratch = stub.CreateBook(library_pb2.CreateBookRequest(
+            title="Count", author="Queries", published_date="2020-01-01", isbn=f"count-{suffix}-scratch")).book
+        counter.measure("DeleteBook", lambda: stub.DeleteBook(library_pb2.DeleteBookRequest(id=scratch.id)))
+    finally:
+        server.stop(0)
+    if counter.failures:
+        print(f"More statements or commits than expected: {', '.join(counter.failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,54 @@
 from app.grpc.server import create_server
-from app.config import GRPC_SERVER_HOST, GRPC_SERVER_PORT
-from app.logging_service import setup_logging, logger
+from app.config import (
+    GRPC_SERVER_HOST,
+    GRPC_SERVER_PORT,
+    GRPC_SERVER_MODE,
+    GRPC_WORKERS,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    ASYNC_DB_POOL_SIZE,
+    ASYNC_DB_MAX_OVERFLOW,
+    TYPEAHEAD_ENABLED,
+    METRICS_HOST,
+    METRICS_PORT,
+)
+from app.logging_service import setup_logging
+from app.db import database
 from app.db.database import create_tables
+from app.services.change_feed import change_feed
+from app.services.typeahead import apply_book_changes, book_typeahead, load_book_typeahead
+from app.grpc.launcher import PreforkLauncher
+from app.grpc.metrics import render_server_metrics, start_metrics_server
+import argparse
+import asyncio
+import functools
+import logging
 import time
 
-def main():
+logger = logging.getLogger(__name__)
+
+def load_typeahead_index():
     """
-    Main function to start the gRPC server.
+    Builds the SuggestBooks index from the books table. Prefork workers inherit it from the
+    parent; every process then keeps its copy current from the change feed, starting at the
+    watermark of the load.
     """
-    setup_logging()
-    logger.info("Setting up application")
-    
-    # Create database tables
-    create_tables()
+    started = time.perf_counter()
+    change_feed.start_from(load_book_typeahead())
+    change_feed.follow_changes(apply_book_changes, load_book_typeahead)
+    logger.info(
+        "Loaded %s books into the typeahead index in %.1fs",
+        len(book_typeahead), time.perf_counter() - started,
+    )
 
+def serve(address):
+    """
+    Runs the thread-pool gRPC server until interrupted.
+    """
     server = create_server()
-    address = f"{GRPC_SERVER_HOST}:{GRPC_SERVER_PORT}"
     server.add_insecure_port(address)
 
-    logger.info(f"Starting gRPC server on {address}")
+    logger.info("Starting gRPC server on %s", address)
     server.start()
 
     try:
@@ -28,6 +58,77 @@ def main():
         logger.info("Stopping gRPC server...")
         server.stop(0)
         logger.info("Server stopped.")
+
+async def serve_async(address):
+    """
+    Runs the grpc.aio server on the asyncio engine until interrupted.
+    """
+    # Imported here so the sync mode does not require the async driver.
+    from app.grpc.async_server import create_async_server
+    from app.db.async_database import dispose_async_engine
+
+    server = create_async_server()
+    server.add_insecure_port(address)
+
+    logger.info("Starting grpc.aio server on %s", address)
+    await server.start()
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        logger.info("Stopping grpc.aio server...")
+        await server.stop(0)
+        await dispose_async_engine()
+        logger.info("Server stopped.")
+
+def main():
+    """
+    Main function to start the gRPC server.
+    """
+    parser = argparse.ArgumentParser(description="Library gRPC server")
+    parser.add_argument(
+        "--mode",
+        choices=["sync", "async"],
+        default=GRPC_SERVER_MODE,
+        help="sync runs the thread-pool server, async runs the grpc.aio server",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=GRPC_WORKERS,
+        help="number of worker processes sharing the port via SO_REUSEPORT",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    logger.info("Setting up application")
+
+    # Create database tables
+    create_tables()
+
+    if TYPEAHEAD_ENABLED:
+        load_typeahead_index()
+
+    address = f"{GRPC_SERVER_HOST}:{GRPC_SERVER_PORT}"
+    if METRICS_PORT and args.workers <= 1:
+        # With --workers every worker serves the metrics of its own process instead.
+        start_metrics_server(METRICS_HOST, METRICS_PORT, functools.partial(render_server_metrics, args.mode))
+
+    if args.workers > 1:
+        # Workers build their own engines after fork, so release the parent's connections first.
+        database.engine.dispose()
+        if args.mode == "async":
+            pool_size, max_overflow = ASYNC_DB_POOL_SIZE, ASYNC_DB_MAX_OVERFLOW
+        else:
+            pool_size, max_overflow = DB_POOL_SIZE, DB_MAX_OVERFLOW
+        PreforkLauncher(address, args.workers, args.mode, pool_size, max_overflow, METRICS_PORT).run()
+    elif args.mode == "async":
+        try:
+            asyncio.run(serve_async(address))
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve(address)
     logger.info("Application shutdown")
 
 if __name__ == "__main__":